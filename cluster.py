@@ -0,0 +1,302 @@
+import asyncio
+import hmac
+import itertools
+import pickle
+import random
+import struct
+import time
+from collections import Counter
+from config import CLUSTER_CALL_TIMEOUT, CLUSTER_HOST
+from database import WRITER_CALLS
+from metrics import metrics
+
+
+# ==================================================================================================
+#  CLUSTER MODE (SHARD GROUPS, DB WRITER IPC, FAKE GATEWAY)
+# ==================================================================================================
+
+# Each worker holds one local TCP connection to the writer, framed as a 4-byte length and a pickle.
+# Requests are (call_id, name, args, kwargs), replies (call_id, ok, result or exception) and
+# broadcasts from the writer (0, topic, payload). The first frame a worker sends is the raw
+# cluster key, which is checked before anything else it sends gets unpickled.
+_HEADER = struct.Struct("!I")
+# Names of AsyncDatabase itself that only make sense inside the writer
+_PRIVATE_CALLS = {"open", "attach", "close", "run"}
+
+
+def encode_frame(obj, raw=False):
+    data = obj if raw else pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+    return _HEADER.pack(len(data)) + data
+
+
+async def read_frame(reader, raw=False):
+    size, = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    data = await reader.readexactly(size)
+    return data if raw else pickle.loads(data)
+
+
+def shard_groups(shard_count, workers):
+    """Splits shard ids 0..shard_count-1 into at most `workers` contiguous, near-equal groups."""
+    workers = min(workers, shard_count)
+    size, extra = divmod(shard_count, workers)
+    groups, start = [], 0
+    for i in range(workers):
+        end = start + size + (i < extra)
+        groups.append(list(range(start, end)))
+        start = end
+    return groups
+
+
+def shard_for(guild_id, shard_count):
+    """The shard Discord delivers a guild's events on."""
+    return (guild_id >> 22) % shard_count
+
+
+class WriterServer:
+    """
+    The writer side of cluster mode. This process holds the only open handle on the database:
+    worker calls are decoded here and run against `db` (or a registered writer call), so every
+    SQLite write still goes through the single DB thread of one process.
+    """
+
+    def __init__(self, db, key, host=CLUSTER_HOST, port=0):
+        self.db = db
+        self.key = key
+        self.host = host
+        self.port = port
+        self.clients = set()
+        self.calls = Counter()  # name -> calls served
+        self.server = None
+        self._tasks = set()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            for writer in list(self.clients):
+                writer.close()
+            await self.server.wait_closed()
+
+    def resolve(self, name):
+        func = WRITER_CALLS.get(name)
+        if func is not None:
+            return func
+        if name.startswith("_") or name in _PRIVATE_CALLS:
+            raise AttributeError(f"{name} can't be called over IPC")
+        return getattr(self.db, name)
+
+    def broadcast(self, topic, payload):
+        """Pushes `payload` to every connected worker's `topic` subscriber."""
+        frame = encode_frame((0, topic, payload))
+        for writer in list(self.clients):
+            if not writer.is_closing():
+                writer.write(frame)
+
+    async def _serve(self, reader, writer):
+        try:
+            key = await read_frame(reader, raw=True)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            key = b""
+        if not hmac.compare_digest(key, self.key):
+            writer.close()
+            return
+        self.clients.add(writer)
+        try:
+            while True:
+                call_id, name, args, kwargs = await read_frame(reader)
+                # Started in arrival order, so each worker's calls reach the DB thread in order
+                task = asyncio.create_task(self._dispatch(writer, call_id, name, args, kwargs))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+    async def _dispatch(self, writer, call_id, name, args, kwargs):
+        self.calls[name] += 1
+        try:
+            reply = (call_id, True, await self.resolve(name)(*args, **kwargs))
+        except Exception as e:
+            reply = (call_id, False, e)
+        try:
+            frame = encode_frame(reply)
+        except Exception as e:  # Unpicklable result or exception
+            frame = encode_frame((call_id, False, RuntimeError(f"{name}: {e!r}")))
+        if not writer.is_closing():
+            writer.write(frame)
+
+
+class WriterClient:
+    """A worker's link to the writer: concurrent calls multiplexed over one connection, plus broadcasts."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.handlers = {}  # topic -> coroutine function taking the payload
+        self.calls = 0
+        self.wait = 0.0  # Seconds spent waiting on replies, for latency stats
+        self.closed = False
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._tasks = set()
+        self._reader_task = asyncio.create_task(self._read_loop())
+
+    @classmethod
+    async def connect(cls, key, port, host=CLUSTER_HOST):
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(encode_frame(key, raw=True))
+        return cls(reader, writer)
+
+    def subscribe(self, topic, handler):
+        self.handlers[topic] = handler
+
+    async def call(self, name, args=(), kwargs=None):
+        if self.closed:
+            raise ConnectionError("DB writer link is closed")
+        call_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[call_id] = future
+        started = time.perf_counter()
+        self.writer.write(encode_frame((call_id, name, args, kwargs or {})))
+        try:
+            return await asyncio.wait_for(future, CLUSTER_CALL_TIMEOUT)
+        finally:
+            self._pending.pop(call_id, None)
+            elapsed = time.perf_counter() - started
+            self.calls += 1
+            self.wait += elapsed
+            metrics.charge_db(elapsed)  # Writer calls are this worker's database time
+
+    async def close(self):
+        self._reader_task.cancel()
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+    async def _read_loop(self):
+        try:
+            while True:
+                call_id, first, payload = await read_frame(self.reader)
+                if call_id == 0:
+                    handler = self.handlers.get(first)
+                    if handler:
+                        # Own task: handlers may call back into the writer, whose reply this loop reads
+                        task = asyncio.create_task(handler(payload))
+                        self._tasks.add(task)
+                        task.add_done_callback(self._tasks.discard)
+                    continue
+                future = self._pending.get(call_id)
+                if future is None or future.done():
+                    continue
+                if first:
+                    future.set_result(payload)
+                else:
+                    future.set_exception(payload)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.closed = True
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("DB writer link closed"))
+
+
+# --- FAKE GATEWAY ---
+# Drives a worker without Discord so cluster mode can be exercised locally.
+FAKE_USER_BASE = 900_000_000_000_000_000  # Same user ids in every worker, so they contend for cooldowns
+FAKE_COMMANDS = (("balance", (None,)), ("coinflip", (10, "heads")), ("leaderboard", (None,)), ("work", ()))
+
+
+class _FakeAvatar:
+    url = "https://cdn.discordapp.com/embed/avatars/0.png"
+
+
+class _FakeUser:
+    display_avatar = _FakeAvatar()
+    bot = False
+
+    def __init__(self, user_id):
+        self.id = user_id
+        self.name = self.display_name = f"tester{user_id % 1000}"
+        self.mention = f"<@{user_id}>"
+
+
+class _FakeInteraction:
+    """Just enough of discord.Interaction for the cog callbacks the fake gateway runs."""
+    _ids = itertools.count(1)
+    guild = None  # Fake guilds have no gateway to look members up through
+
+    def __init__(self, user, guild_id, channel_id):
+        self.id = next(self._ids)
+        self.user = user
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.response = self
+        self.followup = self
+        self.replies = []  # (content, embed) of everything sent or edited
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def defer(self, **kwargs):
+        self._done = True
+
+    async def send_message(self, content=None, **kwargs):
+        self._done = True
+        self.replies.append((content, kwargs.get("embed")))
+
+    async def send(self, content=None, **kwargs):
+        self.replies.append((content, kwargs.get("embed")))
+
+    async def edit_original_response(self, **kwargs):
+        self.replies.append((kwargs.get("content"), kwargs.get("embed")))
+
+
+class FakeGateway:
+    """
+    Stands in for Discord's gateway in a cluster test. Commands come from guilds whose ids hash onto
+    this worker's shards and go straight to the real cog callbacks, so every database call takes
+    the same IPC path as in production.
+    """
+
+    def __init__(self, bot, shard_ids, shard_count, users=50, guilds_per_shard=2, seed=0):
+        self.bot = bot
+        self.rng = random.Random(seed)
+        self.users = [_FakeUser(FAKE_USER_BASE + i) for i in range(users)]
+        self.guilds = [(n * shard_count + shard) << 22 for shard in shard_ids for n in range(1, guilds_per_shard + 1)]
+
+    async def dispatch(self, name, *args, user=None):
+        """Invokes one slash command as `user` (random by default) and returns the interaction."""
+        command = self.bot.tree.get_command(name)
+        guild = self.rng.choice(self.guilds)
+        interaction = _FakeInteraction(user or self.rng.choice(self.users), guild, guild + 1)
+        await command.callback(command.binding, interaction, *args)
+        return interaction
+
+    async def run(self, commands=1000, concurrency=50):
+        """Every user claims /daily once, then `commands` random commands run `concurrency` at a time."""
+        started = time.perf_counter()
+        daily = await asyncio.gather(*(self.dispatch("daily", user=user) for user in self.users))
+        claims = sum(1 for interaction in daily if interaction.replies[0][1] is not None)
+        outcomes = Counter()
+        for start in range(0, commands, concurrency):
+            batch = [self.rng.choice(FAKE_COMMANDS) for _ in range(min(concurrency, commands - start))]
+            results = await asyncio.gather(*(self.dispatch(name, *args) for name, args in batch),
+                                           return_exceptions=True)
+            for (name, _), result in zip(batch, results):
+                outcomes[f"{name} failed" if isinstance(result, Exception) else name] += 1
+        return {
+            "guilds": len(self.guilds),
+            "commands": commands + len(self.users),
+            "elapsed": time.perf_counter() - started,
+            "daily_claims": claims,
+            "outcomes": dict(outcomes),
+        }
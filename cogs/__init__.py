@@ -0,0 +1 @@
+# Bot extensions, loaded by main.py through bot.load_extension("cogs.<name>").
@@ -0,0 +1,282 @@
+import discord
+from discord import app_commands, ui
+from discord.ext import commands, tasks
+import random
+import time
+from config import (BJ_JOIN_WINDOW, BJ_MAX_HANDS, BJ_MAX_SEATS, BJ_SWEEP_INTERVAL, EMBED_COLOR_ERROR,
+    EMBED_COLOR_MAIN, EMBED_COLOR_SUCCESS, EMBED_COLOR_WARN)
+from database import db
+from games import BlackjackTables, SLOT_SYMBOLS, flip_coin, slots_result, spin_slots
+from utils import (animator, create_embed, format_money, make_view, persistent_item, register_persistent_views,
+    rng_service, seed_footer)
+
+
+# ==================================================================================================
+#  GAMBLING & CASINO (BLACKJACK, SLOTS, RACE)
+# ==================================================================================================
+
+BJ_BUTTONS = {
+    "deal": ("Deal", discord.ButtonStyle.green),
+    "hit": ("Hit", discord.ButtonStyle.primary),
+    "stand": ("Stand", discord.ButtonStyle.secondary),
+    "double": ("Double", discord.ButtonStyle.secondary),
+    "split": ("Split", discord.ButtonStyle.secondary),
+}
+
+
+@persistent_item
+class BlackjackButton(ui.DynamicItem[ui.Button], template=r"blackjack:(?P<action>deal|hit|stand|double|split)"):
+    """
+    Table controls shared by every blackjack message. The custom_id only names the action;
+    the handler finds the table from the channel, so buttons keep working after a restart.
+    """
+
+    def __init__(self, action: str):
+        label, style = BJ_BUTTONS[action]
+        super().__init__(ui.Button(label=label, style=style, custom_id=f"blackjack:{action}"))
+        self.action = action
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(match["action"])
+
+    async def callback(self, interaction: discord.Interaction):
+        casino = interaction.client.get_cog("Casino")
+        await casino.blackjack_action(interaction, self.action)
+
+
+def blackjack_view():
+    return make_view(*(BlackjackButton(action) for action in BJ_BUTTONS))
+
+
+class Casino(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.tables = BlackjackTables()
+        self.blackjack_sweep.start()
+
+    async def cog_unload(self):
+        # Reloading drops the in-memory tables, so their stakes go back first
+        self.blackjack_sweep.cancel()
+        await self.refund_open_tables()
+
+    @app_commands.command(name="coinflip", description="50/50 Chance")
+    async def coinflip(self, interaction: discord.Interaction, bet: int, choice: str):
+        if choice.lower() not in ['heads', 'tails']:
+            return await interaction.response.send_message("❌ Heads or Tails only.", ephemeral=True)
+
+        if bet <= 0: return await interaction.response.send_message("❌ Bet must be positive.", ephemeral=True)
+        if not await db.debit(interaction.user.id, bet):
+            return await interaction.response.send_message("❌ Insufficient funds.", ephemeral=True)
+
+        seed, rng = rng_service.round("coinflip")
+        outcome = flip_coin(rng)
+        win = (outcome == choice.lower())
+
+        if win:
+            await db.credit(interaction.user.id, bet * 2)  # Stake back plus winnings
+            res_embed = create_embed("✅ Prediction Correct",
+                                     f"Result: **{outcome.upper()}**\nPayout: **{format_money(bet)}**",
+                                     EMBED_COLOR_SUCCESS, footer_text=seed_footer(seed))
+        else:
+            res_embed = create_embed("❌ Prediction Failed",
+                                     f"Result: **{outcome.upper()}**\nLoss: **{format_money(bet)}**", EMBED_COLOR_ERROR,
+                                     footer_text=seed_footer(seed))
+
+        # Professional Animation
+        embed = create_embed("🪙 Calculating Physics...", "Coin is in the air...", EMBED_COLOR_MAIN,
+                             "https://media.tenor.com/Img2h8Jk8IQAAAAM/coin-flip-coin.gif")
+        await animator.play(interaction, "coinflip", {"embed": res_embed}, {"embed": embed})
+
+    @app_commands.command(name="slots", description="Spin the wheel")
+    async def slots(self, interaction: discord.Interaction, bet: int):
+        if bet <= 0: return await interaction.response.send_message("❌ Bet must be positive.", ephemeral=True)
+        if not await db.debit(interaction.user.id, bet):
+            return await interaction.response.send_message("❌ Insufficient funds.", ephemeral=True)
+
+        emojis = SLOT_SYMBOLS
+        seed, rng = rng_service.round("slots")
+
+        a, b, c = spin_slots(rng)
+        final = f"**[ {a} | {b} | {c} ]**"
+
+        outcome, winnings = slots_result((a, b, c), bet)
+        msg, color = {
+            "jackpot": ("JACKPOT!", EMBED_COLOR_WARN),  # Goldish
+            "pair": ("Small Win!", EMBED_COLOR_SUCCESS),
+            "loss": ("Loser!", EMBED_COLOR_ERROR),
+        }[outcome]
+
+        if winnings > 0:
+            await db.credit(interaction.user.id, bet + winnings)  # Stake was taken up front
+        res_embed = create_embed(f"🎰 {msg}", f"{final}\n\nChange: {format_money(winnings)}", color,
+                                 footer_text=seed_footer(seed))
+
+        # Animation frames (cosmetic reels don't touch the round's RNG)
+        embed = create_embed("🎰 Spinning...", "⬜ ⬜ ⬜", EMBED_COLOR_MAIN)
+        frames = [{"embed": create_embed("🎰 Spinning...",
+                                         f"**[ {random.choice(emojis)} | {random.choice(emojis)} | {random.choice(emojis)} ]**",
+                                         EMBED_COLOR_MAIN)} for _ in range(3)]
+        await animator.play(interaction, "slots", {"embed": res_embed}, {"embed": embed}, frames, delay=0.5)
+
+    # --- BLACKJACK ENGINE ---
+    @app_commands.command(name="blackjack", description="Play Blackjack against Alice (others can join the table)")
+    async def blackjack(self, interaction: discord.Interaction, bet: int):
+        if bet <= 0: return await interaction.response.send_message("❌ Bet must be positive.", ephemeral=True)
+        table = self.tables.get(interaction.channel_id)
+        if table and interaction.user.id in table.seats:
+            return await interaction.response.send_message("❌ You're already seated at this table.", ephemeral=True)
+        if table and table.phase != "betting":
+            return await interaction.response.send_message("❌ A hand is already in progress at this table.",
+                                                           ephemeral=True)
+        if table and len(table.seats) >= BJ_MAX_SEATS:
+            return await interaction.response.send_message("❌ This table is full.", ephemeral=True)
+        if not await db.debit(interaction.user.id, bet):
+            return await interaction.response.send_message("❌ Insufficient funds.", ephemeral=True)
+
+        # The table may have been dealt while the debit ran
+        table = self.tables.get(interaction.channel_id)
+        if table is None:
+            table = self.tables.open(interaction.channel_id, interaction.user.id, bet)
+            table.interaction = interaction
+            return await interaction.response.send_message(embed=self.table_embed(table), view=blackjack_view())
+        if not table.join(interaction.user.id, bet):
+            await db.credit(interaction.user.id, bet)
+            return await interaction.response.send_message("❌ Couldn't join, the hand has already started.",
+                                                           ephemeral=True)
+        await interaction.response.send_message(f"🃏 You joined the table with {format_money(bet)}.", ephemeral=True)
+        try:
+            await table.interaction.edit_original_response(embed=self.table_embed(table))
+        except Exception as e:  # The seat is taken either way; the next update redraws the table
+            print(f" [WARN] Blackjack table update failed: {type(e).__name__} {e}")
+
+    async def blackjack_action(self, interaction: discord.Interaction, action: str):
+        """Handles a button press from any table message."""
+        table = self.tables.get(interaction.channel_id)
+        if table is None or interaction.user.id not in table.seats:
+            return await interaction.response.send_message("❌ You're not seated at this table.", ephemeral=True)
+
+        if action == "deal":
+            if table.phase != "betting":
+                return await interaction.response.send_message("❌ Cards are already dealt.", ephemeral=True)
+            table.deal()
+            return await self.show_table(table, interaction)
+
+        hand = table.hand(interaction.user.id)
+        if table.phase != "playing" or hand is None:
+            return await interaction.response.send_message("❌ You have no hand to play.", ephemeral=True)
+
+        if action in ("double", "split"):
+            if action == "double" and not hand.can_double:
+                return await interaction.response.send_message("❌ You can only double on your first two cards.",
+                                                               ephemeral=True)
+            if action == "split" and (not hand.can_split or len(table.seats[interaction.user.id]) >= BJ_MAX_HANDS):
+                return await interaction.response.send_message("❌ This hand can't be split.", ephemeral=True)
+            if not await db.debit(interaction.user.id, hand.bet):
+                return await interaction.response.send_message("❌ Insufficient funds.", ephemeral=True)
+            if table.hand(interaction.user.id) is not hand or table.phase != "playing":  # Changed during the debit
+                await db.credit(interaction.user.id, hand.bet)
+                return await interaction.response.send_message("❌ That hand is over.", ephemeral=True)
+            if action == "double":
+                table.double(hand)
+            else:
+                table.split(interaction.user.id, hand)
+        elif action == "hit":
+            table.hit(hand)
+        else:
+            table.stand(hand)
+
+        table.touch()
+        await self.show_table(table, interaction)
+
+    async def show_table(self, table, interaction=None):
+        """Edits the table message, settling the round first if every hand is done."""
+        if table.phase == "playing" and table.finished:
+            embed, view = await self.settle(table), None
+        else:
+            embed, view = self.table_embed(table), blackjack_view()
+        if interaction is not None:
+            await interaction.response.edit_message(embed=embed, view=view)
+        else:
+            try:
+                await table.interaction.edit_original_response(embed=embed, view=view)
+            except discord.HTTPException as e:
+                print(f" [WARN] Blackjack table update failed: {e}")
+
+    async def settle(self, table):
+        results = table.finish()
+        self.tables.close(table)
+        payouts = {user_id: sum(hand.bet + change for hand, _, change in hands if hand.bet + change > 0)
+                   for user_id, hands in results.items()}
+        for user_id, payout in payouts.items():
+            if payout:
+                await db.credit(user_id, payout)  # Stakes were taken up front
+        return self.table_embed(table, results)
+
+    def table_embed(self, table, results=None):
+        labels = {
+            "bust": "Busted",
+            "dealer_bust": "Dealer busted, win",
+            "win": "Win",
+            "push": "Push",
+            "lose": "Lose",
+        }
+        lines = []
+        for user_id, hands in table.seats.items():
+            for i, hand in enumerate(hands):
+                name = f"<@{user_id}>" + (f" (hand {i + 1})" if len(hands) > 1 else "")
+                if table.phase == "betting":
+                    lines.append(f"{name}: Bet {format_money(hand.bet)}")
+                    continue
+                line = f"{name}: {hand.cards} ({hand.total}) • Bet {format_money(hand.bet)}"
+                if results:
+                    _, outcome, change = results[user_id][i]
+                    line += f" • **{labels[outcome]}** {format_money(change)}"
+                elif table.phase == "playing":
+                    line += " ✅" if hand.done else " ⏳"
+                lines.append(line)
+
+        if table.phase == "betting":
+            return create_embed("🃏 Blackjack Table",
+                                "\n".join(lines) + f"\n\nUse `/blackjack` to join. Dealing in {BJ_JOIN_WINDOW}s "
+                                                   "or when a player presses **Deal**.", EMBED_COLOR_MAIN)
+        footer = f"{seed_footer(table.shoe.seed)} • Card {table.first_card}"
+        if results:
+            return create_embed("🃏 Game Over",
+                                "\n".join(lines) + f"\n\n**Dealer Hand:** {table.dealer.cards} ({table.dealer.total})",
+                                EMBED_COLOR_MAIN, footer_text=footer)
+        return create_embed("🃏 Blackjack Table",
+                            "\n".join(lines) + f"\n\n**Dealer:** [{table.dealer.cards[0]}, ?]", EMBED_COLOR_MAIN,
+                            footer_text=footer)
+
+    @tasks.loop(seconds=BJ_SWEEP_INTERVAL)
+    async def blackjack_sweep(self):
+        """Deals tables whose join window closed, stands idle players, and evicts idle shoes."""
+        for table in self.tables.expired():
+            # Edits below yield, so a button press may have settled the table or moved its deadline meanwhile
+            if (self.tables.get(table.channel_id) is not table or table.phase == "done"
+                    or table.deadline > time.monotonic()):
+                continue
+            try:
+                if table.phase == "betting":
+                    table.deal()
+                else:
+                    for hands in table.seats.values():
+                        for hand in hands:
+                            hand.done = True
+                await self.show_table(table)
+            except Exception as e:  # One broken table must not stop the loop or the tables after it
+                print(f" [ERROR] Blackjack sweep failed for channel {table.channel_id}: {type(e).__name__} {e}")
+        self.tables.evict_shoes()
+
+    async def refund_open_tables(self):
+        """Returns the stakes of rounds that never finished (used on shutdown and reload)."""
+        for table in list(self.tables.tables.values()):
+            self.tables.close(table)
+            for user_id, hands in table.seats.items():
+                await db.credit(user_id, sum(hand.bet for hand in hands))
+
+
+async def setup(bot):
+    await bot.add_cog(Casino(bot))
+    register_persistent_views(bot)
@@ -0,0 +1,287 @@
+import discord
+from discord import app_commands
+from discord.ext import commands
+import random
+from typing import Optional
+from config import (DAILY_REWARD, EMBED_COLOR_ERROR, EMBED_COLOR_MAIN, EMBED_COLOR_SUCCESS, EMBED_COLOR_WARN,
+    LEADERBOARDS, MAX_OPEN_ORDERS)
+from database import db
+from market import Order, holdings_value, market, order_book
+from utils import (claim_cooldown, cooldowns, create_embed, format_duration, format_money, members,
+    release_cooldown)
+
+
+# ==================================================================================================
+#  ECONOMY SYSTEM (JOBS, BANKING, STOCK MARKET)
+# ==================================================================================================
+
+class Economy(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.jobs = [
+            {"name": "Janitor", "salary": 50, "xp_req": 0},
+            {"name": "Cashier", "salary": 80, "xp_req": 100},
+            {"name": "Developer", "salary": 200, "xp_req": 500},
+            {"name": "Manager", "salary": 400, "xp_req": 1000},
+            {"name": "CEO", "salary": 1000, "xp_req": 5000}
+        ]
+
+    @app_commands.command(name="balance", description="View your financial status")
+    async def balance(self, interaction: discord.Interaction, user: Optional[discord.Member] = None):
+        target = user or interaction.user
+        user = await db.get_user(target.id)
+        holdings = await holdings_value(target.id)
+
+        embed = create_embed(
+            title=f"💳 Account Statement: {target.display_name}",
+            description="Recent financial activity synced.",
+            color=EMBED_COLOR_SUCCESS,
+            thumbnail_url=target.display_avatar.url
+        )
+        embed.add_field(name="💵 Wallet", value=format_money(user.wallet), inline=True)
+        embed.add_field(name="🏦 Bank", value=format_money(user.bank), inline=True)
+        embed.add_field(name="📈 Portfolio", value=format_money(holdings), inline=True)
+        embed.add_field(name="💎 Net Worth", value=format_money(user.wallet + user.bank + holdings), inline=False)
+
+        await interaction.response.send_message(embed=embed)
+
+    @app_commands.command(name="deposit", description="Transfer funds to secure bank")
+    async def deposit(self, interaction: discord.Interaction, amount: int):
+        if amount <= 0:
+            return await interaction.response.send_message("❌ Amount must be positive.", ephemeral=True)
+        if not await db.transfer(interaction.user.id, amount, "wallet", "bank"):
+            return await interaction.response.send_message("❌ Insufficient funds in wallet.", ephemeral=True)
+
+        embed = create_embed("🏦 Deposit Successful", f"Transferred **{format_money(amount)}** to your bank account.",
+                             EMBED_COLOR_SUCCESS)
+        await interaction.response.send_message(embed=embed)
+
+    @app_commands.command(name="withdraw", description="Withdraw funds from bank")
+    async def withdraw(self, interaction: discord.Interaction, amount: int):
+        if amount <= 0:
+            return await interaction.response.send_message("❌ Amount must be positive.", ephemeral=True)
+        if not await db.transfer(interaction.user.id, amount, "bank", "wallet"):
+            return await interaction.response.send_message("❌ Insufficient funds in bank.", ephemeral=True)
+
+        embed = create_embed("🏧 Withdrawal Successful", f"Withdrew **{format_money(amount)}** to your wallet.",
+                             EMBED_COLOR_SUCCESS)
+        await interaction.response.send_message(embed=embed)
+
+    async def on_cooldown(self, interaction, command, verb):
+        """Starts the command's cooldown, or tells the user how long is left and returns True."""
+        left = await claim_cooldown(command, interaction.user.id)
+        if left:
+            await interaction.response.send_message(f"⏳ You can {verb} again in **{format_duration(left)}**.",
+                                                    ephemeral=True)
+        return bool(left)
+
+    async def pay_out(self, command, user_id, amount):
+        """Credits a cooldown command's payout; if the write fails the use is given back."""
+        try:
+            await db.update_bal(user_id, amount)
+        except Exception:
+            await release_cooldown(command, user_id)
+            raise
+
+    @app_commands.command(name="daily", description="Claim your daily allowance")
+    async def daily(self, interaction: discord.Interaction):
+        if await self.on_cooldown(interaction, "daily", "claim your daily"):
+            return
+
+        await self.pay_out("daily", interaction.user.id, DAILY_REWARD)
+        embed = create_embed("📅 Daily Allowance",
+                             f"**Deposited:** {format_money(DAILY_REWARD)}\nCome back in {format_duration(cooldowns.windows['daily'])}.",
+                             EMBED_COLOR_SUCCESS)
+        await interaction.response.send_message(embed=embed)
+
+    @app_commands.command(name="work", description="Complete a work shift")
+    async def work(self, interaction: discord.Interaction):
+        if await self.on_cooldown(interaction, "work", "work"):
+            return
+
+        # Determine job based on XP (simplified to random for now)
+        job = random.choice(self.jobs)
+        earnings = int(job['salary'] * random.uniform(0.8, 1.2))
+
+        await self.pay_out("work", interaction.user.id, earnings)
+
+        embed = create_embed("💼 Shift Report",
+                             f"**Role:** {job['name']}\n**Performance:** Satisfactory\n**Payout:** {format_money(earnings)}",
+                             EMBED_COLOR_SUCCESS)
+        await interaction.response.send_message(embed=embed)
+
+    @app_commands.command(name="crime", description="Attempt illegal activity")
+    async def crime(self, interaction: discord.Interaction):
+        if await self.on_cooldown(interaction, "crime", "commit a crime"):
+            return
+
+        chance = random.random()
+        if chance > 0.6:  # 40% success
+            earnings = random.randint(300, 1000)
+            await self.pay_out("crime", interaction.user.id, earnings)
+            embed = create_embed("🕵️‍♂️ Heist Successful",
+                                 f"You managed to evade security.\n**Loot:** {format_money(earnings)}",
+                                 EMBED_COLOR_WARN)
+        else:
+            fine = random.randint(100, 500)
+            await self.pay_out("crime", interaction.user.id, -fine)
+            embed = create_embed("🚓 Busted", f"Authorities caught you.\n**Fine:** {format_money(fine)}",
+                                 EMBED_COLOR_ERROR)
+
+        await interaction.response.send_message(embed=embed)
+
+    @app_commands.command(name="stocks", description="View stock market prices")
+    async def stocks(self, interaction: discord.Interaction):
+        embed = create_embed("📈 Alice Stock Exchange (ASE)", "Current market valuations update every 5 minutes.",
+                             EMBED_COLOR_MAIN)
+
+        for sym in market.symbols[:25]:  # Embed field limit
+            change = market.change(sym)
+            arrow = "🟢" if change >= 0 else "🔴"
+            embed.add_field(name=f"{market.name(sym)} ({sym})",
+                            value=f"${market.price(sym):,.2f} {arrow} {change:+.2%}", inline=False)
+
+        await interaction.response.send_message(embed=embed)
+
+    @app_commands.command(name="stock_chart", description="View a ticker's recent price history")
+    async def stock_chart(self, interaction: discord.Interaction, symbol: str):
+        symbol = symbol.upper()
+        if symbol not in market:
+            return await interaction.response.send_message("❌ Unknown Ticker Symbol.", ephemeral=True)
+
+        prices = market.price_history(symbol, 48)
+        low, high = min(prices), max(prices)
+        bars = "▁▂▃▄▅▆▇█"
+        span = (high - low) or 1
+        chart = "".join(bars[int((p - low) / span * (len(bars) - 1))] for p in prices)
+
+        embed = create_embed(f"📊 {market.name(symbol)} ({symbol})", f"```{chart}```", EMBED_COLOR_MAIN)
+        embed.add_field(name="Price", value=f"${market.price(symbol):,.2f}", inline=True)
+        embed.add_field(name="MA (12)", value=f"${market.moving_average(symbol, 12):,.2f}", inline=True)
+        embed.add_field(name="Range", value=f"${low:,.2f} – ${high:,.2f}", inline=True)
+        await interaction.response.send_message(embed=embed)
+
+    @app_commands.command(name="buy_stock", description="Purchase equity (set a limit price to wait for a dip)")
+    async def buy_stock(self, interaction: discord.Interaction, symbol: str, amount: int,
+                        limit_price: Optional[float] = None):
+        await self.place_order(interaction, "buy", symbol, amount, limit_price)
+
+    @app_commands.command(name="sell_stock", description="Sell equity (set a limit price to wait for a rally)")
+    async def sell_stock(self, interaction: discord.Interaction, symbol: str, amount: int,
+                         limit_price: Optional[float] = None):
+        await self.place_order(interaction, "sell", symbol, amount, limit_price)
+
+    @app_commands.command(name="orders", description="View or cancel your open limit orders")
+    async def orders(self, interaction: discord.Interaction, cancel_id: Optional[int] = None):
+        if cancel_id is not None:
+            if not order_book.cancel(interaction.user.id, cancel_id):
+                return await interaction.response.send_message("❌ No open order with that ID.", ephemeral=True)
+            return await interaction.response.send_message(f"🗑️ Order **#{cancel_id}** cancelled.", ephemeral=True)
+
+        lines = [f"`#{o.order_id}` {o.side.upper()} **{o.shares}** {o.symbol} @ ${o.limit:,.2f}"
+                 for o in order_book.open_orders(interaction.user.id)]
+        embed = create_embed("📋 Open Orders", "\n".join(lines) or "No open limit orders.", EMBED_COLOR_MAIN)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    async def place_order(self, interaction: discord.Interaction, side: str, symbol: str, amount: int,
+                          limit_price: Optional[float]):
+        symbol = symbol.upper()
+        if symbol not in market:
+            return await interaction.response.send_message("❌ Unknown Ticker Symbol.", ephemeral=True)
+        if amount <= 0:
+            return await interaction.response.send_message("❌ Amount must be positive.", ephemeral=True)
+        if limit_price is not None and limit_price <= 0:
+            return await interaction.response.send_message("❌ Limit price must be positive.", ephemeral=True)
+        if limit_price is not None and len(order_book.open_orders(interaction.user.id)) >= MAX_OPEN_ORDERS:
+            return await interaction.response.send_message(f"❌ You already have {MAX_OPEN_ORDERS} open orders.",
+                                                           ephemeral=True)
+
+        order = order_book.submit(interaction.user.id, interaction.channel_id, symbol, side, amount, limit_price)
+        if limit_price is not None and not order.crosses(market.price(symbol)):
+            order.future.add_done_callback(lambda f: self.bot.loop.create_task(self.announce_fill(order)))
+            embed = create_embed("📝 Limit Order Placed",
+                                 f"**#{order.order_id}** {side.upper()} **{amount}** {symbol} @ ${limit_price:,.2f}\n"
+                                 f"Current price: ${market.price(symbol):,.2f}",
+                                 EMBED_COLOR_MAIN)
+            return await interaction.response.send_message(embed=embed)
+
+        # Executes in the next settlement batch (at most ORDER_SETTLE_INTERVAL away)
+        await interaction.response.defer()
+        status, shares, cash = await order.future
+        await interaction.followup.send(embed=self.fill_embed(order, status, cash))
+
+    def fill_embed(self, order: Order, status: str, cash: int):
+        if status == "filled" and order.side == "buy":
+            return create_embed("📉 Asset Acquired",
+                                f"Purchased **{order.shares}** shares of **{order.symbol}**.\n**Total Cost:** {format_money(cash)}",
+                                EMBED_COLOR_SUCCESS)
+        if status == "filled":
+            return create_embed("📈 Asset Sold",
+                                f"Sold **{order.shares}** shares of **{order.symbol}**.\n**Proceeds:** {format_money(cash)}",
+                                EMBED_COLOR_SUCCESS)
+        reasons = {
+            "rejected": "Insufficient funds." if order.side == "buy" else "You don't own enough shares.",
+            "expired": "The limit order expired.",
+            "error": "The exchange is having trouble. Try again later.",
+        }
+        return create_embed("❌ Order Not Filled", f"**#{order.order_id}** {order.side.upper()} {order.shares} {order.symbol}: "
+                                                  f"{reasons.get(status, status)}", EMBED_COLOR_ERROR)
+
+    async def announce_fill(self, order: Order):
+        """Posts the outcome of a resting limit order in the channel it was placed from."""
+        status, _, cash = order.future.result()
+        channel = self.bot.get_channel(order.channel_id)
+        if status == "cancelled" or channel is None:
+            return
+        try:
+            await channel.send(content=f"<@{order.user_id}>", embed=self.fill_embed(order, status, cash))
+        except discord.HTTPException:
+            pass
+
+    # --- LEADERBOARDS ---
+    @app_commands.command(name="leaderboard", description="View the top players")
+    @app_commands.choices(category=[app_commands.Choice(name=label, value=key)
+                                    for key, (label, _) in LEADERBOARDS.items()])
+    async def leaderboard(self, interaction: discord.Interaction,
+                          category: Optional[app_commands.Choice[str]] = None):
+        # A cold member lookup is a gateway round trip that can outlast the 3 s response window
+        await interaction.response.defer()
+        key = category.value if category else "networth"
+        label = LEADERBOARDS[key][0]
+        top = await db.leaderboard_top(key, 10)
+        # Names of ranked members of this server; mentions of anyone else may not render in an embed
+        names = await members.get_many(interaction.guild, [user_id for user_id, _ in top]) if interaction.guild else {}
+
+        medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+        lines = []
+        for position, (user_id, score) in enumerate(top, start=1):
+            value = format_money(score) if key == "networth" else f"{score:,}"
+            member = names.get(user_id)
+            who = discord.utils.escape_markdown(member.display_name) if member else f"<@{user_id}>"
+            lines.append(f"{medals.get(position, f'`#{position}`')} {who} — **{value}**")
+
+        embed = create_embed(f"🏆 Leaderboard: {label}", "\n".join(lines) or "Nobody ranked yet.", EMBED_COLOR_MAIN)
+        await interaction.followup.send(embed=embed)
+
+    @app_commands.command(name="rank", description="Check your leaderboard position")
+    @app_commands.choices(category=[app_commands.Choice(name=label, value=key)
+                                    for key, (label, _) in LEADERBOARDS.items()])
+    async def rank(self, interaction: discord.Interaction, category: Optional[app_commands.Choice[str]] = None,
+                   user: Optional[discord.Member] = None):
+        target = user or interaction.user
+        key = category.value if category else "networth"
+        position, size = await db.leaderboard_rank(key, target.id)
+        if position is None:
+            return await interaction.response.send_message(f"❌ {target.display_name} isn't ranked yet.",
+                                                           ephemeral=True)
+
+        place, score = position
+        value = format_money(score) if key == "networth" else f"{score:,}"
+        embed = create_embed(f"📊 Rank: {target.display_name}",
+                             f"**{LEADERBOARDS[key][0]}:** {value}\n**Position:** #{place:,} of {size:,}",
+                             EMBED_COLOR_MAIN, thumbnail_url=target.display_avatar.url)
+        await interaction.response.send_message(embed=embed)
+
+
+async def setup(bot):
+    await bot.add_cog(Economy(bot))
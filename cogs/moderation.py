@@ -0,0 +1,205 @@
+import discord
+from discord import app_commands, ui
+from discord.ext import commands
+import time
+from config import (EMBED_COLOR_ERROR, EMBED_COLOR_MAIN, EMBED_COLOR_SUCCESS, EMBED_COLOR_WARN,
+    METRICS_STATEMENT_SAMPLE)
+from database import db
+from metrics import metrics
+from utils import animator, create_embed, format_duration, make_view, persistent_item, register_persistent_views
+
+
+# ==================================================================================================
+#  MODERATION & TICKETS (ADMIN TOOLS)
+# ==================================================================================================
+
+@persistent_item
+class TicketOpenButton(ui.DynamicItem[ui.Button], template=r"ticket_open_btn"):
+    """Ticket panel button. Ticket state lives in the tickets table, keyed by channel."""
+
+    def __init__(self):
+        super().__init__(ui.Button(label="Open Ticket", style=discord.ButtonStyle.blurple, emoji="📩",
+                                   custom_id="ticket_open_btn"))
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls()
+
+    async def callback(self, interaction: discord.Interaction):
+        guild = interaction.guild
+        existing = await db.get_open_ticket(guild.id, interaction.user.id)
+        if existing is not None:
+            channel = guild.get_channel(existing)
+            if channel is not None:
+                return await interaction.response.send_message(f"❌ You already have a ticket: {channel.mention}",
+                                                               ephemeral=True)
+            await db.close_ticket(existing)  # Channel was deleted by hand
+
+        await interaction.response.defer(ephemeral=True)
+        category = discord.utils.get(guild.categories, name="Tickets")
+        if not category:
+            category = await guild.create_category("Tickets")
+
+        overwrites = {
+            guild.default_role: discord.PermissionOverwrite(read_messages=False),
+            interaction.user: discord.PermissionOverwrite(read_messages=True),
+            guild.me: discord.PermissionOverwrite(read_messages=True)
+        }
+
+        channel = await guild.create_text_channel(f"ticket-{interaction.user.name}", category=category,
+                                                  overwrites=overwrites)
+        await db.open_ticket(channel.id, interaction.user.id, guild.id)
+
+        embed_ticket = create_embed("📩 Support Ticket",
+                                    f"Hello {interaction.user.mention}, staff will be with you shortly.\nClick the button below to close this ticket when resolved.",
+                                    EMBED_COLOR_MAIN)
+        await channel.send(embed=embed_ticket, view=make_view(TicketCloseButton()))
+        await interaction.followup.send(f"✅ Ticket created: {channel.mention}", ephemeral=True)
+
+
+@persistent_item
+class TicketCloseButton(ui.DynamicItem[ui.Button], template=r"ticket_close_btn"):
+    def __init__(self):
+        super().__init__(ui.Button(label="Close Ticket", style=discord.ButtonStyle.red, emoji="🔒",
+                                   custom_id="ticket_close_btn"))
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls()
+
+    async def callback(self, interaction: discord.Interaction):
+        ticket = await db.get_ticket(interaction.channel_id)
+        is_staff = interaction.channel.permissions_for(interaction.user).manage_channels
+        if ticket is not None and ticket.user_id != interaction.user.id and not is_staff:
+            return await interaction.response.send_message("❌ Only the ticket owner or staff can close it.",
+                                                           ephemeral=True)
+        await db.close_ticket(interaction.channel_id)
+        await interaction.channel.delete()
+
+
+class Moderation(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    @app_commands.command(name="kick", description="Remove a user from the server")
+    @commands.has_permissions(kick_members=True)
+    async def kick(self, interaction: discord.Interaction, member: discord.Member, reason: str = "No reason provided"):
+        try:
+            await member.kick(reason=reason)
+            await db.log_mod_action(member.id, interaction.user.id, "KICK", reason)
+
+            embed = create_embed("👢 User Kicked",
+                                 f"**Target:** {member.mention}\n**Reason:** {reason}\n**Moderator:** {interaction.user.mention}",
+                                 EMBED_COLOR_WARN)
+            await interaction.response.send_message(embed=embed)
+        except Exception as e:
+            await interaction.response.send_message(f"❌ Error: {e}", ephemeral=True)
+
+    @app_commands.command(name="ban", description="Permanently ban a user")
+    @commands.has_permissions(ban_members=True)
+    async def ban(self, interaction: discord.Interaction, member: discord.Member, reason: str = "No reason provided"):
+        try:
+            await member.ban(reason=reason)
+            await db.log_mod_action(member.id, interaction.user.id, "BAN", reason)
+
+            embed = create_embed("🔨 User Banned", f"**Target:** {member.mention}\n**Reason:** {reason}",
+                                 EMBED_COLOR_ERROR)
+            await interaction.response.send_message(embed=embed)
+        except Exception as e:
+            await interaction.response.send_message(f"❌ Error: {e}", ephemeral=True)
+
+    @app_commands.command(name="purge", description="Bulk delete messages")
+    @commands.has_permissions(manage_messages=True)
+    async def purge(self, interaction: discord.Interaction, amount: int):
+        await interaction.response.defer(ephemeral=True)
+        deleted = await interaction.channel.purge(limit=amount)
+
+        embed = create_embed("🧹 Cleanup Complete", f"Removed **{len(deleted)}** messages.", EMBED_COLOR_SUCCESS)
+        await interaction.followup.send(embed=embed)
+
+    @app_commands.command(name="lock", description="Lock current channel")
+    @commands.has_permissions(manage_channels=True)
+    async def lock(self, interaction: discord.Interaction):
+        await interaction.channel.set_permissions(interaction.guild.default_role, send_messages=False)
+        embed = create_embed("🔒 Channel Locked", "Messaging has been disabled for non-admins.", EMBED_COLOR_ERROR)
+        await interaction.response.send_message(embed=embed)
+
+    @app_commands.command(name="unlock", description="Unlock current channel")
+    @commands.has_permissions(manage_channels=True)
+    async def unlock(self, interaction: discord.Interaction):
+        await interaction.channel.set_permissions(interaction.guild.default_role, send_messages=True)
+        embed = create_embed("🔓 Channel Unlocked", "Messaging has been enabled.", EMBED_COLOR_SUCCESS)
+        await interaction.response.send_message(embed=embed)
+
+    # --- TICKET SYSTEM ---
+    @app_commands.command(name="setup_tickets", description="Create the ticket panel")
+    @commands.has_permissions(administrator=True)
+    async def setup_tickets(self, interaction: discord.Interaction):
+        embed = create_embed("🎫 Support Center",
+                             "Need help? Click the button below to create a private ticket with staff.",
+                             EMBED_COLOR_MAIN)
+        await interaction.channel.send(embed=embed, view=make_view(TicketOpenButton()))
+        await interaction.response.send_message("Panel created.", ephemeral=True)
+
+    @app_commands.command(name="animations", description="Toggle game animations for this server (full/instant)")
+    @app_commands.checks.has_permissions(manage_guild=True)
+    async def animations(self, interaction: discord.Interaction, mode: str):
+        mode = mode.lower()
+        if mode not in ("full", "instant"):
+            return await interaction.response.send_message("❌ Mode must be `full` or `instant`.", ephemeral=True)
+
+        await db.set_instant_animations(interaction.guild_id, mode == "instant")
+        if mode == "instant":
+            animator.instant_guilds.add(interaction.guild_id)
+        else:
+            animator.instant_guilds.discard(interaction.guild_id)
+
+        embed = create_embed("🎞️ Animations Updated",
+                             "Games now reply with a single result message." if mode == "instant"
+                             else "Games play their full animations.", EMBED_COLOR_SUCCESS)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    # --- METRICS ---
+    @app_commands.command(name="stats", description="Command, database and REST timings of this process (Admin)")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def stats(self, interaction: discord.Interaction):
+        def ms(seconds):
+            return f"{seconds * 1000:.1f}ms"
+
+        db_waits = dict(metrics.family("alice_command_db_seconds"))
+        rest_waits = dict(metrics.family("alice_command_rest_seconds"))
+        statements = dict(metrics.family("alice_command_db_statements_total"))
+        busiest = sorted(metrics.family("alice_command_seconds"), key=lambda item: -item[1].count)[:8]
+        command_lines = []
+        for labels, hist in busiest:
+            count = hist.count
+            command_lines.append(f"`/{labels[0]}` {count:,}× · p50 {ms(hist.quantile(0.5))} · "
+                                 f"p95 {ms(hist.quantile(0.95))} · db {ms(db_waits[labels].sum / count)} · "
+                                 f"rest {ms(rest_waits[labels].sum / count)} · "
+                                 f"{statements.get(labels, 0) / count:.1f} SQL")
+
+        # Only the process that owns the database times statements (the writer, in cluster mode)
+        slowest = sorted(metrics.family("alice_db_statement_seconds"), key=lambda item: -item[1].sum)[:5]
+        statement_lines = [f"{ms(hist.sum)} total · {hist.count:,}× · `{labels[0][:60]}`" for labels, hist in slowest]
+
+        requests = metrics.family("alice_rest_request_seconds")
+        calls = sum(hist.count for _, hist in requests)
+        rest_line = (f"**{calls:,}** requests, {ms(sum(hist.sum for _, hist in requests) / max(calls, 1))} average\n"
+                     f"**{metrics.total('alice_rest_rate_limited_total'):,}** rate limited (429), "
+                     f"**{metrics.total('alice_rest_bucket_exhausted_total'):,}** buckets exhausted")
+
+        embed = create_embed("📊 Bot Metrics", "Latency since start, per process." +
+                             (f" Prometheus text on `{metrics.endpoint}`." if metrics.endpoint else ""),
+                             EMBED_COLOR_MAIN,
+                             footer_text=f"Up {format_duration(time.time() - metrics.started)}")
+        embed.add_field(name="Commands (p50 · p95 · avg wait · avg statements)", value="\n".join(command_lines) or "None yet.",
+                        inline=False)
+        embed.add_field(name=f"Slowest SQL (1 in {METRICS_STATEMENT_SAMPLE} calls)", value="\n".join(statement_lines) or "Not timed in this process.",
+                        inline=False)
+        embed.add_field(name="Discord REST", value=rest_line, inline=False)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+async def setup(bot):
+    await bot.add_cog(Moderation(bot))
+    register_persistent_views(bot)
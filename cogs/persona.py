@@ -0,0 +1,301 @@
+import discord
+from discord import app_commands
+from discord.ext import commands, tasks
+import asyncio
+import contextvars
+import datetime
+import random
+import time
+from collections import deque
+from config import (EMBED_COLOR_ERROR, EMBED_COLOR_MAIN, EMBED_COLOR_SUCCESS, HTTP_BREAKER_COOLDOWN,
+    HTTP_BREAKER_THRESHOLD, MEME_API_URL, MEME_BATCH_SIZE, MEME_BUFFER_SIZE)
+from utils import EmbedTemplate, animator, create_embed, create_http_session
+
+
+# ==================================================================================================
+#  ALICE PERSONA ("FREE WILL" & FUN)
+# ==================================================================================================
+
+class CircuitBreaker:
+    """
+    Stops calling an upstream that keeps failing. After `threshold` consecutive failures the
+    breaker opens for `cooldown` seconds, then lets a single trial request through (half-open).
+    """
+
+    def __init__(self, threshold=HTTP_BREAKER_THRESHOLD, cooldown=HTTP_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_pending = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self.retry_in() == 0 else "open"
+
+    def retry_in(self):
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.trial_pending:
+            self.trial_pending = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_pending = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_pending = False
+        if self.failures >= self.threshold:
+            if self.opened_at is None:
+                print(f" [WARN] Upstream failing, circuit open for {self.cooldown}s.")
+            self.opened_at = time.monotonic()
+
+
+class MemeFeed:
+    """
+    Keeps a buffer of ready meme payloads so /meme answers from memory.
+    A background task tops the buffer up through the bot's shared HTTP session whenever
+    it is drawn down, using the API's batch endpoint (`/gimme/<count>`).
+    """
+
+    def __init__(self, session, url=MEME_API_URL, size=MEME_BUFFER_SIZE, breaker=None):
+        self.session = session
+        self.url = url.rstrip("/")
+        self.size = size
+        self.breaker = breaker or CircuitBreaker()
+        self.buffer = deque(maxlen=size)
+        self._wanted = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        self._wanted.set()
+        # Started by the first /meme; an empty context keeps refills off that command's metrics
+        self._task = asyncio.create_task(self._refill_loop(), context=contextvars.Context())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def get(self):
+        """Returns a meme payload, or None if nothing is buffered and the upstream is down."""
+        self._wanted.set()
+        if self.buffer:
+            return self.buffer.popleft()
+        # Cold buffer: fall back to a live fetch unless the breaker says the API is down
+        memes = await self._fetch(1)
+        return memes[0] if memes else None
+
+    async def _fetch(self, count):
+        import aiohttp
+        if not self.breaker.allow():
+            return []
+        try:
+            async with self.session.get(f"{self.url}/{count}") as r:
+                if r.status != 200:
+                    raise aiohttp.ClientResponseError(r.request_info, r.history, status=r.status)
+                data = await r.json()
+            # A body of the wrong shape is an upstream failure too, or the refill loop dies with a trial pending
+            memes = [m for m in data.get("memes", [data]) if m.get("url") and not m.get("nsfw")]
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, AttributeError, TypeError) as e:
+            self.breaker.record_failure()
+            print(f" [WARN] Meme fetch failed: {type(e).__name__} {e}")
+            return []
+        self.breaker.record_success()
+        return memes
+
+    async def _refill_loop(self):
+        while True:
+            await self._wanted.wait()
+            self._wanted.clear()
+            while len(self.buffer) < self.size:
+                try:
+                    if self.breaker.state == "open":
+                        await asyncio.sleep(self.breaker.retry_in())
+                        continue
+                    memes = await self._fetch(min(MEME_BATCH_SIZE, self.size - len(self.buffer)))
+                    if not memes:
+                        await asyncio.sleep(1)
+                        continue
+                    self.buffer.extend(memes)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # Whatever _fetch didn't classify still counts against the upstream (and clears a
+                    # pending half-open trial); the feed keeps refilling instead of dying silently
+                    self.breaker.record_failure()
+                    print(f" [ERROR] Meme refill failed: {type(e).__name__} {e}")
+                    await asyncio.sleep(1)
+
+
+# Action commands differ only by the mention, so their embeds are prebuilt once
+ACTION_EMBEDS = {
+    "strike": EmbedTemplate("🚀 Ballistic Missile Detected", "**Target:** {mention}\n**Status:** Impact Confirmed.",
+                            0xe74c3c, "https://media.giphy.com/media/XUFPGR45kHMZwHQz9V/giphy.gif"),
+    "killoff": EmbedTemplate("💀 Termination Protocol", "**Subject:** {mention}\n**Result:** Eliminated.",
+                            0x2c3e50, "https://media1.tenor.com/m/CXOItGL-rjwAAAAC/dad-noel-noeldeyzel.gif"),
+    "punish": EmbedTemplate("💥 Disciplinary Action", "**Subject:** {mention}\n**Action:** Drill Protocol Initiated.",
+                            0xe67e22, "https://i.imgur.com/VUWWN10.gif"),
+    "bless": EmbedTemplate("🙏 Divine Intervention", "**Recipient:** {mention}\n**Effect:** Blessed.",
+                            0xf1c40f, "https://media.giphy.com/media/Tv2btKgK06tQXltbvC/giphy.gif"),
+    "crown": EmbedTemplate("👑 Coronation Ceremony", "**Sovereign:** {mention}\n**Title:** King/Queen assigned.",
+                            0xf39c12, "https://i.giphy.com/fYpUBttlicUM5hpSM2.gif"),
+    "lure": EmbedTemplate("🪤 Trap Deployed", "**Target:** {mention}\n**Status:** Captured.",
+                            0x27ae60, "https://media.giphy.com/media/3ornka9rAaKRA2Rkac/giphy.gif"),
+    "assert_dominance": EmbedTemplate("😡 Dominance Assertion", "**Subject:** {mention}\n**Action:** Physical Admonishment.",
+                            0xc0392b, "https://media1.tenor.com/m/OOKQrqKgFCsAAAAd/angry-kid.gif"),
+    "nomercy": EmbedTemplate("☢️ Nuclear Option", "**Target:** {mention}\n**Yield:** Maximum.",
+                            0x000000, "https://media.giphy.com/media/hvGKQL8lasDvIlWRBC/giphy.gif"),
+}
+ROULETTE_SURVIVED = EmbedTemplate("😅 Survival Confirmed", "Chamber empty. You live.", EMBED_COLOR_SUCCESS,
+                                  "https://media.giphy.com/media/1FMaabePDEfgk/giphy.gif")
+
+
+def bench_embeds(count=100_000):
+    """Microbenchmark: action embeds built per second, create_embed() vs the prebuilt template."""
+    template = ACTION_EMBEDS["strike"]
+    mention = "<@123456789012345678>"
+    for label, build in (
+            ("create_embed", lambda: create_embed(template.title, template.description.format(mention=mention),
+                                                  template.colour.value, template.image_url)),
+            ("template", lambda: template.render(mention=mention))):
+        started = time.perf_counter()
+        for _ in range(count):
+            build()
+        elapsed = time.perf_counter() - started
+        print(f" [BENCH] {label}: {count / elapsed:,.0f} embeds/sec")
+
+
+class AlicePersona(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.moods = ["Happy", "Sassy", "Angry", "Bored", "Helpful"]
+        self.current_mood = "Happy"
+        self.mood_loop.start()
+
+    def cog_unload(self):
+        self.mood_loop.cancel()
+
+    def meme_feed(self):
+        """The shared HTTP session and meme buffer are only set up once someone asks for a meme."""
+        feed = getattr(self.bot, "meme_feed", None)
+        if feed is None:
+            if getattr(self.bot, "http_session", None) is None:
+                self.bot.http_session = create_http_session()
+            feed = self.bot.meme_feed = MemeFeed(self.bot.http_session)
+            feed.start()
+        return feed
+
+    @tasks.loop(minutes=30)
+    async def mood_loop(self):
+        self.current_mood = random.choice(self.moods)
+        activities = {
+            "Happy": "Playing games! 🎮",
+            "Sassy": "Judging your profiles 💅",
+            "Angry": "Plotting world domination 👿",
+            "Bored": "Counting stars ✨",
+            "Helpful": "Helping users! 💡"
+        }
+        await self.bot.change_presence(activity=discord.Game(activities[self.current_mood]))
+
+    @mood_loop.before_loop
+    async def before_mood_loop(self):
+        await self.bot.wait_until_ready()
+
+    @app_commands.command(name="8ball", description="Ask Alice for wisdom")
+    async def eightball(self, interaction: discord.Interaction, question: str):
+        # Responses change based on mood!
+        if self.current_mood == "Angry":
+            responses = ["Don't ask me now.", "No.", "Go away.", "Obviously not.", "Why do you annoy me?"]
+        elif self.current_mood == "Sassy":
+            responses = ["As if.", "Maybe, if you're lucky.", "Ask your mom.", "I doubt it, hun.", "Sure, whatever."]
+        else:
+            responses = ["Yes, definitely.", "It is certain.", "Most likely.", "Outlook good.", "I think so."]
+
+        embed = create_embed("🎱 The Magic 8-Ball",
+                             f"**Question:** {question}\n**Alice says:** {random.choice(responses)}", EMBED_COLOR_MAIN)
+        await interaction.response.send_message(embed=embed)
+
+    @app_commands.command(name="meme", description="Fetch visual data from internet")
+    async def meme(self, interaction: discord.Interaction):
+        data = await self.meme_feed().get()
+        if data is None:
+            return await interaction.response.send_message("❌ My internet connection is fuzzy. Try again later.",
+                                                           ephemeral=True)
+        embed = create_embed("🖼️ Viral Content",
+                             f"**Subreddit:** {data.get('subreddit', '?')}\n**Title:** {data.get('title', '')}",
+                             EMBED_COLOR_MAIN, data['url'])
+        await interaction.response.send_message(embed=embed)
+
+    # --- ACTION COMMANDS (PROFESSIONAL UI) ---
+
+    @app_commands.command(name="strike", description="Launch missile protocol")
+    async def strike(self, interaction: discord.Interaction, member: discord.Member):
+        await interaction.response.send_message(embed=ACTION_EMBEDS["strike"].render(mention=member.mention))
+
+    @app_commands.command(name="killoff", description="Execute termination sequence")
+    async def killoff(self, interaction: discord.Interaction, member: discord.Member):
+        await interaction.response.send_message(embed=ACTION_EMBEDS["killoff"].render(mention=member.mention))
+
+    @app_commands.command(name="punish", description="Administer disciplinary action")
+    async def punish(self, interaction: discord.Interaction, member: discord.Member):
+        await interaction.response.send_message(embed=ACTION_EMBEDS["punish"].render(mention=member.mention))
+
+    @app_commands.command(name="bless", description="Grant divine protection")
+    async def bless(self, interaction: discord.Interaction, member: discord.Member):
+        await interaction.response.send_message(embed=ACTION_EMBEDS["bless"].render(mention=member.mention))
+
+    @app_commands.command(name="crown", description="Designate sovereignty")
+    async def crown(self, interaction: discord.Interaction, member: discord.Member):
+        await interaction.response.send_message(embed=ACTION_EMBEDS["crown"].render(mention=member.mention))
+
+    @app_commands.command(name="lure", description="Deploy bait")
+    async def lure(self, interaction: discord.Interaction, member: discord.Member):
+        await interaction.response.send_message(embed=ACTION_EMBEDS["lure"].render(mention=member.mention))
+
+    @app_commands.command(name="assert_dominance", description="Assert hierarchy")
+    async def assert_dominance(self, interaction: discord.Interaction, member: discord.Member):
+        await interaction.response.send_message(embed=ACTION_EMBEDS["assert_dominance"].render(mention=member.mention))
+
+    @app_commands.command(name="nomercy", description="Deploy ultimate weapon")
+    async def nomercy(self, interaction: discord.Interaction, member: discord.Member):
+        await interaction.response.send_message(embed=ACTION_EMBEDS["nomercy"].render(mention=member.mention))
+
+    @app_commands.command(name="roulette", description="Russian Roulette (Risk Death)")
+    async def roulette(self, interaction: discord.Interaction):
+        if random.randint(1, 6) == 1:
+            try:
+                # Attempt Timeout
+                await interaction.user.timeout(discord.utils.utcnow() + datetime.timedelta(seconds=60),
+                                               reason="Roulette Loss")
+                text = "💥 **BANG!** Subject neutralized. (Timeout 60s)"
+            except:
+                text = "💥 **BANG!** Subject neutralized. (Admin immunity active)"
+
+            embed = create_embed("💀 Critical Failure", text, EMBED_COLOR_ERROR,
+                                 "https://media.giphy.com/media/xT9IguC2cZ3lTqW652/giphy.gif")
+        else:
+            embed = ROULETTE_SURVIVED.render()
+
+        await animator.play(interaction, "roulette", {"content": None, "embed": embed},
+                            {"content": "🔫 **Spinning Cylinder...**"})
+
+
+async def setup(bot):
+    await bot.add_cog(AlicePersona(bot))
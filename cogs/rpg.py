@@ -0,0 +1,107 @@
+import discord
+from discord import app_commands
+from discord.ext import commands
+from config import EMBED_COLOR_ERROR, EMBED_COLOR_MAIN, EMBED_COLOR_SUCCESS, EMBED_COLOR_WARN
+from database import db
+from games import MONSTERS, RPG_CLASSES, format_combat_log, resolve_fight
+from utils import animator, confirm_action, create_embed, format_money, rng_service, seed_footer
+
+
+# ==================================================================================================
+#  RPG SYSTEM (CLASSES, COMBAT, INVENTORY)
+# ==================================================================================================
+
+class RPG(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.classes = RPG_CLASSES
+        self.monsters = MONSTERS
+
+    @app_commands.command(name="profile", description="View your RPG character stats")
+    async def profile(self, interaction: discord.Interaction):
+        stats = await db.get_rpg_stats(interaction.user.id)
+
+        embed = create_embed(f"🛡️ Character Sheet: {interaction.user.name}", "", EMBED_COLOR_MAIN,
+                             thumbnail_url=interaction.user.display_avatar.url)
+        embed.add_field(name="Class", value=stats.rpg_class, inline=True)
+        embed.add_field(name="Battles Won", value=str(stats.battles_won), inline=True)
+        embed.add_field(name="❤️ HP", value=f"{stats.hp}/{stats.max_hp}", inline=True)
+        embed.add_field(name="💧 Mana", value=f"{stats.mana}/{stats.max_mana}", inline=True)
+        embed.add_field(name="⚔️ ATK", value=str(stats.atk), inline=True)
+        embed.add_field(name="🛡️ DEF", value=str(stats.defense), inline=True)
+        embed.add_field(name="💨 AGL", value=str(stats.agility), inline=True)
+
+        await interaction.response.send_message(embed=embed)
+
+    @app_commands.command(name="select_class", description="Choose your RPG Class (Resets stats!)")
+    async def select_class(self, interaction: discord.Interaction, class_name: str):
+        class_name = class_name.capitalize()
+        if class_name not in self.classes:
+            return await interaction.response.send_message(f"❌ Invalid Class. Choose: {', '.join(self.classes.keys())}",
+                                                           ephemeral=True)
+
+        c = self.classes[class_name]
+
+        # Confirmation
+        if not await confirm_action(interaction,
+                                    f"Are you sure you want to become a **{class_name}**? This will reset your stats."):
+            return
+
+        await db.set_rpg_class(interaction.user.id, class_name, c['hp'], c['atk'], c['def'], c['agl'])
+
+        await interaction.followup.send(
+            embed=create_embed("✨ Class Change Successful", f"You are now a **{class_name}**.", EMBED_COLOR_SUCCESS))
+
+    @app_commands.command(name="dungeon", description="Enter the dungeon to fight")
+    async def dungeon(self, interaction: discord.Interaction):
+        stats = await db.get_combat_stats(interaction.user.id)
+        if stats.hp <= 0:
+            return await interaction.response.send_message("💀 You are incapacitated. Use `/heal` first.",
+                                                           ephemeral=True)
+
+        # Pick monster
+        seed, rng = rng_service.round("dungeon")
+        m = rng.choice(self.monsters)
+
+        # Combat Logic
+        won, p_hp, _, tail = resolve_fight(stats.hp, stats.atk, stats.defense, m['hp'], m['atk'], rng)
+
+        # Save Result
+        await db.set_hp(interaction.user.id, max(0, p_hp))
+
+        if won:
+            await db.update_bal(interaction.user.id, m['gold'])
+            # Update wins
+            await db.add_battle_win(interaction.user.id)
+
+            res_embed = create_embed("🏆 Victory",
+                                     f"You defeated the **{m['name']}**!\n\n**Loot:** {format_money(m['gold'])}\n**XP:** {m['xp']}",
+                                     EMBED_COLOR_SUCCESS, footer_text=seed_footer(seed))
+        else:
+            res_embed = create_embed("💀 Defeat",
+                                     f"You were knocked out by the **{m['name']}**.\nSomeone dragged you back to town.",
+                                     EMBED_COLOR_ERROR, footer_text=seed_footer(seed))
+
+        # Log footer
+        res_embed.add_field(name="Combat Log (Last 3 turns)", value="\n".join(format_combat_log(tail, m['name'])),
+                            inline=False)
+
+        # Loading Animation, then the enemy, then the result
+        loading = create_embed("⚔️ Entering Dungeon...", "Searching for enemies...", EMBED_COLOR_MAIN,
+                               "https://media.giphy.com/media/l0HlJDaeqNUDhhaWg/giphy.gif")
+        encounter = create_embed(f"👺 Encounter: {m['name']}", f"**HP:** {m['hp']} | **ATK:** {m['atk']}",
+                                 EMBED_COLOR_WARN, m['img'])
+        await animator.play(interaction, "dungeon", {"embed": res_embed}, {"embed": loading}, [{"embed": encounter}])
+
+    @app_commands.command(name="heal", description="Restore Health (Costs $50)")
+    async def heal(self, interaction: discord.Interaction):
+        cost = 50
+        if not await db.restore_hp(interaction.user.id, cost):
+            return await interaction.response.send_message("❌ Too poor.", ephemeral=True)
+
+        embed = create_embed("💖 Restored", "Your HP has been fully recovered.", EMBED_COLOR_SUCCESS)
+        await interaction.response.send_message(embed=embed)
+
+
+async def setup(bot):
+    await bot.add_cog(RPG(bot))
@@ -0,0 +1,142 @@
+import os
+from dotenv import load_dotenv
+
+
+
+# Load environment variables
+load_dotenv()
+
+# TOKEN HANDLING
+# You can put your token directly here if .env fails, but .env is safer.
+TOKEN = os.getenv('TOKEN')
+
+# CONSTANTS
+DB_NAME = "alice_ultimate.db"
+LEGACY_DB_NAME = "alice_brain.db"  # Pre-v3 schema, imported once by migration 3
+# Applied to every connection when it is opened. WAL lets readers run alongside the writer,
+# NORMAL sync is durable under WAL except on power loss, cache_size is negative KiB.
+DB_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -16000,
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+DB_STATEMENT_CACHE = 256
+LEDGER_COLUMNS = ("wallet", "bank")
+# Write-behind: balance deltas are merged in memory and committed together
+WRITE_BEHIND_INTERVAL_MS = 500
+WRITE_BEHIND_MAX_ENTRIES = 256
+# Read-through cache for balances and RPG stats (entries per table, seconds)
+CACHE_SIZE = 2048
+CACHE_TTL = 300
+# Leaderboards kept in memory: name -> (label, indexed query returning user_id, score)
+LEADERBOARDS = {
+    "networth": ("Net Worth", "SELECT user_id, wallet + bank FROM users ORDER BY wallet + bank DESC"),
+    "battles": ("Battles Won", "SELECT user_id, battles_won FROM rpg_stats ORDER BY battles_won DESC"),
+    "level": ("Level", "SELECT user_id, level FROM users ORDER BY level DESC"),
+}
+EMBED_COLOR_MAIN = 0x9b59b6  # Alice Purple
+EMBED_COLOR_ERROR = 0xe74c3c  # Red
+EMBED_COLOR_SUCCESS = 0x2ecc71  # Green
+EMBED_COLOR_WARN = 0xf1c40f  # Yellow
+EMBED_FOOTER_TEXT = "Alice System v3.0"
+EMBED_FOOTER_ICON = "https://cdn-icons-png.flaticon.com/512/4712/4712109.png"
+
+# STOCK MARKET
+# (symbol, name, starting price, volatility per tick)
+MARKET_LISTINGS = [
+    ("ALC", "Alice Corp", 100.0, 0.05),
+    ("TCH", "TechGiant", 250.0, 0.03),
+    ("MEM", "MemeStonk", 10.0, 0.20),
+    ("GLD", "GoldRes", 1500.0, 0.01),
+    ("OIL", "DinoJuice", 80.0, 0.04),
+    ("NEK", "Nekomata Labs", 45.0, 0.08),
+    ("BNK", "Vault Holdings", 320.0, 0.02),
+    ("PIX", "PixelForge", 60.0, 0.06),
+    ("RMN", "Ramen Futures", 5.0, 0.12),
+    ("SKY", "SkyLift Aero", 180.0, 0.04),
+]
+MARKET_HISTORY = 288  # Ticks of price history kept (24h at one tick per 5 minutes)
+ORDER_SETTLE_INTERVAL = 1.0  # Seconds between trade settlement batches
+LIMIT_ORDER_TTL = 24 * 3600
+MAX_OPEN_ORDERS = 10  # Resting limit orders per user
+
+# ANIMATIONS
+ANIMATIONS_MODE = os.getenv("ANIMATIONS", "full")  # "instant" sends game results as a single message everywhere
+ANIMATION_FRAME_DELAY = 2.0
+EDIT_BUCKET_RATE = 5  # Message edits allowed per channel per EDIT_BUCKET_PER seconds
+EDIT_BUCKET_PER = 5.0
+EDIT_BUCKET_SLACK = 0.5  # Added to the window so latency jitter at its edge doesn't trip Discord's own limit
+
+# UI
+CONFIRM_TIMEOUT = 30  # Seconds a confirmation prompt waits for an answer
+
+# HTTP
+MEME_API_URL = os.getenv("MEME_API_URL", "https://meme-api.com/gimme")
+MEME_BUFFER_SIZE = 25  # Ready memes kept in memory
+MEME_BATCH_SIZE = 25  # Memes requested per upstream call (API max is 50)
+HTTP_POOL_LIMIT = 20  # Connections in the shared session's pool
+HTTP_TIMEOUT = 10
+HTTP_BREAKER_THRESHOLD = 5  # Consecutive failures before the circuit opens
+HTTP_BREAKER_COOLDOWN = 60
+
+# COOLDOWNS
+# command -> (cooldowns table column, window in seconds)
+COOLDOWNS = {
+    "daily": ("last_daily", 24 * 3600),
+    "work": ("last_work", 30 * 60),
+    "crime": ("last_heist", 15 * 60),
+}
+# Window overrides in seconds, e.g. COOLDOWN_OVERRIDES="work=600,crime=300"
+COOLDOWN_OVERRIDES = {command.strip(): int(seconds) for command, seconds in
+                      (item.split("=") for item in os.getenv("COOLDOWN_OVERRIDES", "").split(",") if item.strip())}
+DAILY_REWARD = 1000
+COOLDOWN_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"  # UTC, same layout as mod_logs timestamps
+
+# BLACKJACK
+BJ_SHOE_DECKS = 6
+BJ_PENETRATION = 0.75  # Share of the shoe dealt before it is reshuffled
+BJ_MAX_SEATS = 6
+BJ_MAX_HANDS = 4  # Hands per player after splits
+BJ_JOIN_WINDOW = 15  # Seconds other players have to join before the deal
+BJ_TURN_TIMEOUT = 60  # Idle hands are stood after this long
+BJ_SHOE_TTL = 3600  # Shoes of idle channels are dropped after this long
+BJ_SWEEP_INTERVAL = 5
+
+# EXTENSIONS & GATEWAY
+# Cogs loaded at startup; EXTENSIONS="cogs.economy,cogs.casino" runs a subset
+EXTENSIONS = tuple(os.getenv("EXTENSIONS", "cogs.economy,cogs.rpg,cogs.casino,cogs.moderation,cogs.persona").split(","))
+# Gateway intents each extension needs besides `guilds` (channels, roles and the bot's own member).
+# The bot subscribes to the union for the enabled extensions only. Slash commands carry the members
+# they mention, so none of the current cogs need member lists, presences or message events.
+EXTENSION_INTENTS = {
+    "cogs.economy": (),
+    "cogs.rpg": (),
+    "cogs.casino": (),
+    "cogs.moderation": (),
+    "cogs.persona": (),
+}
+# Members looked up on demand (the library's member cache is off unless the members intent is on)
+MEMBER_CACHE_SIZE = 5000
+MEMBER_CACHE_TTL = 600
+
+# COMMAND SYNC
+# Hashes of the last synced command tree per scope; the tree is only pushed to Discord when it changes
+COMMAND_SYNC_FILE = "command_sync.json"
+# DEV_GUILDS="123,456" syncs the commands to those guilds only (instant updates) instead of globally
+DEV_GUILDS = [int(guild_id) for guild_id in os.getenv("DEV_GUILDS", "").split(",") if guild_id.strip()]
+
+# CLUSTER (python main.py cluster)
+# Shards per bot; None lets Discord recommend a count (single process) or uses one per worker (cluster)
+SHARD_COUNT = int(os.getenv("SHARDS")) if os.getenv("SHARDS") else None
+CLUSTER_WORKERS = int(os.getenv("CLUSTER_WORKERS", "2"))  # Gateway processes; the writer process comes on top
+CLUSTER_HOST = "127.0.0.1"  # The writer's IPC socket only ever listens locally
+CLUSTER_CALL_TIMEOUT = 30  # Seconds a worker waits on the writer before failing the call
+
+# METRICS
+# Command, database and REST timings, served as Prometheus text on a local port (GET /metrics)
+METRICS_ENABLED = os.getenv("METRICS", "on") != "off"  # METRICS=off skips every timing hook
+METRICS_HOST = "127.0.0.1"  # Never exposed beyond this machine; scrape it locally or through a tunnel
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))  # 0 disables the endpoint; cluster workers use the next ports
+METRICS_STATEMENT_SAMPLE = 16  # Every DB call is timed; one in this many also times each of its statements
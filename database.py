@@ -0,0 +1,1403 @@
+import asyncio
+import bisect
+import contextvars
+import datetime
+import functools
+import itertools
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from config import (CACHE_SIZE, CACHE_TTL, COOLDOWN_TIME_FORMAT, COOLDOWNS, DB_PRAGMAS, DB_STATEMENT_CACHE,
+    LEADERBOARDS, LEDGER_COLUMNS, LEGACY_DB_NAME, MARKET_HISTORY, METRICS_STATEMENT_SAMPLE, WRITE_BEHIND_MAX_ENTRIES)
+from metrics import metrics
+
+
+# ==================================================================================================
+#  DATABASE MANAGER (SQLITE)
+# ==================================================================================================
+
+class Record:
+    """
+    Base for compact, typed row objects. Subclasses list their columns in __slots__
+    (in SELECT order) so rows carry no per-instance __dict__.
+    """
+    __slots__ = ()
+    columns = ""  # SQL column list matching __slots__
+
+    @classmethod
+    def row_factory(cls, cursor, row):
+        return cls(*row)
+
+    def __iter__(self):
+        return (getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        return type(other) is type(self) and tuple(self) == tuple(other)
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class RPGStats(Record):
+    __slots__ = ("user_id", "rpg_class", "hp", "max_hp", "mana", "max_mana", "atk", "defense", "agility",
+                 "dungeon_depth", "battles_won")
+    columns = "user_id, rpg_class, hp, max_hp, mana, max_mana, atk, def, agility, dungeon_depth, battles_won"
+
+    def __init__(self, user_id, rpg_class, hp, max_hp, mana, max_mana, atk, defense, agility, dungeon_depth,
+                 battles_won):
+        self.user_id = user_id
+        self.rpg_class = rpg_class
+        self.hp = hp
+        self.max_hp = max_hp
+        self.mana = mana
+        self.max_mana = max_mana
+        self.atk = atk
+        self.defense = defense
+        self.agility = agility
+        self.dungeon_depth = dungeon_depth
+        self.battles_won = battles_won
+
+
+class CombatStats(Record):
+    """The slice of rpg_stats a fight needs."""
+    __slots__ = ("user_id", "hp", "atk", "defense")
+    columns = "user_id, hp, atk, def"
+
+    def __init__(self, user_id, hp, atk, defense):
+        self.user_id = user_id
+        self.hp = hp
+        self.atk = atk
+        self.defense = defense
+
+
+class TicketRow(Record):
+    __slots__ = ("channel_id", "user_id", "status", "guild_id", "opened_at")
+    columns = "channel_id, user_id, status, guild_id, opened_at"
+
+    def __init__(self, channel_id, user_id, status, guild_id, opened_at):
+        self.channel_id = channel_id
+        self.user_id = user_id
+        self.status = status
+        self.guild_id = guild_id
+        self.opened_at = opened_at
+
+
+class TupleRecord:
+    """
+    Mixin for row types built on a namedtuple, for tables read in bulk or cached per user.
+    Rows are the cursor's tuples re-typed with tuple.__new__, so no Python-level __init__ runs.
+    from_rows() does that through map() for bulk reads, with no Python call per row at all.
+    """
+    __slots__ = ()
+    columns = ""  # SQL column list matching the namedtuple fields
+
+    @classmethod
+    def row_factory(cls, cursor, row):
+        return tuple.__new__(cls, row)
+
+    @classmethod
+    def from_rows(cls, rows):
+        return list(map(tuple.__new__, itertools.repeat(cls), rows))
+
+
+class UserRow(TupleRecord, namedtuple("UserRow", "user_id wallet bank xp level reputation bio created_at")):
+    __slots__ = ()
+    columns = "user_id, wallet, bank, xp, level, reputation, bio, created_at"
+
+
+class PortfolioRow(TupleRecord, namedtuple("PortfolioRow", "user_id symbol shares avg_cost")):
+    __slots__ = ()
+    columns = "user_id, symbol, shares, avg_cost"
+
+
+class CooldownRow(TupleRecord, namedtuple("CooldownRow", "user_id last_daily last_work last_rob last_heist")):
+    __slots__ = ()
+    columns = "user_id, last_daily, last_work, last_rob, last_heist"
+
+
+class LRUCache:
+    """
+    Bounded, thread-safe LRU map with a per-entry TTL.
+    Misses return None, so None can't be cached as a value.
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class SortedPairs:
+    """
+    Sorted multiset split into chunks of ~LOAD items, with a Fenwick tree over chunk sizes.
+    Insert/remove touch one chunk (O(LOAD)), index-of is O(log n).
+    """
+    LOAD = 512
+
+    def __init__(self, items=()):
+        self.rebuild(sorted(items))
+
+    def __len__(self):
+        return self._len
+
+    def rebuild(self, ordered):
+        self._chunks = [ordered[i:i + self.LOAD] for i in range(0, len(ordered), self.LOAD)]
+        self._len = len(ordered)
+        self._reindex()
+
+    def _reindex(self):
+        self._maxes = [chunk[-1] for chunk in self._chunks]
+        tree = [0] * (len(self._chunks) + 1)
+        for i, chunk in enumerate(self._chunks, start=1):
+            tree[i] += len(chunk)
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _bump(self, i, delta):
+        i += 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _before(self, i):
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def add(self, value):
+        if not self._chunks:
+            self.rebuild([value])
+            return
+        i = bisect.bisect_left(self._maxes, value)
+        if i == len(self._chunks):
+            i -= 1
+            self._chunks[i].append(value)
+        else:
+            bisect.insort(self._chunks[i], value)
+        self._maxes[i] = self._chunks[i][-1]
+        self._len += 1
+        if len(self._chunks[i]) > 2 * self.LOAD:
+            chunk = self._chunks[i]
+            self._chunks[i:i + 1] = [chunk[:self.LOAD], chunk[self.LOAD:]]
+            self._reindex()
+        else:
+            self._bump(i, 1)
+
+    def remove(self, value):
+        i = bisect.bisect_left(self._maxes, value)
+        chunk = self._chunks[i]
+        del chunk[bisect.bisect_left(chunk, value)]
+        self._len -= 1
+        if chunk:
+            self._maxes[i] = chunk[-1]
+            self._bump(i, -1)
+        else:
+            del self._chunks[i]
+            self._reindex()
+
+    def index(self, value):
+        i = bisect.bisect_left(self._maxes, value)
+        if i == len(self._chunks):
+            return self._len
+        return self._before(i) + bisect.bisect_left(self._chunks[i], value)
+
+    def head(self, n):
+        out = []
+        for chunk in self._chunks:
+            out.extend(chunk[:n - len(out)])
+            if len(out) >= n:
+                break
+        return out
+
+
+class Leaderboard:
+    """
+    In-memory ranking kept sorted as (-score, user_id) pairs.
+    Updates touch one chunk of the sorted list; rank lookups are O(log n).
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._scores = {}
+        self._order = SortedPairs()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._order)
+
+    def load(self, rows):
+        """Replaces the board with (user_id, score) rows."""
+        with self._lock:
+            self._scores = {user_id: score for user_id, score in rows}
+            self._order.rebuild(sorted((-score, user_id) for user_id, score in self._scores.items()))
+
+    def set(self, user_id, score):
+        with self._lock:
+            self._set(user_id, score)
+
+    def _set(self, user_id, score):
+        old = self._scores.get(user_id)
+        if old == score:
+            return
+        if old is not None:
+            self._order.remove((-old, user_id))
+        self._scores[user_id] = score
+        self._order.add((-score, user_id))
+
+    def adjust(self, user_id, delta):
+        self.adjust_many({user_id: delta})
+
+    def adjust_many(self, deltas):
+        """Applies score deltas; batches touching most of the board re-sort once instead."""
+        with self._lock:
+            if len(deltas) * 4 > len(self._order) > 1024:
+                for user_id, delta in deltas.items():
+                    self._scores[user_id] = self._scores.get(user_id, 0) + delta
+                self._order.rebuild(sorted((-score, user_id) for user_id, score in self._scores.items()))
+                return
+            for user_id, delta in deltas.items():
+                if delta:
+                    self._set(user_id, self._scores.get(user_id, 0) + delta)
+
+    def add_missing(self, user_ids, score):
+        with self._lock:
+            for user_id in user_ids:
+                if user_id not in self._scores:
+                    self._set(user_id, score)
+
+    def rank(self, user_id):
+        """Returns (rank, score), 1-based, or None for unknown users."""
+        with self._lock:
+            score = self._scores.get(user_id)
+            if score is None:
+                return None
+            return self._order.index((-score, user_id)) + 1, score
+
+    def top(self, n=10):
+        with self._lock:
+            return [(user_id, -neg) for neg, user_id in self._order.head(n)]
+
+
+class WriteBehindBuffer:
+    """
+    Pending wallet/bank deltas keyed by user, merged until the next flush.
+    Thread-safe: commands add from the event loop, flushes run on the DB worker.
+    """
+
+    def __init__(self, max_entries=WRITE_BEHIND_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._pending = {}  # user_id -> [wallet_delta, bank_delta]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, user_id, amount, column="wallet"):
+        """Queues a delta. Returns True once the buffer is full and should be flushed."""
+        with self._lock:
+            deltas = self._pending.setdefault(user_id, [0, 0])
+            deltas[LEDGER_COLUMNS.index(column)] += amount
+            return len(self._pending) >= self.max_entries
+
+    def pending(self, user_id):
+        with self._lock:
+            return tuple(self._pending.get(user_id, (0, 0)))
+
+    def take(self, user_id=None):
+        """Removes and returns pending deltas, for one user or all of them."""
+        with self._lock:
+            if user_id is None:
+                pending, self._pending = self._pending, {}
+                return pending
+            deltas = self._pending.pop(user_id, None)
+            return {user_id: deltas} if deltas else {}
+
+    def restore(self, pending):
+        """Puts deltas back after a failed flush so nothing is lost."""
+        with self._lock:
+            for user_id, (wallet, bank) in pending.items():
+                deltas = self._pending.setdefault(user_id, [0, 0])
+                deltas[0] += wallet
+                deltas[1] += bank
+
+
+# --- SCHEMA MIGRATIONS ---
+# check_database() creates the baseline tables; everything after that is a numbered step
+# tracked in PRAGMA user_version. Steps must be idempotent: a crash between a step and the
+# version bump simply re-runs it on the next start.
+
+def add_column(db, table, column, declaration):
+    """ALTER TABLE ... ADD COLUMN, skipped when the column already exists."""
+    existing = {row[1] for row in db.execute(f"PRAGMA table_info({table})")}
+    if column not in existing:
+        db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+
+def _migrate_indexes(manager, db):
+    with db:
+        db.execute("CREATE INDEX IF NOT EXISTS idx_mod_logs_user ON mod_logs (user_id, case_id)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_users_net_worth ON users ((wallet + bank))")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_users_level ON users (level)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_rpg_battles_won ON rpg_stats (battles_won)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_portfolio_symbol ON portfolio (symbol)")
+
+
+def _migrate_tickets(manager, db):
+    with db:
+        db.execute('''
+                   CREATE TABLE IF NOT EXISTS tickets
+                   (
+                       channel_id
+                       INTEGER
+                       PRIMARY
+                       KEY,
+                       user_id
+                       INTEGER,
+                       status
+                       TEXT
+                   )
+                   ''')
+        add_column(db, "tickets", "guild_id", "INTEGER")
+        add_column(db, "tickets", "opened_at", "TEXT")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_tickets_user ON tickets (user_id, status)")
+
+
+def _migrate_price_history(manager, db):
+    with db:
+        db.execute('''
+                   CREATE TABLE IF NOT EXISTS stock_prices
+                   (
+                       tick
+                       INTEGER,
+                       symbol
+                       TEXT,
+                       price
+                       REAL,
+                       PRIMARY
+                       KEY
+                   (
+                       tick,
+                       symbol
+                   )
+                       )
+                   ''')
+
+
+def _migrate_legacy_import(manager, db):
+    legacy = os.path.join(os.path.dirname(os.path.abspath(manager.db_name)), LEGACY_DB_NAME)
+    if os.path.exists(legacy) and os.path.abspath(legacy) != os.path.abspath(manager.db_name):
+        manager.import_legacy(legacy)
+
+
+def _migrate_guild_settings(manager, db):
+    with db:
+        db.execute('''
+                   CREATE TABLE IF NOT EXISTS guild_settings
+                   (
+                       guild_id
+                       INTEGER
+                       PRIMARY
+                       KEY,
+                       instant_animations
+                       INTEGER
+                       DEFAULT
+                       0
+                   )
+                   ''')
+
+
+MIGRATIONS = [
+    (1, "secondary indexes", _migrate_indexes),
+    (2, "tickets table", _migrate_tickets),
+    (3, f"import {LEGACY_DB_NAME}", _migrate_legacy_import),
+    (4, "stock price history", _migrate_price_history),
+    (5, "guild settings", _migrate_guild_settings),
+]
+
+
+# --- STATEMENT TIMING ---
+STATEMENT_TIMINGS = {}  # SQL text -> its Histogram in the metrics registry
+_SQL_LISTS = re.compile(r"\bIN \(\?(?:, ?\?)+\)", re.IGNORECASE)
+
+
+def statement_timing(sql):
+    """
+    Histogram for a statement, labelled with its text: whitespace collapsed and IN lists folded, so
+    every IN (?, ?, ...) shares one series.
+    """
+    hist = STATEMENT_TIMINGS.get(sql)
+    if hist is None:
+        label = _SQL_LISTS.sub("IN (?)", " ".join(sql.split()))[:200]
+        hist = metrics.histogram("alice_db_statement_seconds", (label,))
+        if len(STATEMENT_TIMINGS) < 4096:
+            STATEMENT_TIMINGS[sql] = hist
+    return hist
+
+
+class TimedConnection(sqlite3.Connection):
+    """
+    Connection that times its statements for the metrics endpoint, used by the sampled manager calls.
+    A statement runs until the next one starts or the manager call returns, so fetching its rows
+    counts toward it; leaving a `with` block that holds a transaction starts a COMMIT (or ROLLBACK).
+    """
+    __slots__ = ("running", "since")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.running = None  # Histogram of the statement running now
+        self.since = 0.0
+
+    def mark(self, sql):
+        now = time.perf_counter()
+        if self.running is not None:
+            self.running.observe(now - self.since)
+        self.running = STATEMENT_TIMINGS.get(sql) or statement_timing(sql)
+        self.since = now
+
+    def finish(self):
+        if self.running is not None:
+            self.running.observe(time.perf_counter() - self.since)
+            self.running = None
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or TimedCursor)
+
+    def execute(self, sql, parameters=(), /):
+        self.mark(sql)
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, parameters, /):
+        self.mark(sql)
+        return super().executemany(sql, parameters)
+
+    def __exit__(self, exc_type, exc, traceback):
+        if self.in_transaction:
+            self.mark("COMMIT" if exc_type is None else "ROLLBACK")
+        return super().__exit__(exc_type, exc, traceback)
+
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=(), /):
+        self.connection.mark(sql)
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, parameters, /):
+        self.connection.mark(sql)
+        return super().executemany(sql, parameters)
+
+
+class DatabaseManager:
+    """
+    Handles all interactions with the SQLite database.
+    Auto-creates tables on initialization.
+    Methods are blocking; the bot talks to it through AsyncDatabase.
+    """
+
+    def __init__(self, db_name, write_behind=True, cache_size=CACHE_SIZE, cache_ttl=CACHE_TTL):
+        self.db_name = db_name
+        self.bal_cache = LRUCache(cache_size, cache_ttl)
+        self.rpg_cache = LRUCache(cache_size, cache_ttl)
+        self.write_buffer = WriteBehindBuffer() if write_behind else None
+        self.flush_count = 0
+        self.flushed_entries = 0
+        self._local = threading.local()
+        self._connections = []
+        self._conn_lock = threading.Lock()
+        self._known_users = set()
+        self.query_count = 0  # SQL statements issued
+        self.commits = 0
+        self.timed = metrics.enabled  # Call timings, and statement timings of sampled calls, for the metrics endpoint
+        self.timed_calls = 0
+        self.leaderboards = {name: Leaderboard(name) for name in LEADERBOARDS}
+        self.check_database()
+        self.warm_known_users()
+        self.load_leaderboards()
+
+    def connect(self):
+        """Returns this thread's long-lived connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._open_connection()
+        return conn
+
+    def _open_connection(self, factory=sqlite3.Connection):
+        conn = sqlite3.connect(self.db_name, check_same_thread=False, cached_statements=DB_STATEMENT_CACHE,
+                               factory=factory)
+        for pragma, value in DB_PRAGMAS.items():
+            sqlite3.Connection.execute(conn, f"PRAGMA {pragma} = {value}")  # Never timed, whatever the factory
+        conn.set_trace_callback(self._count_query)
+        with self._conn_lock:
+            self._connections.append(conn)
+        return conn
+
+    def _count_query(self, statement):
+        self.query_count += 1
+        if statement == "COMMIT":
+            self.commits += 1
+
+    def call(self, func, *args, **kwargs):
+        """
+        Runs a manager method and charges the SQL statements it issued to the running app command.
+        When timed, every call is observed by method, and one in METRICS_STATEMENT_SAMPLE runs on this
+        thread's TimedConnection to time its statements; the rest pay for no Python-level wrappers.
+        """
+        start = self.query_count
+        if not self.timed:
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.charge_statements(self.query_count - start)
+        self.timed_calls += 1
+        sampled = None
+        if self.timed_calls % METRICS_STATEMENT_SAMPLE == 0:
+            sampled = getattr(self._local, "timed_conn", None)
+            if sampled is None:
+                sampled = self._local.timed_conn = self._open_connection(TimedConnection)
+            plain, self._local.conn = self.connect(), sampled
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            metrics.charge_statements(self.query_count - start)
+            metrics.observe("alice_db_call_seconds", (func.__name__,), time.perf_counter() - started)
+            if sampled is not None:
+                sampled.finish()
+                self._local.conn = plain
+
+    def cache_stats(self):
+        return {"balance": self.bal_cache.stats(), "rpg_stats": self.rpg_cache.stats()}
+
+    def close(self):
+        """Flushes buffered writes, checkpoints the WAL and closes every connection."""
+        self.flush_writes()
+        with self._conn_lock:
+            for conn in self._connections:
+                try:
+                    conn.execute("PRAGMA optimize")
+                    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                except sqlite3.Error:
+                    pass
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def check_database(self):
+        print(" [SYSTEM] Checking Database Integrity...")
+        with self.connect() as db:
+            cursor = db.cursor()
+
+            # 1. Users Table (Economy & Core Stats)
+            cursor.execute('''
+                           CREATE TABLE IF NOT EXISTS users
+                           (
+                               user_id
+                               INTEGER
+                               PRIMARY
+                               KEY,
+                               wallet
+                               INTEGER
+                               DEFAULT
+                               0,
+                               bank
+                               INTEGER
+                               DEFAULT
+                               0,
+                               xp
+                               INTEGER
+                               DEFAULT
+                               0,
+                               level
+                               INTEGER
+                               DEFAULT
+                               1,
+                               reputation
+                               INTEGER
+                               DEFAULT
+                               0,
+                               bio
+                               TEXT
+                               DEFAULT
+                               'A mysterious user.',
+                               created_at
+                               TEXT
+                           )
+                           ''')
+
+            # 2. RPG Table (Combat Stats)
+            cursor.execute('''
+                           CREATE TABLE IF NOT EXISTS rpg_stats
+                           (
+                               user_id
+                               INTEGER
+                               PRIMARY
+                               KEY,
+                               rpg_class
+                               TEXT
+                               DEFAULT
+                               'Novice',
+                               hp
+                               INTEGER
+                               DEFAULT
+                               100,
+                               max_hp
+                               INTEGER
+                               DEFAULT
+                               100,
+                               mana
+                               INTEGER
+                               DEFAULT
+                               50,
+                               max_mana
+                               INTEGER
+                               DEFAULT
+                               50,
+                               atk
+                               INTEGER
+                               DEFAULT
+                               10,
+                               def
+                               INTEGER
+                               DEFAULT
+                               5,
+                               agility
+                               INTEGER
+                               DEFAULT
+                               5,
+                               dungeon_depth
+                               INTEGER
+                               DEFAULT
+                               0,
+                               battles_won
+                               INTEGER
+                               DEFAULT
+                               0
+                           )
+                           ''')
+
+            # 3. Inventory Table
+            cursor.execute('''
+                           CREATE TABLE IF NOT EXISTS inventory
+                           (
+                               user_id
+                               INTEGER,
+                               item_id
+                               TEXT,
+                               item_name
+                               TEXT,
+                               amount
+                               INTEGER,
+                               type
+                               TEXT,
+                               PRIMARY
+                               KEY
+                           (
+                               user_id,
+                               item_id
+                           )
+                               )
+                           ''')
+
+            # 4. Moderation Logs
+            cursor.execute('''
+                           CREATE TABLE IF NOT EXISTS mod_logs
+                           (
+                               case_id
+                               INTEGER
+                               PRIMARY
+                               KEY
+                               AUTOINCREMENT,
+                               user_id
+                               INTEGER,
+                               moderator_id
+                               INTEGER,
+                               action
+                               TEXT,
+                               reason
+                               TEXT,
+                               timestamp
+                               TEXT
+                           )
+                           ''')
+
+            # 5. Stock Portfolio
+            cursor.execute('''
+                           CREATE TABLE IF NOT EXISTS portfolio
+                           (
+                               user_id
+                               INTEGER,
+                               symbol
+                               TEXT,
+                               shares
+                               INTEGER,
+                               avg_cost
+                               REAL,
+                               PRIMARY
+                               KEY
+                           (
+                               user_id,
+                               symbol
+                           )
+                               )
+                           ''')
+
+            # 6. Cooldowns (Daily, Rob, Work)
+            cursor.execute('''
+                           CREATE TABLE IF NOT EXISTS cooldowns
+                           (
+                               user_id
+                               INTEGER
+                               PRIMARY
+                               KEY,
+                               last_daily
+                               TEXT,
+                               last_work
+                               TEXT,
+                               last_rob
+                               TEXT,
+                               last_heist
+                               TEXT
+                           )
+                           ''')
+
+            db.commit()
+        self.migrate()
+        print(" [SYSTEM] Database Check Complete.")
+
+    def migrate(self):
+        """Applies every migration newer than the file's user_version, in order."""
+        db = self.connect()
+        version = db.execute("PRAGMA user_version").fetchone()[0]
+        for target, description, step in MIGRATIONS:
+            if target <= version:
+                continue
+            started = time.perf_counter()
+            step(self, db)
+            db.execute(f"PRAGMA user_version = {target}")
+            print(f" [SYSTEM] Migrated database to v{target} ({description}) in {time.perf_counter() - started:.2f}s")
+
+    def import_legacy(self, path):
+        """
+        Bulk-copies an old alice_brain.db into the current schema with INSERT ... SELECT.
+        Existing rows win; missing legacy tables are skipped.
+        """
+        created_at = datetime.datetime.now().isoformat()
+        statements = {
+            "users": [
+                ('''INSERT OR IGNORE INTO users (user_id, wallet, bank, xp, level, reputation, created_at)
+                    SELECT user_id, wallet, bank, xp, level, reputation, ? FROM legacy.users''', (created_at,)),
+                ('''INSERT OR IGNORE INTO rpg_stats (user_id, rpg_class, hp, max_hp, mana, atk, def)
+                    SELECT user_id, rpg_class, hp, max_hp, mana, atk, def FROM legacy.users''', ()),
+            ],
+            "cooldowns": [
+                ('''INSERT OR IGNORE INTO cooldowns (user_id, last_daily, last_work, last_rob)
+                    SELECT user_id, last_daily, last_work, last_rob FROM legacy.cooldowns''', ()),
+            ],
+            "portfolio": [
+                ('''INSERT OR IGNORE INTO portfolio (user_id, symbol, shares, avg_cost)
+                    SELECT user_id, stock_symbol, amount, avg_price FROM legacy.portfolio''', ()),
+            ],
+            "inventory": [
+                ('''INSERT OR IGNORE INTO inventory (user_id, item_id, item_name, amount, type)
+                    SELECT user_id, item_name, item_name, amount, type FROM legacy.inventory''', ()),
+            ],
+            "tickets": [
+                ('''INSERT OR IGNORE INTO tickets (channel_id, user_id, status)
+                    SELECT channel_id, user_id, status FROM legacy.tickets''', ()),
+            ],
+        }
+
+        db = self.connect()
+        db.execute("ATTACH DATABASE ? AS legacy", (path,))
+        try:
+            tables = {row[0] for row in db.execute("SELECT name FROM legacy.sqlite_master WHERE type = 'table'")}
+            with db:
+                for table, queries in statements.items():
+                    if table not in tables:
+                        continue
+                    for query, params in queries:
+                        db.execute(query, params)
+                # Legacy users may lack a cooldowns row
+                db.execute("INSERT OR IGNORE INTO cooldowns (user_id) SELECT user_id FROM users")
+        finally:
+            db.execute("DETACH DATABASE legacy")
+        self.bal_cache.clear()
+        self.rpg_cache.clear()
+        self.warm_known_users()
+        self.load_leaderboards()
+        print(f" [SYSTEM] Imported legacy database {path}.")
+
+    def warm_known_users(self):
+        """Loads every fully registered user so register_user can skip them without a query."""
+        with self.connect() as db:
+            cursor = db.execute('''
+                                SELECT u.user_id
+                                FROM users u
+                                         JOIN rpg_stats r ON r.user_id = u.user_id
+                                         JOIN cooldowns c ON c.user_id = u.user_id
+                                ''')
+            self._known_users = {row[0] for row in cursor}
+        print(f" [SYSTEM] {len(self._known_users)} registered users cached.")
+
+    def register_user(self, user_id):
+        """Ensures a user exists in all necessary tables."""
+        if user_id not in self._known_users:
+            self.register_users([user_id])
+
+    def load_leaderboards(self):
+        """Rebuilds every in-memory board from its indexed query."""
+        started = time.perf_counter()
+        with self.connect() as db:
+            for name, (_, query) in LEADERBOARDS.items():
+                self.leaderboards[name].load(db.execute(query))
+        print(f" [SYSTEM] Leaderboards loaded in {time.perf_counter() - started:.2f}s.")
+
+    def _track_net_worth(self, deltas):
+        deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+        if deltas:
+            self.leaderboards["networth"].adjust_many(deltas)
+
+    def register_users(self, user_ids):
+        """Registers every unseen user in one transaction of INSERT OR IGNORE batches."""
+        new_users = [(uid,) for uid in set(user_ids) if uid not in self._known_users]
+        if not new_users:
+            return
+
+        created_at = datetime.datetime.now().isoformat()
+        with self.connect() as db:
+            db.executemany("INSERT OR IGNORE INTO users (user_id, created_at) VALUES (?, ?)",
+                           [(uid, created_at) for (uid,) in new_users])
+            db.executemany("INSERT OR IGNORE INTO rpg_stats (user_id) VALUES (?)", new_users)
+            db.executemany("INSERT OR IGNORE INTO cooldowns (user_id) VALUES (?)", new_users)
+        self._known_users.update(uid for (uid,) in new_users)
+        new_ids = [uid for (uid,) in new_users]
+        self.leaderboards["networth"].add_missing(new_ids, 0)
+        self.leaderboards["battles"].add_missing(new_ids, 0)
+        self.leaderboards["level"].add_missing(new_ids, 1)
+
+    def get_user(self, user_id):
+        user = self.bal_cache.get(user_id)
+        if user is None:
+            self.register_user(user_id)
+            user = self._fetch_one(UserRow, "users", user_id)
+            self.bal_cache.put(user_id, user)
+        if self.write_buffer is not None:
+            # Read-your-writes: include deltas that haven't been flushed yet
+            wallet_delta, bank_delta = self.write_buffer.pending(user_id)
+            if wallet_delta or bank_delta:
+                user = user._replace(wallet=user.wallet + wallet_delta, bank=user.bank + bank_delta)
+        return user
+
+    def update_bal(self, user_id, amount, bank=False):
+        column = "bank" if bank else "wallet"
+        if self.write_buffer is not None:
+            if self.write_buffer.add(user_id, amount, column):
+                self.flush_writes()
+            return
+        self.register_user(user_id)
+        with self.connect() as db:
+            db.execute(f"UPDATE users SET {column} = {column} + ? WHERE user_id = ?", (amount, user_id))
+        self.bal_cache.invalidate(user_id)
+        self._track_net_worth({user_id: amount})
+
+    def flush_writes(self):
+        """Commits every buffered balance delta in one transaction. Returns how many users were written."""
+        if self.write_buffer is None:
+            return 0
+        pending = self.write_buffer.take()
+        if not pending:
+            return 0
+        try:
+            self.register_users(pending.keys())
+            with self.connect() as db:
+                db.executemany("UPDATE users SET wallet = wallet + ?, bank = bank + ? WHERE user_id = ?",
+                               [(wallet, bank, user_id) for user_id, (wallet, bank) in pending.items()])
+        except Exception:
+            self.write_buffer.restore(pending)
+            raise
+        finally:
+            for user_id in pending:
+                self.bal_cache.invalidate(user_id)
+        self.flush_count += 1
+        self.flushed_entries += len(pending)
+        self._track_net_worth({user_id: wallet + bank for user_id, (wallet, bank) in pending.items()})
+        return len(pending)
+
+    def _apply_pending(self, db, user_id):
+        """Folds a user's buffered deltas into the caller's transaction before a conditional update."""
+        if self.write_buffer is None:
+            return None
+        pending = self.write_buffer.take(user_id)
+        if pending:
+            wallet, bank = pending[user_id]
+            db.execute("UPDATE users SET wallet = wallet + ?, bank = bank + ? WHERE user_id = ?",
+                       (wallet, bank, user_id))
+        return pending
+
+    # --- LEDGER ---
+    # Each operation is a single conditional UPDATE in its own transaction, so a balance
+    # can never be spent twice by commands racing each other.
+
+    def transfer(self, user_id, amount, source="wallet", target="bank"):
+        """Moves funds between two of a user's balances. Returns False if the source can't cover it."""
+        if source not in LEDGER_COLUMNS or target not in LEDGER_COLUMNS or source == target:
+            raise ValueError(f"Invalid transfer {source} -> {target}")
+        self.register_user(user_id)
+        pending = None
+        try:
+            with self.connect() as db:
+                pending = self._apply_pending(db, user_id)
+                cursor = db.execute(f'''
+                                    UPDATE users
+                                    SET {source} = {source} - ?,
+                                        {target} = {target} + ?
+                                    WHERE user_id = ?
+                                      AND {source} >= ?
+                                    ''', (amount, amount, user_id, amount))
+                moved = cursor.rowcount == 1
+        except Exception:
+            if pending:
+                self.write_buffer.restore(pending)
+            raise
+        finally:
+            self.bal_cache.invalidate(user_id)
+        if pending:
+            self._track_net_worth({user_id: sum(pending[user_id])})
+        return moved
+
+    def debit(self, user_id, amount, column="wallet"):
+        """Removes funds only if the balance covers them. Returns whether the debit happened."""
+        if column not in LEDGER_COLUMNS:
+            raise ValueError(f"Invalid ledger column {column}")
+        self.register_user(user_id)
+        pending = None
+        try:
+            with self.connect() as db:
+                pending = self._apply_pending(db, user_id)
+                cursor = db.execute(f"UPDATE users SET {column} = {column} - ? WHERE user_id = ? AND {column} >= ?",
+                                    (amount, user_id, amount))
+                debited = cursor.rowcount == 1
+        except Exception:
+            if pending:
+                self.write_buffer.restore(pending)
+            raise
+        finally:
+            self.bal_cache.invalidate(user_id)
+        change = sum(pending[user_id]) if pending else 0
+        self._track_net_worth({user_id: change - amount if debited else change})
+        return debited
+
+    def credit(self, user_id, amount, column="wallet"):
+        if column not in LEDGER_COLUMNS:
+            raise ValueError(f"Invalid ledger column {column}")
+        self.update_bal(user_id, amount, bank=(column == "bank"))
+
+    def _fetch_one(self, record, table, user_id):
+        with self.connect() as db:
+            cursor = db.cursor()
+            cursor.row_factory = record.row_factory
+            cursor.execute(f"SELECT {record.columns} FROM {table} WHERE user_id = ?", (user_id,))
+            return cursor.fetchone()
+
+    def get_rpg_stats(self, user_id):
+        stats = self.rpg_cache.get(user_id)
+        if stats is None:
+            self.register_user(user_id)
+            stats = self._fetch_one(RPGStats, "rpg_stats", user_id)
+            self.rpg_cache.put(user_id, stats)
+        return stats
+
+    def get_combat_stats(self, user_id):
+        """HP/ATK/DEF only: served from the stats cache when warm, otherwise a projected query."""
+        stats = self.rpg_cache.get(user_id)
+        if stats is not None:
+            return CombatStats(user_id, stats.hp, stats.atk, stats.defense)
+        self.register_user(user_id)
+        return self._fetch_one(CombatStats, "rpg_stats", user_id)
+
+    def get_cooldowns(self, user_id):
+        self.register_user(user_id)
+        return self._fetch_one(CooldownRow, "cooldowns", user_id)
+
+    def load_cooldowns(self, windows=COOLDOWNS):
+        """Returns (command, user_id, used_at) for every cooldown still running, from one table scan."""
+        if not windows:
+            return []
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cutoffs = [(command, column, (now - datetime.timedelta(seconds=seconds)).strftime(COOLDOWN_TIME_FORMAT))
+                   for command, (column, seconds) in windows.items()]
+        where = " OR ".join(f"{column} > ?" for _, column, _ in cutoffs)
+        rows = []
+        with self.connect() as db:
+            cursor = db.execute(f"SELECT {CooldownRow.columns} FROM cooldowns WHERE {where}",
+                                [cutoff for _, _, cutoff in cutoffs])
+            for row in CooldownRow.from_rows(cursor):
+                for command, column, cutoff in cutoffs:
+                    stamp = getattr(row, column)
+                    if stamp is not None and stamp > cutoff:
+                        used_at = datetime.datetime.strptime(stamp, COOLDOWN_TIME_FORMAT)
+                        rows.append((command, row.user_id, used_at.replace(tzinfo=datetime.timezone.utc).timestamp()))
+        return rows
+
+    def save_cooldowns(self, rows):
+        """Writes a batch of (column, user_id, used_at) in one transaction. None clears a cooldown."""
+        if not rows:
+            return
+        self.register_users({user_id for _, user_id, _ in rows})
+        by_column = {}
+        for column, user_id, used_at in rows:
+            stamp = None
+            if used_at is not None:
+                stamp = datetime.datetime.fromtimestamp(used_at, datetime.timezone.utc).strftime(COOLDOWN_TIME_FORMAT)
+            by_column.setdefault(column, []).append((stamp, user_id))
+        with self.connect() as db:
+            for column, params in by_column.items():
+                db.executemany(f"UPDATE cooldowns SET {column} = ? WHERE user_id = ?", params)
+
+    def get_portfolio(self, user_id):
+        with self.connect() as db:
+            return PortfolioRow.from_rows(db.execute(
+                f"SELECT {PortfolioRow.columns} FROM portfolio WHERE user_id = ? AND shares > 0", (user_id,)))
+
+    def load_holdings(self):
+        with self.connect() as db:
+            return PortfolioRow.from_rows(db.execute(f"SELECT {PortfolioRow.columns} FROM portfolio WHERE shares > 0"))
+
+    def save_price_snapshot(self, rows, keep=MARKET_HISTORY):
+        """Bulk-inserts one market tick and drops ticks older than the history window."""
+        if not rows:
+            return
+        tick = rows[0][0]
+        with self.connect() as db:
+            db.executemany("INSERT OR REPLACE INTO stock_prices (tick, symbol, price) VALUES (?, ?, ?)", rows)
+            db.execute("DELETE FROM stock_prices WHERE tick <= ?", (tick - keep,))
+
+    def load_price_history(self, keep=MARKET_HISTORY):
+        with self.connect() as db:
+            return db.execute('''
+                              SELECT tick, symbol, price
+                              FROM stock_prices
+                              WHERE tick > (SELECT MAX(tick) FROM stock_prices) - ?
+                              ORDER BY tick
+                              ''', (keep,)).fetchall()
+
+    def load_instant_guilds(self):
+        with self.connect() as db:
+            return [row[0] for row in db.execute("SELECT guild_id FROM guild_settings WHERE instant_animations = 1")]
+
+    def set_instant_animations(self, guild_id, enabled):
+        with self.connect() as db:
+            db.execute('''INSERT INTO guild_settings (guild_id, instant_animations) VALUES (?, ?)
+                          ON CONFLICT(guild_id) DO UPDATE SET instant_animations = excluded.instant_animations''',
+                       (guild_id, int(enabled)))
+
+    def open_ticket(self, channel_id, user_id, guild_id):
+        with self.connect() as db:
+            opened_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            db.execute("INSERT OR REPLACE INTO tickets (channel_id, user_id, status, guild_id, opened_at) "
+                       "VALUES (?, ?, 'open', ?, ?)", (channel_id, user_id, guild_id, opened_at))
+
+    def close_ticket(self, channel_id):
+        with self.connect() as db:
+            db.execute("UPDATE tickets SET status = 'closed' WHERE channel_id = ?", (channel_id,))
+
+    def get_ticket(self, channel_id):
+        with self.connect() as db:
+            cursor = db.cursor()
+            cursor.row_factory = TicketRow.row_factory
+            cursor.execute(f"SELECT {TicketRow.columns} FROM tickets WHERE channel_id = ?", (channel_id,))
+            return cursor.fetchone()
+
+    def get_open_ticket(self, guild_id, user_id):
+        """Channel id of the user's open ticket in a guild, or None."""
+        with self.connect() as db:
+            row = db.execute("SELECT channel_id FROM tickets WHERE user_id = ? AND status = 'open' AND guild_id = ?",
+                             (user_id, guild_id)).fetchone()
+            return row[0] if row else None
+
+    def log_mod_action(self, user_id, mod_id, action, reason):
+        with self.connect() as db:
+            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            db.execute("INSERT INTO mod_logs (user_id, moderator_id, action, reason, timestamp) VALUES (?, ?, ?, ?, ?)",
+                       (user_id, mod_id, action, reason, timestamp))
+
+    def set_rpg_class(self, user_id, class_name, hp, atk, defense, agility):
+        self.register_user(user_id)
+        with self.connect() as db:
+            db.execute('''
+                       UPDATE rpg_stats
+                       SET rpg_class=?,
+                           hp=?,
+                           max_hp=?,
+                           atk=?,
+                           def=?,
+                           agility=?
+                       WHERE user_id = ?
+                       ''', (class_name, hp, hp, atk, defense, agility, user_id))
+        self.rpg_cache.invalidate(user_id)
+
+    def set_hp(self, user_id, hp):
+        with self.connect() as db:
+            db.execute("UPDATE rpg_stats SET hp=? WHERE user_id=?", (hp, user_id))
+        self.rpg_cache.invalidate(user_id)
+
+    def restore_hp(self, user_id, cost=0):
+        """Heals to full, charging cost from the wallet in the same transaction. False if too poor."""
+        self.register_user(user_id)
+        pending = None
+        try:
+            with self.connect() as db:
+                if cost:
+                    pending = self._apply_pending(db, user_id)
+                    cursor = db.execute("UPDATE users SET wallet = wallet - ? WHERE user_id = ? AND wallet >= ?",
+                                        (cost, user_id, cost))
+                    paid = cursor.rowcount == 1
+                else:
+                    paid = True
+                if paid:
+                    db.execute("UPDATE rpg_stats SET hp = max_hp WHERE user_id=?", (user_id,))
+        except Exception:
+            if pending:
+                self.write_buffer.restore(pending)
+            raise
+        finally:
+            self.bal_cache.invalidate(user_id)
+            self.rpg_cache.invalidate(user_id)
+        change = sum(pending[user_id]) if pending else 0
+        self._track_net_worth({user_id: change - cost if paid else change})
+        return paid
+
+    def add_battle_win(self, user_id):
+        with self.connect() as db:
+            db.execute("UPDATE rpg_stats SET battles_won = battles_won + 1 WHERE user_id=?", (user_id,))
+        self.rpg_cache.invalidate(user_id)
+        self.leaderboards["battles"].adjust(user_id, 1)
+
+    def settle_orders(self, fills):
+        """
+        Executes a batch of (user_id, symbol, side, shares, price) fills in one transaction.
+        Buys are a conditional wallet debit plus an upsert that re-weights avg_cost in the same
+        statement; sells are a conditional share decrement plus a wallet credit.
+        Returns (filled, cash) per fill, cash being the cost paid or proceeds received.
+        """
+        users = {fill[0] for fill in fills}
+        self.register_users(users)
+        results = []
+        cash_deltas = {}
+        pending = {}
+        try:
+            with self.connect() as db:
+                for user_id in users:
+                    pending.update(self._apply_pending(db, user_id) or {})
+                for user_id, symbol, side, shares, price in fills:
+                    if side == "buy":
+                        cash = math.ceil(price * shares)
+                        cursor = db.execute("UPDATE users SET wallet = wallet - ? WHERE user_id = ? AND wallet >= ?",
+                                            (cash, user_id, cash))
+                        filled = cursor.rowcount == 1
+                        if filled:
+                            db.execute('''
+                                       INSERT INTO portfolio (user_id, symbol, shares, avg_cost)
+                                       VALUES (?, ?, ?, ?)
+                                       ON CONFLICT (user_id, symbol) DO UPDATE
+                                           SET avg_cost = (shares * avg_cost + excluded.shares * excluded.avg_cost)
+                                                              / (shares + excluded.shares),
+                                               shares   = shares + excluded.shares
+                                       ''', (user_id, symbol, shares, cash / shares))
+                            cash_deltas[user_id] = cash_deltas.get(user_id, 0) - cash
+                    else:
+                        cash = math.floor(price * shares)
+                        cursor = db.execute('''
+                                            UPDATE portfolio
+                                            SET shares = shares - ?
+                                            WHERE user_id = ?
+                                              AND symbol = ?
+                                              AND shares >= ?
+                                            ''', (shares, user_id, symbol, shares))
+                        filled = cursor.rowcount == 1
+                        if filled:
+                            db.execute("UPDATE users SET wallet = wallet + ? WHERE user_id = ?", (cash, user_id))
+                            db.execute("DELETE FROM portfolio WHERE user_id = ? AND symbol = ? AND shares = 0",
+                                       (user_id, symbol))
+                            cash_deltas[user_id] = cash_deltas.get(user_id, 0) + cash
+                    results.append((filled, cash))
+        except Exception:
+            if pending:
+                self.write_buffer.restore(pending)
+            raise
+        finally:
+            for user_id in users:
+                self.bal_cache.invalidate(user_id)
+
+        for user_id, deltas in pending.items():
+            cash_deltas[user_id] = cash_deltas.get(user_id, 0) + sum(deltas)
+        self._track_net_worth(cash_deltas)
+        return results
+
+
+# --- CLUSTER ROUTING ---
+# In cluster mode only the writer process opens the database. Workers attach `db` to it and every
+# call below (manager methods, the routed facade methods and registered writer calls) crosses IPC.
+WRITER_CALLS = {}  # name -> coroutine function the writer runs for workers
+
+
+def routed(method):
+    """AsyncDatabase method that an attached worker forwards to the writer process."""
+    @functools.wraps(method)
+    async def call(self, *args, **kwargs):
+        if self.remote is not None:
+            return await self.remote.call(method.__name__, args, kwargs)
+        return await method(self, *args, **kwargs)
+    return call
+
+
+def writer_call(func):
+    """
+    Registers a coroutine that works on state owned by the writer process (holdings, cooldowns).
+    Called in a worker, it runs in the writer instead; in a single process it just runs.
+    """
+    WRITER_CALLS[func.__name__] = func
+
+    @functools.wraps(func)
+    async def call(*args, **kwargs):
+        if db.remote is not None:
+            return await db.remote.call(func.__name__, args, kwargs)
+        return await func(*args, **kwargs)
+    return call
+
+
+class AsyncDatabase:
+    """
+    Async facade over DatabaseManager.
+    Every call runs on a dedicated worker thread so disk I/O never blocks the gateway.
+    A single worker (the default) also serializes all SQLite writes.
+    """
+
+    def __init__(self, manager: DatabaseManager = None, workers: int = 1):
+        self.manager = manager
+        self.remote = None  # WriterClient when this process is a cluster worker
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="alice-db")
+
+    def attach(self, client):
+        """Sends every call to the cluster's writer process instead of opening the file here."""
+        self.remote = client
+
+    async def open(self, db_name, **kwargs):
+        """Builds the manager (schema check, migrations, cache warm-up) on the worker thread."""
+        loop = asyncio.get_running_loop()
+        self.manager = await loop.run_in_executor(self._executor, lambda: DatabaseManager(db_name, **kwargs))
+        return self
+
+    async def run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        context = contextvars.copy_context()  # The worker charges statements to the calling command
+        try:
+            return await loop.run_in_executor(self._executor,
+                                              lambda: context.run(self.manager.call, func, *args, **kwargs))
+        finally:
+            metrics.charge_db(time.perf_counter() - started)
+
+    def __getattr__(self, name):
+        if self.remote is not None:
+            async def remote_call(*args, **kwargs):
+                return await self.remote.call(name, args, kwargs)
+
+            remote_call.__name__ = name
+            return remote_call
+        if self.manager is None:
+            raise RuntimeError(f"Database is not open (accessed {name!r} before db.open())")
+        attr = getattr(self.manager, name)
+        if not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            return await self.run(attr, *args, **kwargs)
+
+        call.__name__ = name
+        return call
+
+    @routed
+    async def update_bal(self, user_id, amount, bank=False):
+        # Buffered deltas are queued straight from the event loop; only a full buffer costs a DB round trip.
+        buffer = self.manager.write_buffer
+        if buffer is None:
+            return await self.run(self.manager.update_bal, user_id, amount, bank)
+        if buffer.add(user_id, amount, "bank" if bank else "wallet"):
+            try:
+                await self.run(self.manager.flush_writes)
+            except Exception as e:
+                # The delta is queued either way: a failed flush puts it back for flush_writes_loop
+                print(f" [ERROR] Write-behind flush failed: {e}")
+
+    async def credit(self, user_id, amount, column="wallet"):
+        if column not in LEDGER_COLUMNS:
+            raise ValueError(f"Invalid ledger column {column}")
+        await self.update_bal(user_id, amount, bank=(column == "bank"))
+
+    @routed
+    async def leaderboard_top(self, key, count=10):
+        return self.manager.leaderboards[key].top(count)
+
+    @routed
+    async def leaderboard_rank(self, key, user_id):
+        """Returns ((rank, score) or None, board size)."""
+        board = self.manager.leaderboards[key]
+        return board.rank(user_id), len(board)
+
+    def close(self):
+        """Waits for queued queries, then flushes and closes every worker connection."""
+        self._executor.shutdown(wait=True)
+        if self.manager is not None:
+            self.manager.close()
+
+
+# Opened by main() with `await db.open(DB_NAME)`; importing this module touches no files.
+db = AsyncDatabase()
@@ -0,0 +1,359 @@
+import random
+import time
+from array import array
+from collections import deque
+from config import (BJ_JOIN_WINDOW, BJ_MAX_HANDS, BJ_MAX_SEATS, BJ_PENETRATION, BJ_SHOE_DECKS, BJ_SHOE_TTL,
+    BJ_TURN_TIMEOUT)
+from utils import rng_service
+
+
+# ==================================================================================================
+#  GAME ENGINES (COMBAT, CASINO)
+# ==================================================================================================
+
+# Pure game logic shared by the cogs, the simulator and the benchmarks.
+
+RPG_CLASSES = {
+    "Warrior": {"hp": 150, "atk": 15, "def": 10, "agl": 5},
+    "Mage": {"hp": 90, "atk": 25, "def": 3, "agl": 8},
+    "Rogue": {"hp": 110, "atk": 20, "def": 5, "agl": 20},
+    "Tank": {"hp": 200, "atk": 8, "def": 20, "agl": 2}
+}
+
+MONSTERS = [
+    {"name": "Slime", "hp": 30, "atk": 5, "xp": 10, "gold": 10,
+     "img": "https://media.giphy.com/media/l41YkZk2uYhU8C5ri/giphy.gif"},
+    {"name": "Goblin Scout", "hp": 50, "atk": 10, "xp": 25, "gold": 30,
+     "img": "https://media.giphy.com/media/2gLxx75OmfCaNu2yI8/giphy.gif"},
+    {"name": "Orc Brute", "hp": 120, "atk": 18, "xp": 100, "gold": 150,
+     "img": "https://media.giphy.com/media/3o7TKrEzvJbsQNT6z6/giphy.gif"},
+    {"name": "Dark Wizard", "hp": 80, "atk": 40, "xp": 200, "gold": 300,
+     "img": "https://media.giphy.com/media/12NUbkX6p4xOO4/giphy.gif"},
+    {"name": "Elder Dragon", "hp": 500, "atk": 70, "xp": 1000, "gold": 2000,
+     "img": "https://media.giphy.com/media/11jGtzDu7xBkR2/giphy.gif"}
+]
+
+
+def resolve_fight(p_hp, p_atk, p_def, m_hp, m_atk, rng, keep=3):
+    """
+    Pure combat engine. Plays the fight out turn by turn without formatting anything;
+    only the last `keep` events are kept as raw (turn, attacker, damage, crit) tuples.
+    Returns (won, remaining player HP, turns, tail).
+    """
+    rand = rng.random
+    randint = rng.randint
+    tail = deque(maxlen=keep) if keep else None
+    turn = 1
+
+    while True:
+        # Player hits (a + (b - a) * random() is exactly rng.uniform, without the call overhead)
+        dmg = int(p_atk * (0.9 + (1.1 - 0.9) * rand()))
+        if dmg < 1: dmg = 1
+        crit = rand() < 0.1
+        if crit: dmg *= 2
+        m_hp -= dmg
+        if tail is not None: tail.append((turn, 0, dmg, crit))
+
+        if m_hp <= 0:
+            return True, p_hp, turn, tail
+
+        # Monster hits
+        dmg_taken = int(m_atk * (0.8 + (1.2 - 0.8) * rand())) - randint(0, p_def)
+        if dmg_taken < 0: dmg_taken = 0
+        p_hp -= dmg_taken
+        if tail is not None: tail.append((turn, 1, dmg_taken, False))
+
+        if p_hp <= 0:
+            return False, p_hp, turn, tail
+        turn += 1
+
+
+def resolve_fights(fights, rng, keep=0):
+    """
+    Batch resolution for raids, auto-battle and balancing.
+    `fights` is an iterable of (p_hp, p_atk, p_def, monster) and results come back in the same order.
+    """
+    return [resolve_fight(p_hp, p_atk, p_def, monster['hp'], monster['atk'], rng, keep)
+            for p_hp, p_atk, p_def, monster in fights]
+
+
+def format_combat_log(tail, monster_name):
+    lines = []
+    for turn, attacker, dmg, crit in tail:
+        if attacker == 0:
+            lines.append(f"Turn {turn}: You deal **{dmg}** dmg {'(CRIT!)' if crit else ''}")
+        else:
+            lines.append(f"Turn {turn}: {monster_name} deals **{dmg}** dmg")
+    return lines
+
+
+def bench_combat(fights=100_000, seed=0):
+    """Microbenchmark: fights resolved per second against a random monster mix."""
+    rng = random.Random(seed)
+    batch = [(150, 15, 10, rng.choice(MONSTERS)) for _ in range(fights)]
+    started = time.perf_counter()
+    resolve_fights(batch, rng)
+    elapsed = time.perf_counter() - started
+    print(f" [BENCH] Combat: {fights:,} fights in {elapsed:.2f}s ({fights / elapsed:,.0f} fights/sec)")
+    return fights / elapsed
+
+
+COIN_SIDES = ("heads", "tails")
+SLOT_SYMBOLS = ["🍒", "🍊", "🍋", "🍇", "💎", "7️⃣", "🔔"]
+BJ_DECK = [2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10, 11] * 4
+
+
+def flip_coin(rng):
+    return rng.choice(COIN_SIDES)
+
+
+def spin_slots(rng):
+    return rng.choice(SLOT_SYMBOLS), rng.choice(SLOT_SYMBOLS), rng.choice(SLOT_SYMBOLS)
+
+
+def slots_result(reels, bet):
+    """Returns (outcome, change) where change is the player's net win or loss."""
+    a, b, c = reels
+    if a == b == c:
+        return "jackpot", bet * 10
+    if a == b or b == c or a == c:
+        return "pair", int(bet * 1.5)
+    return "loss", -bet
+
+
+def blackjack_result(p_score, d_score, bet):
+    """Returns (outcome, change) for a finished hand."""
+    if p_score > 21:
+        return "bust", -bet
+    if d_score > 21:
+        return "dealer_bust", bet
+    if p_score > d_score:
+        return "win", bet
+    if p_score == d_score:
+        return "push", 0
+    return "lose", -bet
+
+
+class Shoe:
+    """
+    Multi-deck shoe. The cards are shuffled once into a flat array and dealt from its end,
+    so a draw is an O(1) pop. Reshuffles between rounds once play passes the cut card.
+    Shuffles draw their seeds from `rngs` (the bot's RNGService unless a simulation passes its own).
+    """
+    __slots__ = ("decks", "cut", "cards", "seed", "last_used", "rngs")
+
+    def __init__(self, decks=BJ_SHOE_DECKS, penetration=BJ_PENETRATION, rngs=rng_service):
+        self.decks = decks
+        self.cut = int(len(BJ_DECK) * decks * (1 - penetration))
+        self.last_used = time.monotonic()
+        self.rngs = rngs
+        self.shuffle()
+
+    def __len__(self):
+        return len(self.cards)
+
+    def shuffle(self):
+        self.seed, rng = self.rngs.round("blackjack")
+        cards = BJ_DECK * self.decks
+        rng.shuffle(cards)
+        self.cards = array("b", cards)
+
+    def draw(self):
+        if not self.cards:
+            self.shuffle()
+        return self.cards.pop()
+
+    @property
+    def dealt(self):
+        return len(BJ_DECK) * self.decks - len(self.cards)
+
+
+class BlackjackHand:
+    """A hand scored incrementally: adding a card updates the total and soft-ace count in O(1)."""
+    __slots__ = ("cards", "total", "soft", "bet", "done")
+
+    def __init__(self, bet=0, cards=()):
+        self.cards = []
+        self.total = 0
+        self.soft = 0  # Aces still counted as 11
+        self.bet = bet
+        self.done = False
+        for card in cards:
+            self.add(card)
+
+    def add(self, card):
+        self.cards.append(card)
+        self.total += card
+        if card == 11:
+            self.soft += 1
+        while self.total > 21 and self.soft:
+            self.total -= 10
+            self.soft -= 1
+        if self.total >= 21:
+            self.done = True
+        return self.total
+
+    @property
+    def can_split(self):
+        return len(self.cards) == 2 and self.cards[0] == self.cards[1]
+
+    @property
+    def can_double(self):
+        return len(self.cards) == 2 and not self.done
+
+
+class BlackjackTable:
+    """
+    One round at a channel's table. Seats map user_id -> hands (more than one after a split).
+    Players act on their own hands in any order; the dealer plays once every hand is done.
+    """
+    __slots__ = ("channel_id", "shoe", "host_id", "phase", "seats", "dealer", "deadline", "first_card",
+                 "interaction")
+
+    def __init__(self, channel_id, shoe, host_id, bet):
+        self.channel_id = channel_id
+        self.shoe = shoe
+        self.host_id = host_id
+        self.phase = "betting"
+        self.seats = {host_id: [BlackjackHand(bet)]}
+        self.dealer = BlackjackHand()
+        self.deadline = time.monotonic() + BJ_JOIN_WINDOW
+        self.first_card = 0
+        self.interaction = None  # The /blackjack call that posted the table message
+
+    def join(self, user_id, bet):
+        if self.phase != "betting" or user_id in self.seats or len(self.seats) >= BJ_MAX_SEATS:
+            return False
+        self.seats[user_id] = [BlackjackHand(bet)]
+        return True
+
+    def deal(self):
+        shoe = self.shoe
+        if len(shoe) <= shoe.cut:
+            shoe.shuffle()
+        self.first_card = shoe.dealt
+        draw = shoe.draw
+        for _ in range(2):
+            for hands in self.seats.values():
+                hands[0].add(draw())
+            self.dealer.add(draw())
+        self.dealer.done = False  # The dealer's total only matters once players are done
+        self.phase = "playing"
+        self.deadline = time.monotonic() + BJ_TURN_TIMEOUT
+
+    def hand(self, user_id):
+        """The user's hand in play, or None."""
+        for hand in self.seats.get(user_id, ()):
+            if not hand.done:
+                return hand
+        return None
+
+    def hit(self, hand):
+        hand.add(self.shoe.draw())
+
+    def stand(self, hand):
+        hand.done = True
+
+    def double(self, hand):
+        hand.bet *= 2
+        hand.add(self.shoe.draw())
+        hand.done = True
+
+    def split(self, user_id, hand):
+        hands = self.seats[user_id]
+        first, second = hand.cards
+        left = BlackjackHand(hand.bet, (first, self.shoe.draw()))
+        right = BlackjackHand(hand.bet, (second, self.shoe.draw()))
+        if first == 11:
+            left.done = right.done = True  # Split aces take one card each
+        i = hands.index(hand)
+        hands[i:i + 1] = [left, right]
+
+    def touch(self):
+        self.deadline = time.monotonic() + BJ_TURN_TIMEOUT
+
+    @property
+    def finished(self):
+        return all(hand.done for hands in self.seats.values() for hand in hands)
+
+    def finish(self):
+        """Stands every open hand, plays the dealer and returns {user_id: [(hand, outcome, change)]}."""
+        for hands in self.seats.values():
+            for hand in hands:
+                hand.done = True
+        if any(hand.total <= 21 for hands in self.seats.values() for hand in hands):
+            draw = self.shoe.draw
+            while self.dealer.total < 17:
+                self.dealer.add(draw())
+        self.phase = "done"
+        self.shoe.last_used = time.monotonic()
+        d_score = self.dealer.total
+        return {user_id: [(hand, *blackjack_result(hand.total, d_score, hand.bet)) for hand in hands]
+                for user_id, hands in self.seats.items()}
+
+
+class BlackjackTables:
+    """In-memory session table: at most one table per channel, plus each channel's shoe."""
+
+    def __init__(self):
+        self.tables = {}  # channel_id -> BlackjackTable
+        self.shoes = {}  # channel_id -> Shoe
+
+    def __len__(self):
+        return len(self.tables)
+
+    def get(self, channel_id):
+        return self.tables.get(channel_id)
+
+    def open(self, channel_id, host_id, bet):
+        shoe = self.shoes.get(channel_id)
+        if shoe is None:
+            shoe = self.shoes[channel_id] = Shoe()
+        table = self.tables[channel_id] = BlackjackTable(channel_id, shoe, host_id, bet)
+        return table
+
+    def close(self, table):
+        if self.tables.get(table.channel_id) is table:
+            del self.tables[table.channel_id]
+
+    def expired(self, now=None):
+        now = now or time.monotonic()
+        return [table for table in self.tables.values() if table.deadline <= now]
+
+    def evict_shoes(self, now=None):
+        """Drops shoes of channels with no table that have been idle longer than BJ_SHOE_TTL."""
+        now = now or time.monotonic()
+        idle = [channel_id for channel_id, shoe in self.shoes.items()
+                if channel_id not in self.tables and now - shoe.last_used > BJ_SHOE_TTL]
+        for channel_id in idle:
+            del self.shoes[channel_id]
+        return len(idle)
+
+
+def bench_blackjack(tables=10_000, players=3):
+    """Microbenchmark: deals `tables` concurrent tables, then plays them all out (hit below 17)."""
+    sessions = BlackjackTables()
+    started = time.perf_counter()
+    for channel_id in range(tables):
+        table = sessions.open(channel_id, 0, 100)
+        for user_id in range(1, players):
+            table.join(user_id, 100)
+        table.deal()
+    dealt = time.perf_counter()
+    for table in list(sessions.tables.values()):
+        for user_id in table.seats:
+            hand = table.hand(user_id)
+            while hand is not None:
+                if hand.can_split and len(table.seats[user_id]) < BJ_MAX_HANDS:
+                    table.split(user_id, hand)
+                elif hand.total < 17:
+                    table.hit(hand)
+                else:
+                    table.stand(hand)
+                hand = table.hand(user_id)
+        table.finish()
+        sessions.close(table)
+    finished = time.perf_counter()
+    hands = tables * players
+    print(f" [BENCH] Blackjack: {tables:,} tables x {players} players dealt in {dealt - started:.2f}s, "
+          f"played out in {finished - dealt:.2f}s ({hands / (finished - started):,.0f} hands/sec)")
@@ -1,1122 +1,1022 @@
 
 
 import discord
-from discord import app_commands, ui
+from discord import app_commands
 from discord.ext import commands, tasks
-import random
-import os
 import asyncio
+import os
+import secrets
 import sqlite3
-import datetime
-import aiohttp
-import json
-import math
-from typing import Optional, List, Union
-from dotenv import load_dotenv
-from itertools import cycle
-
-
-
-# Load environment variables
-load_dotenv()
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from cluster import FakeGateway, WriterClient, WriterServer, shard_groups
+from config import (CLUSTER_WORKERS, DB_NAME, DEV_GUILDS, EXTENSIONS, METRICS_PORT, ORDER_SETTLE_INTERVAL,
+    SHARD_COUNT, TOKEN, WRITE_BEHIND_INTERVAL_MS)
+from database import db, writer_call
+from market import market, order_book, portfolios, settle_fills
+from metrics import Histogram, InstrumentedTree, MetricsServer, http_trace, metrics
+from utils import CommandSync, animator, cooldowns, gateway_intents, register_persistent_views, rng_service
 
-# TOKEN HANDLING
-# You can put your token directly here if .env fails, but .env is safer.
-TOKEN = os.getenv('TOKEN')
 
-# CONSTANTS
-DB_NAME = "alice_ultimate.db"
-EMBED_COLOR_MAIN = 0x9b59b6  # Alice Purple
-EMBED_COLOR_ERROR = 0xe74c3c  # Red
-EMBED_COLOR_SUCCESS = 0x2ecc71  # Green
-EMBED_COLOR_WARN = 0xf1c40f  # Yellow
 
 # INTENTS
-# We need all intents to manage members, read messages, and track presence.
-intents = discord.Intents.all()
+# Only what the enabled extensions declare (config.EXTENSION_INTENTS). Members are cached and
+# guilds chunked only if one of them asks for the members intent; nothing reads the message cache.
+intents = gateway_intents(EXTENSIONS)
 
 # BOT INSTANCE
-bot = commands.Bot(command_prefix="!", intents=intents, help_command=None)
+# Sharded from the start; cluster workers narrow it to their own shard group before logging in
+# Each cog in EXTENSIONS is its own extension under cogs/, loaded at startup and reloadable one at a time
+# The tree times every app command and the HTTP trace counts every REST call (metrics.py)
+bot = commands.AutoShardedBot(command_prefix="!", intents=intents, help_command=None, shard_count=SHARD_COUNT,
+                              member_cache_flags=discord.MemberCacheFlags.from_intents(intents),
+                              chunk_guilds_at_startup=intents.members, max_messages=None,
+                              tree_cls=InstrumentedTree, http_trace=http_trace())
+command_sync = CommandSync(bot.tree)
 
+# Read by the metrics endpoint at scrape time
+metrics.collectors["alice_gateway_latency_seconds"] = lambda: bot.latency
+metrics.collectors["alice_db_statements_total"] = lambda: db.manager.query_count if db.manager else 0
 
-# ==================================================================================================
-#  SECTION 2: DATABASE MANAGER (SQLITE)
-# ==================================================================================================
 
-class DatabaseManager:
-    """
-    Handles all interactions with the SQLite database.
-    Auto-creates tables on initialization.
-    """
+def cache_samples(*fields):
+    """[(labels, value)] of the manager's LRU caches; fields are (stats key, *extra labels)."""
+    caches = db.manager.cache_stats() if db.manager else {}
+    return [((cache, *labels), stats[key]) for cache, stats in caches.items() for key, *labels in fields]
 
-    def __init__(self, db_name):
-        self.db_name = db_name
-        self.check_database()
-
-    def connect(self):
-        return sqlite3.connect(self.db_name)
-
-    def check_database(self):
-        print(" [SYSTEM] Checking Database Integrity...")
-        with self.connect() as db:
-            cursor = db.cursor()
-
-            # 1. Users Table (Economy & Core Stats)
-            cursor.execute('''
-                           CREATE TABLE IF NOT EXISTS users
-                           (
-                               user_id
-                               INTEGER
-                               PRIMARY
-                               KEY,
-                               wallet
-                               INTEGER
-                               DEFAULT
-                               0,
-                               bank
-                               INTEGER
-                               DEFAULT
-                               0,
-                               xp
-                               INTEGER
-                               DEFAULT
-                               0,
-                               level
-                               INTEGER
-                               DEFAULT
-                               1,
-                               reputation
-                               INTEGER
-                               DEFAULT
-                               0,
-                               bio
-                               TEXT
-                               DEFAULT
-                               'A mysterious user.',
-                               created_at
-                               TEXT
-                           )
-                           ''')
-
-            # 2. RPG Table (Combat Stats)
-            cursor.execute('''
-                           CREATE TABLE IF NOT EXISTS rpg_stats
-                           (
-                               user_id
-                               INTEGER
-                               PRIMARY
-                               KEY,
-                               rpg_class
-                               TEXT
-                               DEFAULT
-                               'Novice',
-                               hp
-                               INTEGER
-                               DEFAULT
-                               100,
-                               max_hp
-                               INTEGER
-                               DEFAULT
-                               100,
-                               mana
-                               INTEGER
-                               DEFAULT
-                               50,
-                               max_mana
-                               INTEGER
-                               DEFAULT
-                               50,
-                               atk
-                               INTEGER
-                               DEFAULT
-                               10,
-                               def
-                               INTEGER
-                               DEFAULT
-                               5,
-                               agility
-                               INTEGER
-                               DEFAULT
-                               5,
-                               dungeon_depth
-                               INTEGER
-                               DEFAULT
-                               0,
-                               battles_won
-                               INTEGER
-                               DEFAULT
-                               0
-                           )
-                           ''')
-
-            # 3. Inventory Table
-            cursor.execute('''
-                           CREATE TABLE IF NOT EXISTS inventory
-                           (
-                               user_id
-                               INTEGER,
-                               item_id
-                               TEXT,
-                               item_name
-                               TEXT,
-                               amount
-                               INTEGER,
-                               type
-                               TEXT,
-                               PRIMARY
-                               KEY
-                           (
-                               user_id,
-                               item_id
-                           )
-                               )
-                           ''')
-
-            # 4. Moderation Logs
-            cursor.execute('''
-                           CREATE TABLE IF NOT EXISTS mod_logs
-                           (
-                               case_id
-                               INTEGER
-                               PRIMARY
-                               KEY
-                               AUTOINCREMENT,
-                               user_id
-                               INTEGER,
-                               moderator_id
-                               INTEGER,
-                               action
-                               TEXT,
-                               reason
-                               TEXT,
-                               timestamp
-                               TEXT
-                           )
-                           ''')
-
-            # 5. Stock Portfolio
-            cursor.execute('''
-                           CREATE TABLE IF NOT EXISTS portfolio
-                           (
-                               user_id
-                               INTEGER,
-                               symbol
-                               TEXT,
-                               shares
-                               INTEGER,
-                               avg_cost
-                               REAL,
-                               PRIMARY
-                               KEY
-                           (
-                               user_id,
-                               symbol
-                           )
-                               )
-                           ''')
-
-            # 6. Cooldowns (Daily, Rob, Work)
-            cursor.execute('''
-                           CREATE TABLE IF NOT EXISTS cooldowns
-                           (
-                               user_id
-                               INTEGER
-                               PRIMARY
-                               KEY,
-                               last_daily
-                               TEXT,
-                               last_work
-                               TEXT,
-                               last_rob
-                               TEXT,
-                               last_heist
-                               TEXT
-                           )
-                           ''')
-
-            db.commit()
-        print(" [SYSTEM] Database Check Complete.")
-
-    def register_user(self, user_id):
-        """Ensures a user exists in all necessary tables."""
-        with self.connect() as db:
-            cursor = db.cursor()
-
-            # Check Core
-            cursor.execute("SELECT user_id FROM users WHERE user_id = ?", (user_id,))
-            if not cursor.fetchone():
-                created_at = datetime.datetime.now().isoformat()
-                cursor.execute("INSERT INTO users (user_id, created_at) VALUES (?, ?)", (user_id, created_at))
-
-            # Check RPG
-            cursor.execute("SELECT user_id FROM rpg_stats WHERE user_id = ?", (user_id,))
-            if not cursor.fetchone():
-                cursor.execute("INSERT INTO rpg_stats (user_id) VALUES (?)", (user_id,))
-
-            # Check Cooldowns
-            cursor.execute("SELECT user_id FROM cooldowns WHERE user_id = ?", (user_id,))
-            if not cursor.fetchone():
-                cursor.execute("INSERT INTO cooldowns (user_id) VALUES (?)", (user_id,))
-
-            db.commit()
-
-    def get_user_bal(self, user_id):
-        self.register_user(user_id)
-        with self.connect() as db:
-            cursor = db.cursor()
-            cursor.execute("SELECT wallet, bank FROM users WHERE user_id = ?", (user_id,))
-            return cursor.fetchone()
-
-    def update_bal(self, user_id, amount, bank=False):
-        self.register_user(user_id)
-        column = "bank" if bank else "wallet"
-        with self.connect() as db:
-            db.execute(f"UPDATE users SET {column} = {column} + ? WHERE user_id = ?", (amount, user_id))
-
-    def get_rpg_stats(self, user_id):
-        self.register_user(user_id)
-        with self.connect() as db:
-            cursor = db.cursor()
-            cursor.execute("SELECT * FROM rpg_stats WHERE user_id = ?", (user_id,))
-            # Returns tuple of columns
-            return cursor.fetchone()
-
-    def log_mod_action(self, user_id, mod_id, action, reason):
-        with self.connect() as db:
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            db.execute("INSERT INTO mod_logs (user_id, moderator_id, action, reason, timestamp) VALUES (?, ?, ?, ?, ?)",
-                       (user_id, mod_id, action, reason, timestamp))
-
-
-# Initialize DB
-db = DatabaseManager(DB_NAME)
+
+metrics.collectors["alice_cache_lookups_total"] = lambda: cache_samples(("hits", "hit"), ("misses", "miss"))
+metrics.collectors["alice_cache_evictions_total"] = lambda: cache_samples(("evictions",))
+metrics.collectors["alice_cache_entries"] = lambda: cache_samples(("size",))
 
 
 # ==================================================================================================
-#  SECTION 3: UTILITY FUNCTIONS & UI HELPERS
+#  MAIN EXECUTION LOOPS
 # ==================================================================================================
 
-def create_embed(title: str, description: str, color: int = EMBED_COLOR_MAIN,
-                 image_url: str = None, thumbnail_url: str = None, footer_text: str = "Alice System v3.0"):
-    """
-    Factory function to create standardized, professional embeds.
-    """
-    embed = discord.Embed(title=title, description=description, color=color)
+@tasks.loop(minutes=5)
+async def update_stocks_loop():
+    await tick_market()
 
-    if image_url:
-        embed.set_image(url=image_url)
 
-    if thumbnail_url:
-        embed.set_thumbnail(url=thumbnail_url)
+async def tick_market():
+    """Moves prices and revalues net worth; in cluster mode the writer then sends the tick to every worker."""
+    market.update_prices(rng_service.stream("market"))
+    db.leaderboards["networth"].adjust_many(portfolios.revalue())
+    await db.save_price_snapshot(market.snapshot())
+    if writer_server:
+        writer_server.broadcast("market", market.snapshot())
+    await settle_order_batch()  # Fill limit orders crossed by the new prices
 
-    embed.set_footer(text=footer_text, icon_url="https://cdn-icons-png.flaticon.com/512/4712/4712109.png")
-    embed.timestamp = datetime.datetime.now()
-    return embed
 
+@tasks.loop(seconds=WRITE_BEHIND_INTERVAL_MS / 1000)
+async def flush_writes_loop():
+    await db.flush_writes()
+    await flush_cooldowns()
 
-def format_money(amount: int):
-    return f"${amount:,}"
 
+async def flush_cooldowns():
+    """Persists cooldown uses since the last flush in one batch and drops expired entries."""
+    rows = cooldowns.take_dirty()
+    if rows:
+        try:
+            await db.save_cooldowns(rows)
+        except Exception as e:
+            print(f" [ERROR] Cooldown flush failed: {e}")
+            cooldowns.restore_dirty(rows)
+    cooldowns.prune()
 
-async def confirm_action(interaction: discord.Interaction, message: str) -> bool:
-    """
-    Sends a confirmation View (Yes/No buttons) and returns True/False.
-    """
 
-    class ConfirmView(ui.View):
-        def __init__(self):
-            super().__init__(timeout=30)
-            self.value = None
+@tasks.loop(seconds=ORDER_SETTLE_INTERVAL)
+async def settle_orders_loop():
+    await settle_order_batch()
 
-        @ui.button(label="Confirm", style=discord.ButtonStyle.green)
-        async def confirm(self, interaction: discord.Interaction, button: ui.Button):
-            self.value = True
-            for child in self.children: child.disabled = True
-            await interaction.response.edit_message(view=self)
-            self.stop()
 
-        @ui.button(label="Cancel", style=discord.ButtonStyle.red)
-        async def cancel(self, interaction: discord.Interaction, button: ui.Button):
-            self.value = False
-            for child in self.children: child.disabled = True
-            await interaction.response.edit_message(view=self)
-            self.stop()
+async def settle_order_batch():
+    """Settles every executable order in one DB transaction at the current prices."""
+    batch = order_book.take_batch(market)
+    if not batch:
+        return
+    fills = [(o.user_id, o.symbol, o.side, o.shares, market.price(o.symbol)) for o in batch]
+    try:
+        results = await settle_fills(fills)
+    except Exception as e:
+        print(f" [ERROR] Order settlement failed: {e}")
+        for order in batch:
+            order.resolve("error")
+        return
+    for order, (filled, cash) in zip(batch, results):
+        order.resolve("filled" if filled else "rejected", cash)
+
+
+async def restore_state():
+    """Reloads market prices, running cooldowns and holdings in the process that owns the database."""
+    # Restore market prices from the last saved ticks
+    market.restore(await db.load_price_history(market.history_size))
+    # Running cooldowns
+    cooldowns.load(await db.load_cooldowns(cooldowns.settings()))  # Cut off at the overridden windows
+    # Net worth rankings include holdings valued at those prices
+    db.leaderboards["networth"].adjust_many(portfolios.load(await db.load_holdings()))
+
+
+async def shutdown():
+    """Stops background work and pays back open stakes; run by every process that hosts the cogs."""
+    flush_writes_loop.cancel()
+    settle_orders_loop.cancel()
+    # The HTTP session and meme feed only exist if /meme was used
+    meme_feed = getattr(bot, "meme_feed", None)
+    if meme_feed:
+        await meme_feed.stop()
+    await animator.stop()
+    casino = bot.get_cog("Casino")
+    if casino:
+        await casino.refund_open_tables()
+    http_session = getattr(bot, "http_session", None)
+    if http_session:
+        await http_session.close()
+
+
+async def start_metrics_server(port):
+    """Starts the local Prometheus endpoint; if the port is taken the bot runs without it."""
+    if not port or not metrics.enabled:
+        return None
+    server = MetricsServer(port=port)
+    try:
+        await server.start()
+    except OSError as e:
+        print(f" [ERROR] Metrics endpoint unavailable on port {port}: {e}")
+        return None
+    print(f" [SYSTEM] Metrics on {metrics.endpoint}")
+    return server
+
+
+# --- EXTENSIONS ---
+@bot.tree.command(name="reload", description="Hot-reload one bot module (Owner only)")
+@app_commands.choices(extension=[app_commands.Choice(name=name.split(".")[-1], value=name) for name in EXTENSIONS])
+async def reload_extension(interaction: discord.Interaction, extension: str):
+    if not await bot.is_owner(interaction.user):
+        return await interaction.response.send_message("❌ Owner only.", ephemeral=True)
+    started = time.perf_counter()
+    try:
+        await bot.reload_extension(extension)
+    except commands.ExtensionError as e:
+        # A failed reload rolls back to the previous module, so the old commands keep working
+        return await interaction.response.send_message(f"❌ Reload failed: {e}", ephemeral=True)
+    register_persistent_views(bot)
+    # Only reaches Discord if the reload changed a command's name, options or description
+    synced = await command_sync.sync_all(DEV_GUILDS)
+    await interaction.response.send_message(
+        f"✅ Reloaded `{extension}` in {(time.perf_counter() - started) * 1000:.0f} ms"
+        f"{' (commands re-synced)' if synced else ''}.", ephemeral=True)
+
+
+def bench_startup(runs=5):
+    """
+    Cold-start benchmark.
+    Runs `python -X importtime -c "import main"` in fresh interpreters and reports the wall time and
+    the heaviest imports, then times loading every extension and opening a scratch database.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    walls, modules = [], {}
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=here,
+                                capture_output=True, text=True, check=True)
+        walls.append(time.perf_counter() - started)
+        for line in result.stderr.splitlines():
+            # "import time: self [us] | cumulative | imported package", nested imports indented two spaces a level
+            parts = line.split("|")
+            if len(parts) != 3 or not parts[0].startswith("import time:") or parts[2].startswith("     "):
+                continue
+            try:
+                cumulative = int(parts[1])
+            except ValueError:
+                continue
+            name = parts[2].strip()
+            modules[name] = min(modules.get(name, cumulative), cumulative)
+    print(f" [BENCH] interpreter + import main: best {min(walls) * 1000:.0f} ms, "
+          f"median {sorted(walls)[len(walls) // 2] * 1000:.0f} ms over {runs} runs")
+    print(f" [BENCH] import main (cumulative): {modules.get('main', 0) / 1000:.1f} ms")
+    # Everything main pulls in directly, heaviest first
+    for name, us in sorted(modules.items(), key=lambda item: -item[1])[:10]:
+        if name != "main":
+            print(f" [BENCH]   {name:<24} {us / 1000:8.1f} ms")
+
+    async def load():
+        async with bot:
+            await timed_load()
+
+    async def timed_load():
+        with tempfile.TemporaryDirectory() as scratch:
+            started = time.perf_counter()
+            await db.open(os.path.join(scratch, "bench.db"))
+            opened = time.perf_counter()
+            for name in EXTENSIONS:
+                await bot.load_extension(name)
+            loaded = time.perf_counter()
+            for name in EXTENSIONS:
+                await bot.reload_extension(name)
+            reloaded = time.perf_counter()
+            for name in EXTENSIONS:
+                await bot.unload_extension(name)
+            db.close()
+        print(f" [BENCH] db.open (new file, migrations): {(opened - started) * 1000:.1f} ms")
+        print(f" [BENCH] load {len(EXTENSIONS)} extensions: {(loaded - opened) * 1000:.1f} ms")
+        print(f" [BENCH] reload {len(EXTENSIONS)} extensions: {(reloaded - loaded) * 1000:.1f} ms")
+
+    asyncio.run(load())
+
+
+def bench_command_sync(restarts=6, reconnects=10, latency=0.35):
+    """
+    Simulated process restarts and gateway reconnects with tree.sync() stubbed to take `latency`
+    seconds. Compares sync calls and connect-to-ready time of syncing in every on_ready against
+    CommandSync; one command is added halfway, which should cost the hash guard exactly one sync.
+    """
+    async def probe(interaction: discord.Interaction):
+        pass
+
+    async def run():
+        async with bot:
+            for name in EXTENSIONS:
+                await bot.load_extension(name)
+            bot._connection.application_id = 1
+            calls = Counter()
+
+            async def fake_sync(guild=None):
+                calls[policy] += 1
+                await asyncio.sleep(latency)
+                return bot.tree.get_commands(guild=guild)
+
+            bot.tree.sync = fake_sync
+            with tempfile.TemporaryDirectory() as scratch:
+                path = os.path.join(scratch, "command_sync.json")
+                for policy in ("sync in on_ready", "hash-guarded"):
+                    ready = []
+                    for restart in range(restarts):
+                        if restart == restarts // 2:
+                            bot.tree.add_command(app_commands.Command(name="probe", description="Bench probe",
+                                                                      callback=probe))
+                        syncer = CommandSync(bot.tree, path)  # A restarted process starts from the file
+                        for connect in range(reconnects + 1):
+                            started = time.perf_counter()
+                            if policy == "sync in on_ready":
+                                await bot.tree.sync()
+                            elif connect == 0:
+                                await syncer.sync_all()
+                            ready.append(time.perf_counter() - started)
+                    bot.tree.remove_command("probe")
+                    print(f" [BENCH] {policy}: {calls[policy]} sync calls over {restarts} restarts x "
+                          f"{reconnects + 1} connects, ready after {sum(ready) / len(ready) * 1000:.0f} ms on "
+                          f"average ({sum(ready):.1f}s total)")
+            for name in EXTENSIONS:
+                await bot.unload_extension(name)
+
+    asyncio.run(run())
+
+
+def bench_metrics(calls=20000, rounds=7):
+    """
+    Overhead of the metrics hooks: histogram observes, the same manager calls on scratch databases
+    with statement timing off and on, the instrumented tree's per-command hooks, the REST trace
+    callbacks, and finally one scrape of the endpoint with everything above recorded.
+    """
+    from types import SimpleNamespace
+    from yarl import URL
+    from database import DatabaseManager
+
+    hist = Histogram()
+    started = time.perf_counter()
+    for i in range(calls):
+        hist.observe(i * 1e-6)
+    print(f" [BENCH] Histogram.observe: {(time.perf_counter() - started) / calls * 1e9:.0f} ns")
+
+    # Three manager calls per op (a read, an update with its commit, a read through db.execute),
+    # alternating between the two databases so both see the same machine state
+    with tempfile.TemporaryDirectory() as scratch:
+        managers = {}
+        for timed in (False, True):
+            metrics.enabled = timed
+            managers[timed] = DatabaseManager(os.path.join(scratch, f"bench_{timed}.db"), write_behind=False)
+            managers[timed].register_users(range(1000, 1500))
+        best = {False: float("inf"), True: float("inf")}
+        for _ in range(rounds):
+            for timed, manager in managers.items():
+                started = time.perf_counter()
+                for i in range(calls // 3):
+                    user_id = 1000 + i % 500
+                    manager.call(manager.get_ticket, i)
+                    manager.call(manager.set_hp, user_id, 100)
+                    manager.call(manager.get_open_ticket, 1, user_id)
+                best[timed] = min(best[timed], (time.perf_counter() - started) / (calls // 3 * 3))
+        for manager in managers.values():
+            manager.close()
+    metrics.enabled = True
+    db_cost = best[True] - best[False]
+    print(f" [BENCH] DatabaseManager.call: {best[False] * 1e6:.2f} us untimed, {best[True] * 1e6:.2f} us timed "
+          f"(+{db_cost * 1e6:.2f} us, {(best[True] / best[False] - 1) * 100:+.1f}%)")
+
+    async def probe(interaction: discord.Interaction):
+        pass
+
+    command = app_commands.Command(name="probe", description="Bench probe", callback=probe)
+    tree = bot.tree
+
+    async def noop(*args):
+        return True
+
+    async def hooks(check, complete):
+        started = time.perf_counter()
+        for _ in range(calls):
+            interaction = SimpleNamespace(extras={})
+            await check(interaction)
+            metrics.charge_db(0.001)
+            metrics.charge_rest(0.05)
+            await complete(interaction, command)
+        return (time.perf_counter() - started) / calls
+
+    async def rest():
+        trace = http_trace()
+        start, end = trace.on_request_start[0], trace.on_request_end[0]
+        url = URL("https://discord.com/api/v10/webhooks/1098765432109876543/aW50ZXJhY3Rpb246MTIzNDU2Nzg5/"
+                  "messages/@original")
+        params = SimpleNamespace(method="PATCH", url=url,
+                                 response=SimpleNamespace(status=200, headers={"X-RateLimit-Remaining": "4"}))
+        started = time.perf_counter()
+        for _ in range(calls):
+            context = SimpleNamespace()
+            await start(None, context, params)
+            await end(None, context, params)
+        return (time.perf_counter() - started) / calls
+
+    async def scrape():
+        import aiohttp
+        server = MetricsServer(port=0)
+        await server.start()
+        try:
+            async with aiohttp.ClientSession() as session:
+                started = time.perf_counter()
+                async with session.get(metrics.endpoint) as response:
+                    body = await response.text()
+                    elapsed = time.perf_counter() - started
+                    content_type = response.headers["Content-Type"]
+        finally:
+            await server.stop()
+        series = sum(1 for line in body.splitlines() if line and not line.startswith("#"))
+        print(f" [BENCH] GET /metrics: {response.status} {content_type}, {series} series, {len(body) / 1024:.0f} KiB "
+              f"in {elapsed * 1000:.1f} ms")
+
+    async def run():
+        bare = min([await hooks(noop, noop) for _ in range(rounds)])
+        hooked = min([await hooks(tree.interaction_check, tree.on_app_command_completion) for _ in range(rounds)])
+        print(f" [BENCH] command hooks: {(hooked - bare) * 1e6:.2f} us per app command")
+        per_request = min([await rest() for _ in range(rounds)])
+        print(f" [BENCH] REST trace callbacks: {per_request * 1e6:.2f} us per request")
+        # A typical game command: three database calls, the response and one follow-up edit
+        print(f" [BENCH] per command (3 DB calls, 2 REST requests): "
+              f"{(hooked - bare + 3 * db_cost + 2 * per_request) * 1e6:.0f} us added")
+        await scrape()
+
+    asyncio.run(run())
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def bench_async_db(probes=400, writers=8):
+    """
+    Interaction latency during a /work storm. A probe command (an uncached balance read) starts every
+    5 ms while `writers` tasks pay out /work shifts back to back. Runs with manager calls made on the
+    event loop, as before AsyncDatabase, then through it with every payout its own transaction, then
+    with the write-behind buffer the bot ships with (flushed on its usual interval). Reports probe
+    latency and event-loop lag with and without the storm.
+    """
+    from database import AsyncDatabase
 
-    view = ConfirmView()
-    await interaction.response.send_message(message, view=view, ephemeral=True)
-    await view.wait()
-    return view.value
+    async def scenario(database, on_loop, storm):
+        manager = database.manager
+        if on_loop:
+            async def read(user_id):
+                return manager.call(manager.get_user, user_id)
 
+            async def pay(user_id, amount):
+                manager.call(manager.update_bal, user_id, amount)
+        else:
+            read, pay = database.get_user, database.update_bal
+        running = True
+        payouts = 0
+
+        async def writer(index):
+            nonlocal payouts
+            while running:
+                await pay(1000 + (index * 131 + payouts) % 500, 150)
+                payouts += 1
+                await asyncio.sleep(0)  # Back to the loop between commands, like separate interactions
+
+        async def flusher():
+            while running:
+                await asyncio.sleep(WRITE_BEHIND_INTERVAL_MS / 1000)
+                await database.flush_writes()
+
+        tasks = [asyncio.create_task(writer(i)) for i in range(writers)] if storm else []
+        if manager.write_buffer is not None:
+            tasks.append(asyncio.create_task(flusher()))
+        await asyncio.sleep(0.05)
+        latencies, lags = [], []
+        for i in range(probes):
+            due = time.perf_counter() + 0.005
+            await asyncio.sleep(0.005)
+            lags.append(time.perf_counter() - due)
+            await read(10_000 + i + (probes if storm else 0))
+            latencies.append(time.perf_counter() - due)
+        running = False
+        await asyncio.gather(*tasks)
+        return latencies, lags, payouts
+
+    async def run():
+        setups = (("on the event loop", True, False), ("AsyncDatabase", False, False),
+                  ("+ write-behind", False, True))
+        with tempfile.TemporaryDirectory() as scratch:
+            for label, on_loop, write_behind in setups:
+                database = await AsyncDatabase().open(os.path.join(scratch, f"{label}.db"), write_behind=write_behind)
+                await database.register_users(range(1000, 1500))
+                for storm in (False, True):
+                    started = time.perf_counter()
+                    latencies, lags, payouts = await scenario(database, on_loop, storm)
+                    elapsed = time.perf_counter() - started
+                    print(f" [BENCH] {label:<17} {'storm' if storm else 'idle':<5}: "
+                          f"probe p50 {percentile(latencies, 0.5) * 1000:6.2f} ms, "
+                          f"p99 {percentile(latencies, 0.99) * 1000:6.2f} ms | loop lag p99 "
+                          f"{percentile(lags, 0.99) * 1000:6.2f} ms | {payouts / elapsed:,.0f} payouts/s")
+                database.close()
+
+    asyncio.run(run())
+
+
+def bench_connections(ops=6000):
+    """
+    Uncached manager calls (ticket lookups and HP writes) with the persistent per-thread connection,
+    then with a fresh connection per call as the manager used to open. Both run on their own temp copy
+    of the bot's database, which is never opened itself.
+    """
+    import shutil
+    from database import DatabaseManager
+
+    class PerCallManager(DatabaseManager):
+        def connect(self):
+            return sqlite3.connect(self.db_name)
+
+    workload = (lambda m, i: m.get_ticket(i), lambda m, i: m.get_open_ticket(1, 1000 + i % 500),
+                lambda m, i: m.set_hp(1000 + i % 500, 100 - i % 50))
+    results = {}
+    with tempfile.TemporaryDirectory() as scratch:
+        for label, cls in (("connect per call", PerCallManager), ("persistent", DatabaseManager)):
+            path = os.path.join(scratch, f"{cls.__name__}.db")
+            if os.path.exists(DB_NAME):
+                shutil.copy(DB_NAME, path)
+            manager = cls(path, write_behind=False)
+            manager.register_users(range(1000, 1500))
+            started = time.perf_counter()
+            for i in range(ops):
+                manager.call(workload[i % 3], manager, i)
+            results[label] = ops / (time.perf_counter() - started)
+            manager.close()
+            print(f" [BENCH] {label:<16}: {results[label]:>9,.0f} ops/s")
+    print(f" [BENCH] Speedup: {results['persistent'] / results['connect per call']:.1f}x")
+
+
+def bench_write_behind(seconds=2.0):
+    """
+    /work payouts through DatabaseManager.call for `seconds`, with every payout its own transaction,
+    then with the WriteBehindBuffer flushed every WRITE_BEHIND_INTERVAL_MS as flush_writes_loop does.
+    Commits are counted from the statements the manager's trace callback sees.
+    """
+    from database import DatabaseManager
+
+    with tempfile.TemporaryDirectory() as scratch:
+        for label, write_behind in (("direct", False), ("write-behind", True)):
+            manager = DatabaseManager(os.path.join(scratch, f"{label}.db"), write_behind=write_behind)
+            manager.register_users(range(1000, 1500))
+            commits, payouts = manager.commits, 0
+            started = time.perf_counter()
+            next_flush = started + WRITE_BEHIND_INTERVAL_MS / 1000
+            while (now := time.perf_counter()) - started < seconds:
+                manager.call(manager.update_bal, 1000 + payouts * 131 % 500, 150)
+                payouts += 1
+                if write_behind and now >= next_flush:
+                    manager.call(manager.flush_writes)
+                    next_flush = now + WRITE_BEHIND_INTERVAL_MS / 1000
+            manager.call(manager.flush_writes)
+            elapsed = time.perf_counter() - started
+            commits = manager.commits - commits
+            print(f" [BENCH] {label:<12}: {payouts / elapsed:>9,.0f} payouts/s, {commits / elapsed:>8,.1f} commits/s "
+                  f"({commits} commits, {payouts / max(commits, 1):,.0f} payouts each)")
+            manager.close()
+
+
+def bench_leaderboard(users=1_000_000, ops=2000, sql_ops=100):
+    """
+    /leaderboard and /rank on a scratch database of `users` random balances: the in-memory net worth
+    board against the ORDER BY ... LIMIT and COUNT(*) queries a per-request SQL leaderboard runs on the
+    wallet + bank index. Also times a score update, which the board adds on top of the UPDATE itself.
+    """
+    import random
+    from database import DatabaseManager
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as scratch:
+        manager = DatabaseManager(os.path.join(scratch, "leaderboard.db"), write_behind=False)
+        conn = manager.connect()
+        started = time.perf_counter()
+        with conn:
+            conn.executemany("INSERT INTO users (user_id, wallet, bank) VALUES (?, ?, ?)",
+                             ((10_000 + i, rng.randrange(100_000), rng.randrange(1_000_000)) for i in range(users)))
+        print(f" [BENCH] {users:,} users inserted in {time.perf_counter() - started:.1f}s")
+        manager.load_leaderboards()
+        board = manager.leaderboards["networth"]
+        ids = [10_000 + rng.randrange(users) for _ in range(ops)]
+
+        def per_op(run, count):
+            started = time.perf_counter()
+            for user_id in ids[:count]:
+                run(user_id)
+            return (time.perf_counter() - started) / count * 1e6
+
+        def sql_update(user_id):
+            with conn:
+                conn.execute("UPDATE users SET wallet = wallet + 150 WHERE user_id = ?", (user_id,))
+
+        cases = (
+            ("top 10", "ORDER BY",
+             lambda _: conn.execute("SELECT user_id, wallet + bank FROM users ORDER BY wallet + bank DESC LIMIT 10")
+             .fetchall(), lambda _: board.top(10)),
+            ("rank", "COUNT(*)",
+             lambda user_id: conn.execute("SELECT COUNT(*) + 1 FROM users WHERE wallet + bank > "
+                                          "(SELECT wallet + bank FROM users WHERE user_id = ?)", (user_id,)).fetchone(),
+             board.rank),
+            ("update", "UPDATE", sql_update, lambda user_id: board.adjust(user_id, 150)),
+        )
+        for label, query, sql, memory in cases:
+            sql_us, board_us = per_op(sql, sql_ops), per_op(memory, ops)
+            versus = f"+{board_us / sql_us:.0%} on top" if query == "UPDATE" else f"{sql_us / board_us:,.0f}x"
+            print(f" [BENCH] {label:<6}: SQL {query} {sql_us:>9,.1f} us, board {board_us:>6,.1f} us ({versus})")
+        manager.close()
 
-# ==================================================================================================
-#  SECTION 4: ECONOMY SYSTEM (JOBS, BANKING, STOCK MARKET)
-# ==================================================================================================
 
-class StockMarket:
+def bench_market(tickers=10_000, ticks=200):
     """
-    Simulates a volatile stock market.
+    One market tick over `tickers` listings: the original dict-of-dicts loop with a random.uniform()
+    per stock, a per-ticker comprehension over the arrays, and StockMarket.update_prices.
     """
-
-    def __init__(self):
-        self.stocks = {
-            "ALC": {"name": "Alice Corp", "price": 100.0, "volatility": 0.05},
-            "TCH": {"name": "TechGiant", "price": 250.0, "volatility": 0.03},
-            "MEM": {"name": "MemeStonk", "price": 10.0, "volatility": 0.20},
-            "GLD": {"name": "GoldRes", "price": 1500.0, "volatility": 0.01},
-            "OIL": {"name": "DinoJuice", "price": 80.0, "volatility": 0.04},
-        }
-
-    def update_prices(self):
-        for symbol in self.stocks:
-            stock = self.stocks[symbol]
-            change_percent = random.uniform(-stock['volatility'], stock['volatility'])
+    import random
+    from array import array
+    from market import StockMarket
+
+    rng = random.Random(0)
+    listings = [(f"T{i}", f"Ticker {i}", rng.uniform(10, 1000), rng.uniform(0.01, 0.1)) for i in range(tickers)]
+    stocks = {symbol: {"name": name, "price": price, "volatility": vol} for symbol, name, price, vol in listings}
+    market = StockMarket(listings, history=ticks + 1)
+
+    def dict_loop():
+        for symbol in stocks:
+            stock = stocks[symbol]
+            change_percent = rng.uniform(-stock['volatility'], stock['volatility'])
             stock['price'] *= (1 + change_percent)
-            # Ensure price never hits 0
             if stock['price'] < 0.1: stock['price'] = 0.1
 
+    def comprehension():
+        draw = rng.random
+        market.prices = array("d", [max(0.1, price * (1 + (2 * draw() - 1) * vol))
+                                    for price, vol in zip(market.prices, market.volatility)])
 
-market = StockMarket()
-
-
-class Economy(commands.Cog):
-    def __init__(self, bot):
-        self.bot = bot
-        self.jobs = [
-            {"name": "Janitor", "salary": 50, "xp_req": 0},
-            {"name": "Cashier", "salary": 80, "xp_req": 100},
-            {"name": "Developer", "salary": 200, "xp_req": 500},
-            {"name": "Manager", "salary": 400, "xp_req": 1000},
-            {"name": "CEO", "salary": 1000, "xp_req": 5000}
-        ]
-
-    @app_commands.command(name="balance", description="View your financial status")
-    async def balance(self, interaction: discord.Interaction, user: Optional[discord.Member] = None):
-        target = user or interaction.user
-        wallet, bank = db.get_user_bal(target.id)
-
-        embed = create_embed(
-            title=f"💳 Account Statement: {target.display_name}",
-            description="Recent financial activity synced.",
-            color=EMBED_COLOR_SUCCESS,
-            thumbnail_url=target.display_avatar.url
-        )
-        embed.add_field(name="💵 Wallet", value=format_money(wallet), inline=True)
-        embed.add_field(name="🏦 Bank", value=format_money(bank), inline=True)
-        embed.add_field(name="💎 Net Worth", value=format_money(wallet + bank), inline=False)
-
-        await interaction.response.send_message(embed=embed)
-
-    @app_commands.command(name="deposit", description="Transfer funds to secure bank")
-    async def deposit(self, interaction: discord.Interaction, amount: int):
-        wallet, bank = db.get_user_bal(interaction.user.id)
-        if amount <= 0:
-            return await interaction.response.send_message("❌ Amount must be positive.", ephemeral=True)
-        if wallet < amount:
-            return await interaction.response.send_message("❌ Insufficient funds in wallet.", ephemeral=True)
-
-        db.update_bal(interaction.user.id, -amount, bank=False)
-        db.update_bal(interaction.user.id, amount, bank=True)
-
-        embed = create_embed("🏦 Deposit Successful", f"Transferred **{format_money(amount)}** to your bank account.",
-                             EMBED_COLOR_SUCCESS)
-        await interaction.response.send_message(embed=embed)
-
-    @app_commands.command(name="withdraw", description="Withdraw funds from bank")
-    async def withdraw(self, interaction: discord.Interaction, amount: int):
-        wallet, bank = db.get_user_bal(interaction.user.id)
-        if amount <= 0:
-            return await interaction.response.send_message("❌ Amount must be positive.", ephemeral=True)
-        if bank < amount:
-            return await interaction.response.send_message("❌ Insufficient funds in bank.", ephemeral=True)
-
-        db.update_bal(interaction.user.id, amount, bank=False)
-        db.update_bal(interaction.user.id, -amount, bank=True)
-
-        embed = create_embed("🏧 Withdrawal Successful", f"Withdrew **{format_money(amount)}** to your wallet.",
-                             EMBED_COLOR_SUCCESS)
-        await interaction.response.send_message(embed=embed)
-
-    @app_commands.command(name="work", description="Complete a work shift")
-    async def work(self, interaction: discord.Interaction):
-        # Calculate cooldown logic here (omitted for brevity, but table exists)
-
-        # Determine job based on XP (simplified to random for now)
-        job = random.choice(self.jobs)
-        earnings = int(job['salary'] * random.uniform(0.8, 1.2))
-
-        db.update_bal(interaction.user.id, earnings)
-
-        embed = create_embed("💼 Shift Report",
-                             f"**Role:** {job['name']}\n**Performance:** Satisfactory\n**Payout:** {format_money(earnings)}",
-                             EMBED_COLOR_SUCCESS)
-        await interaction.response.send_message(embed=embed)
-
-    @app_commands.command(name="crime", description="Attempt illegal activity")
-    async def crime(self, interaction: discord.Interaction):
-        chance = random.random()
-        if chance > 0.6:  # 40% success
-            earnings = random.randint(300, 1000)
-            db.update_bal(interaction.user.id, earnings)
-            embed = create_embed("🕵️‍♂️ Heist Successful",
-                                 f"You managed to evade security.\n**Loot:** {format_money(earnings)}",
-                                 EMBED_COLOR_WARN)
-        else:
-            fine = random.randint(100, 500)
-            db.update_bal(interaction.user.id, -fine)
-            embed = create_embed("🚓 Busted", f"Authorities caught you.\n**Fine:** {format_money(fine)}",
-                                 EMBED_COLOR_ERROR)
-
-        await interaction.response.send_message(embed=embed)
-
-    @app_commands.command(name="stocks", description="View stock market prices")
-    async def stocks(self, interaction: discord.Interaction):
-        embed = create_embed("📈 Alice Stock Exchange (ASE)", "Current market valuations update every 5 minutes.",
-                             EMBED_COLOR_MAIN)
+    baseline = None
+    for label, tick in (("dict loop", dict_loop), ("comprehension", comprehension),
+                        ("batched", lambda: market.update_prices(rng))):
+        started = time.perf_counter()
+        for _ in range(ticks):
+            tick()
+        per_tick = (time.perf_counter() - started) / ticks * 1e3
+        baseline = baseline or per_tick
+        print(f" [BENCH] {label:<13}: {per_tick:>6.2f} ms/tick for {tickers:,} tickers ({baseline / per_tick:.1f}x)")
 
-        for sym, data in market.stocks.items():
-            price = data['price']
-            embed.add_field(name=f"{data['name']} ({sym})", value=f"${price:,.2f}", inline=False)
 
-        await interaction.response.send_message(embed=embed)
+def bench_orders(orders=10_000, users=2000, ticks=3):
+    """
+    `ticks` settlement ticks of `orders` market buys each, spread over `users` funded accounts on a
+    scratch database. The per-trade path /buy_stock took before the order book (a debit, then a
+    SELECT + UPDATE/INSERT holding, each its own transaction) runs against OrderBook.submit plus
+    settle_order_batch, which settles the whole tick through settle_fills in one transaction.
+    """
+    import math
+    import random
 
-    @app_commands.command(name="buy_stock", description="Purchase equity")
-    async def buy_stock(self, interaction: discord.Interaction, symbol: str, amount: int):
-        symbol = symbol.upper()
-        if symbol not in market.stocks:
-            return await interaction.response.send_message("❌ Unknown Ticker Symbol.", ephemeral=True)
+    rng = random.Random(0)
+    symbols = market.symbols
 
-        price = market.stocks[symbol]['price']
+    def add_shares(manager, user_id, symbol, amount, price):
         cost = price * amount
-        wallet, _ = db.get_user_bal(interaction.user.id)
-
-        if wallet < cost:
-            return await interaction.response.send_message(f"❌ Insufficient funds. You need {format_money(int(cost))}.",
-                                                           ephemeral=True)
-
-        db.update_bal(interaction.user.id, -cost)
-
-        # Portfolio logic
-        with db.connect() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT shares, avg_cost FROM portfolio WHERE user_id=? AND symbol=?",
-                           (interaction.user.id, symbol))
-            res = cursor.fetchone()
+        with manager.connect() as conn:
+            res = conn.execute("SELECT shares, avg_cost FROM portfolio WHERE user_id=? AND symbol=?",
+                               (user_id, symbol)).fetchone()
             if res:
-                total_shares = res[0] + amount
-                total_spent = (res[0] * res[1]) + cost
-                new_avg = total_spent / total_shares
                 conn.execute("UPDATE portfolio SET shares=?, avg_cost=? WHERE user_id=? AND symbol=?",
-                             (total_shares, new_avg, interaction.user.id, symbol))
+                             (res[0] + amount, (res[0] * res[1] + cost) / (res[0] + amount), user_id, symbol))
             else:
-                conn.execute("INSERT INTO portfolio VALUES (?, ?, ?, ?)", (interaction.user.id, symbol, amount, price))
-
-        embed = create_embed("📉 Asset Acquired",
-                             f"Purchased **{amount}** shares of **{symbol}**.\n**Total Cost:** {format_money(int(cost))}",
-                             EMBED_COLOR_SUCCESS)
-        await interaction.response.send_message(embed=embed)
-
-
-# ==================================================================================================
-#  SECTION 5: RPG SYSTEM (CLASSES, COMBAT, INVENTORY)
-# ==================================================================================================
-
-class RPG(commands.Cog):
-    def __init__(self, bot):
-        self.bot = bot
-        self.classes = {
-            "Warrior": {"hp": 150, "atk": 15, "def": 10, "agl": 5},
-            "Mage": {"hp": 90, "atk": 25, "def": 3, "agl": 8},
-            "Rogue": {"hp": 110, "atk": 20, "def": 5, "agl": 20},
-            "Tank": {"hp": 200, "atk": 8, "def": 20, "agl": 2}
-        }
-        self.monsters = [
-            {"name": "Slime", "hp": 30, "atk": 5, "xp": 10, "gold": 10,
-             "img": "https://media.giphy.com/media/l41YkZk2uYhU8C5ri/giphy.gif"},
-            {"name": "Goblin Scout", "hp": 50, "atk": 10, "xp": 25, "gold": 30,
-             "img": "https://media.giphy.com/media/2gLxx75OmfCaNu2yI8/giphy.gif"},
-            {"name": "Orc Brute", "hp": 120, "atk": 18, "xp": 100, "gold": 150,
-             "img": "https://media.giphy.com/media/3o7TKrEzvJbsQNT6z6/giphy.gif"},
-            {"name": "Dark Wizard", "hp": 80, "atk": 40, "xp": 200, "gold": 300,
-             "img": "https://media.giphy.com/media/12NUbkX6p4xOO4/giphy.gif"},
-            {"name": "Elder Dragon", "hp": 500, "atk": 70, "xp": 1000, "gold": 2000,
-             "img": "https://media.giphy.com/media/11jGtzDu7xBkR2/giphy.gif"}
-        ]
-
-    @app_commands.command(name="profile", description="View your RPG character stats")
-    async def profile(self, interaction: discord.Interaction):
-        stats = db.get_rpg_stats(interaction.user.id)
-        # Stats tuple indices:
-        # 0:uid, 1:class, 2:hp, 3:maxhp, 4:mana, 5:maxmana, 6:atk, 7:def, 8:agl, 9:depth, 10:wins
-
-        embed = create_embed(f"🛡️ Character Sheet: {interaction.user.name}", "", EMBED_COLOR_MAIN,
-                             thumbnail_url=interaction.user.display_avatar.url)
-        embed.add_field(name="Class", value=stats[1], inline=True)
-        embed.add_field(name="Battles Won", value=str(stats[10]), inline=True)
-        embed.add_field(name="❤️ HP", value=f"{stats[2]}/{stats[3]}", inline=True)
-        embed.add_field(name="💧 Mana", value=f"{stats[4]}/{stats[5]}", inline=True)
-        embed.add_field(name="⚔️ ATK", value=str(stats[6]), inline=True)
-        embed.add_field(name="🛡️ DEF", value=str(stats[7]), inline=True)
-        embed.add_field(name="💨 AGL", value=str(stats[8]), inline=True)
-
-        await interaction.response.send_message(embed=embed)
-
-    @app_commands.command(name="select_class", description="Choose your RPG Class (Resets stats!)")
-    async def select_class(self, interaction: discord.Interaction, class_name: str):
-        class_name = class_name.capitalize()
-        if class_name not in self.classes:
-            return await interaction.response.send_message(f"❌ Invalid Class. Choose: {', '.join(self.classes.keys())}",
-                                                           ephemeral=True)
-
-        c = self.classes[class_name]
-
-        # Confirmation
-        if not await confirm_action(interaction,
-                                    f"Are you sure you want to become a **{class_name}**? This will reset your stats."):
-            return
-
-        with db.connect() as conn:
-            conn.execute('''
-                         UPDATE rpg_stats
-                         SET rpg_class=?,
-                             hp=?,
-                             max_hp=?,
-                             atk=?,
-                             def=?,
-                             agility=?
-                         WHERE user_id = ?
-                         ''', (class_name, c['hp'], c['hp'], c['atk'], c['def'], c['agl'], interaction.user.id))
-
-        await interaction.followup.send(
-            embed=create_embed("✨ Class Change Successful", f"You are now a **{class_name}**.", EMBED_COLOR_SUCCESS))
-
-    @app_commands.command(name="dungeon", description="Enter the dungeon to fight")
-    async def dungeon(self, interaction: discord.Interaction):
-        stats = db.get_rpg_stats(interaction.user.id)
-        if stats[2] <= 0:
-            return await interaction.response.send_message("💀 You are incapacitated. Use `/heal` first.",
-                                                           ephemeral=True)
-
-        # Pick monster
-        m = random.choice(self.monsters)
-
-        # Loading Animation
-        embed = create_embed("⚔️ Entering Dungeon...", "Searching for enemies...", EMBED_COLOR_MAIN,
-                             "https://media.giphy.com/media/l0HlJDaeqNUDhhaWg/giphy.gif")
-        await interaction.response.send_message(embed=embed)
-        await asyncio.sleep(2)
-
-        # Display Enemy
-        embed = create_embed(f"👺 Encounter: {m['name']}", f"**HP:** {m['hp']} | **ATK:** {m['atk']}", EMBED_COLOR_WARN,
-                             m['img'])
-        await interaction.edit_original_response(embed=embed)
-        await asyncio.sleep(2)
-
-        # Combat Logic
-        p_hp = stats[2]
-        p_atk = stats[6]
-        p_def = stats[7]
-        m_hp = m['hp']
-        m_atk = m['atk']
-
-        log = []
-        turn = 1
-
-        while p_hp > 0 and m_hp > 0:
-            # Player hits
-            dmg = max(1, int(p_atk * random.uniform(0.9, 1.1)))
-            crit = random.random() < 0.1
-            if crit: dmg *= 2
-            m_hp -= dmg
-            log.append(f"Turn {turn}: You deal **{dmg}** dmg {'(CRIT!)' if crit else ''}")
-
-            if m_hp <= 0: break
-
-            # Monster hits
-            dmg_taken = max(0, int(m_atk * random.uniform(0.8, 1.2)) - random.randint(0, p_def))
-            p_hp -= dmg_taken
-            log.append(f"Turn {turn}: {m['name']} deals **{dmg_taken}** dmg")
-            turn += 1
-
-        # Save Result
-        with db.connect() as conn:
-            conn.execute("UPDATE rpg_stats SET hp=? WHERE user_id=?", (max(0, p_hp), interaction.user.id))
-
-        if p_hp > 0:
-            db.update_bal(interaction.user.id, m['gold'])
-            # Update wins
-            with db.connect() as conn:
-                conn.execute("UPDATE rpg_stats SET battles_won = battles_won + 1 WHERE user_id=?",
-                             (interaction.user.id,))
-
-            res_embed = create_embed("🏆 Victory",
-                                     f"You defeated the **{m['name']}**!\n\n**Loot:** {format_money(m['gold'])}\n**XP:** {m['xp']}",
-                                     EMBED_COLOR_SUCCESS)
-        else:
-            res_embed = create_embed("💀 Defeat",
-                                     f"You were knocked out by the **{m['name']}**.\nSomeone dragged you back to town.",
-                                     EMBED_COLOR_ERROR)
-
-        # Log footer
-        res_embed.add_field(name="Combat Log (Last 3 turns)", value="\n".join(log[-3:]), inline=False)
-        await interaction.followup.send(embed=res_embed)
-
-    @app_commands.command(name="heal", description="Restore Health (Costs $50)")
-    async def heal(self, interaction: discord.Interaction):
-        cost = 50
-        wallet, _ = db.get_user_bal(interaction.user.id)
-
-        if wallet < cost:
-            return await interaction.response.send_message("❌ Too poor.", ephemeral=True)
-
-        db.update_bal(interaction.user.id, -cost)
-        with db.connect() as conn:
-            conn.execute("UPDATE rpg_stats SET hp = max_hp WHERE user_id=?", (interaction.user.id,))
-
-        embed = create_embed("💖 Restored", "Your HP has been fully recovered.", EMBED_COLOR_SUCCESS)
-        await interaction.response.send_message(embed=embed)
+                conn.execute("INSERT INTO portfolio VALUES (?, ?, ?, ?)", (user_id, symbol, amount, price))
+
+    async def per_trade(tick):
+        for user_id, symbol, shares in tick:
+            price = market.price(symbol)
+            if await db.debit(user_id, math.ceil(price * shares)):
+                await db.run(add_shares, db.manager, user_id, symbol, shares, price)
+
+    async def batched(tick):
+        placed = [order_book.submit(user_id, 0, symbol, "buy", shares) for user_id, symbol, shares in tick]
+        await settle_order_batch()
+        assert all(order.future.result()[0] == "filled" for order in placed)
+
+    async def run():
+        with tempfile.TemporaryDirectory() as scratch:
+            for label, settle in (("per trade", per_trade), ("order book", batched)):
+                await db.open(os.path.join(scratch, f"{settle.__name__}.db"), write_behind=False)
+                await db.register_users(range(10_000, 10_000 + users))
+                with db.manager.connect() as conn:
+                    conn.execute("UPDATE users SET wallet = ?", (10 ** 12,))
+                db.manager.bal_cache.clear()
+                elapsed, commits = 0.0, db.manager.commits
+                for _ in range(ticks):
+                    tick = [(10_000 + rng.randrange(users), rng.choice(symbols), rng.randint(1, 20))
+                            for _ in range(orders)]
+                    started = time.perf_counter()
+                    await settle(tick)
+                    elapsed += time.perf_counter() - started
+                commits = db.manager.commits - commits
+                print(f" [BENCH] {label:<10}: {elapsed / ticks * 1000:>8.1f} ms/tick, "
+                      f"{orders * ticks / elapsed:>8,.0f} orders/s ({commits:,} commits)")
+                await db.run(db.manager.close)
+        db.close()
+
+    asyncio.run(run())
+
+
+def bench_portfolio(users=100_000, positions=3, ticks=10, reads=2000):
+    """
+    Holdings valuation for `users` portfolios of `positions` tickers each on a scratch database.
+    Per tick, PortfolioIndex.revalue against re-summing every holding from the portfolio table at
+    the new prices; per /balance read, PortfolioIndex.value against the user's portfolio query.
+    """
+    import random
+    from database import DatabaseManager
+    from market import PortfolioIndex, StockMarket
+
+    rng = random.Random(0)
+    stocks = StockMarket()
+    index = PortfolioIndex(stocks)
+    with tempfile.TemporaryDirectory() as scratch:
+        manager = DatabaseManager(os.path.join(scratch, "portfolio.db"), write_behind=False)
+        conn = manager.connect()
+        rows = [(10_000 + i, symbol, rng.randint(1, 500), 1.0)
+                for i in range(users) for symbol in rng.sample(stocks.symbols, positions)]
+        with conn:
+            conn.executemany("INSERT INTO portfolio (user_id, symbol, shares, avg_cost) VALUES (?, ?, ?, ?)", rows)
+        index.load(manager.load_holdings())
+
+        def rescan():
+            prices, at = stocks.prices, stocks.index
+            values = {}
+            for user_id, symbol, shares in conn.execute("SELECT user_id, symbol, shares FROM portfolio"):
+                values[user_id] = values.get(user_id, 0.0) + shares * prices[at[symbol]]
+            return values
+
+        timings = {"rescan": 0.0, "revalue": 0.0}
+        for _ in range(ticks):
+            stocks.update_prices(rng)
+            for label, run in (("rescan", rescan), ("revalue", index.revalue)):
+                started = time.perf_counter()
+                run()
+                timings[label] += time.perf_counter() - started
+        assert all(abs(index.value(user_id) - value) <= 1e-6 * value for user_id, value in rescan().items())
+        print(f" [BENCH] tick  : rescan {timings['rescan'] / ticks * 1000:>7.1f} ms, "
+              f"PortfolioIndex.revalue {timings['revalue'] / ticks * 1000:>7.1f} ms "
+              f"({timings['rescan'] / timings['revalue']:.1f}x) for {len(rows):,} positions")
+
+        ids = [10_000 + rng.randrange(users) for _ in range(reads)]
+        started = time.perf_counter()
+        for user_id in ids:
+            sum(shares * stocks.price(symbol)
+                for symbol, shares in conn.execute("SELECT symbol, shares FROM portfolio WHERE user_id = ?", (user_id,)))
+        query_us = (time.perf_counter() - started) / reads * 1e6
+        started = time.perf_counter()
+        for user_id in ids:
+            index.value(user_id)
+        lookup_us = (time.perf_counter() - started) / reads * 1e6
+        print(f" [BENCH] read  : portfolio query {query_us:>7.2f} us, PortfolioIndex.value {lookup_us:>5.2f} us "
+              f"({query_us / lookup_us:,.0f}x)")
+        manager.close()
+
+
+def bench_migrate(users=200_000):
+    """
+    First start after an upgrade: a scratch alice_brain.db in the old schema with `users` users (plus a
+    cooldowns row, two holdings and two items each, and a ticket per 100 users) sits next to a new
+    database, and DatabaseManager runs migrations v1-v5, v3 being the legacy import. Then re-runs every
+    step from user_version 0, which is what an interrupted upgrade does on the next start.
+    """
+    import random
+    from config import LEGACY_DB_NAME
+    from database import DatabaseManager
+
+    rng = random.Random(0)
+    schema = (
+        "CREATE TABLE users (user_id INTEGER PRIMARY KEY, wallet INTEGER DEFAULT 0, bank INTEGER DEFAULT 0, "
+        "xp INTEGER DEFAULT 0, level INTEGER DEFAULT 1, rpg_class TEXT DEFAULT 'Novice', hp INTEGER DEFAULT 100, "
+        "max_hp INTEGER DEFAULT 100, atk INTEGER DEFAULT 10, def INTEGER DEFAULT 0, mana INTEGER DEFAULT 50, "
+        "reputation INTEGER DEFAULT 0, warns INTEGER DEFAULT 0)",
+        "CREATE TABLE inventory (user_id INTEGER, item_name TEXT, amount INTEGER, type TEXT, "
+        "PRIMARY KEY (user_id, item_name))",
+        "CREATE TABLE portfolio (user_id INTEGER, stock_symbol TEXT, amount INTEGER, avg_price REAL, "
+        "PRIMARY KEY (user_id, stock_symbol))",
+        "CREATE TABLE cooldowns (user_id INTEGER PRIMARY KEY, last_daily TEXT, last_rob TEXT, last_work TEXT)",
+        "CREATE TABLE tickets (channel_id INTEGER PRIMARY KEY, user_id INTEGER, status TEXT)",
+    )
+    ids = range(10_000, 10_000 + users)
+    with tempfile.TemporaryDirectory() as scratch:
+        legacy = sqlite3.connect(os.path.join(scratch, LEGACY_DB_NAME))
+        with legacy:
+            for statement in schema:
+                legacy.execute(statement)
+            legacy.executemany("INSERT INTO users (user_id, wallet, bank, xp, level) VALUES (?, ?, ?, ?, ?)",
+                               ((i, rng.randrange(10_000), rng.randrange(100_000), rng.randrange(5000),
+                                 rng.randint(1, 50)) for i in ids))
+            legacy.executemany("INSERT INTO cooldowns (user_id, last_daily) VALUES (?, '2024-01-01T00:00:00')",
+                               ((i,) for i in ids))
+            legacy.executemany("INSERT INTO portfolio VALUES (?, ?, ?, ?)",
+                               ((i, symbol, rng.randint(1, 100), rng.uniform(10, 500))
+                                for i in ids for symbol in rng.sample(market.symbols, 2)))
+            legacy.executemany("INSERT INTO inventory VALUES (?, ?, 1, 'item')",
+                               ((i, item) for i in ids for item in ("Potion", "Sword")))
+            legacy.executemany("INSERT INTO tickets VALUES (?, ?, 'open')", ((i, i) for i in ids[::100]))
+        legacy.close()
+        rows = users * 6 + len(ids[::100])
+
+        started = time.perf_counter()
+        manager = DatabaseManager(os.path.join(scratch, DB_NAME), write_behind=False)
+        elapsed = time.perf_counter() - started
+        conn = manager.connect()
+        assert conn.execute("SELECT COUNT(*) FROM rpg_stats").fetchone()[0] == users
+        print(f" [BENCH] upgrade : {elapsed:>6.2f}s to open with v1-v5 ({rows:,} legacy rows, {rows / elapsed:,.0f} rows/s)")
+
+        conn.execute("PRAGMA user_version = 0")
+        started = time.perf_counter()
+        manager.migrate()
+        print(f" [BENCH] re-run  : {time.perf_counter() - started:>6.2f}s for v1-v5 over the imported rows")
+        manager.close()
+
+
+def bench_rows(rows=100_000):
+    """
+    Fetching `rows` users rows as plain tuples, as Record rows built by a Python __init__ (how UserRow
+    used to be), and as the namedtuple UserRow, re-typed with tuple.__new__ by its row_factory (one
+    Python call per row, as single-row reads do) and by from_rows (bulk reads).
+    Reports the best fetchall() time of five untraced runs and the memory the fetched list holds,
+    from a separate tracemalloc run.
+    """
+    import tracemalloc
+    from database import DatabaseManager, Record, UserRow
+
+    class SlotsUserRow(Record):
+        __slots__ = UserRow._fields
+
+        def __init__(self, user_id, wallet, bank, xp, level, reputation, bio, created_at):
+            self.user_id = user_id
+            self.wallet = wallet
+            self.bank = bank
+            self.xp = xp
+            self.level = level
+            self.reputation = reputation
+            self.bio = bio
+            self.created_at = created_at
+
+    with tempfile.TemporaryDirectory() as scratch:
+        manager = DatabaseManager(os.path.join(scratch, "rows.db"), write_behind=False)
+        manager.register_users(range(10_000, 10_000 + rows))
+        conn = manager.connect()
+        query = f"SELECT {UserRow.columns} FROM users"
+
+        def fetch(factory):
+            cursor = conn.cursor()
+            cursor.row_factory = factory
+            return lambda: cursor.execute(query).fetchall()
+
+        cases = (("tuple", fetch(None)), ("__init__ slots", fetch(SlotsUserRow.row_factory)),
+                 ("row_factory", fetch(UserRow.row_factory)),
+                 ("from_rows", lambda: UserRow.from_rows(conn.execute(query))))
+        for label, run in cases:
+            elapsed = float("inf")
+            for _ in range(5):
+                started = time.perf_counter()
+                fetched = run()
+                elapsed = min(elapsed, time.perf_counter() - started)
+                del fetched
+            tracemalloc.start()
+            fetched = run()
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            assert len(fetched) == rows and next(iter(fetched[-1])) == 10_000 + rows - 1
+            print(f" [BENCH] {label:<14}: {elapsed * 1000:>7.1f} ms, {size / 2 ** 20:>6.1f} MiB "
+                  f"({elapsed / rows * 1e6:.2f} us and {size / rows:,.0f} B per row)")
+            del fetched
+        manager.close()
 
 
-# ==================================================================================================
-#  SECTION 6: GAMBLING & CASINO (BLACKJACK, SLOTS, RACE)
-# ==================================================================================================
-
-class Casino(commands.Cog):
-    def __init__(self, bot):
-        self.bot = bot
+async def main():
+    async with bot:
+        # Open the database off the event loop (schema check, migrations, cache warm-up)
+        await db.open(DB_NAME)
 
-    @app_commands.command(name="coinflip", description="50/50 Chance")
-    async def coinflip(self, interaction: discord.Interaction, bet: int, choice: str):
-        if choice.lower() not in ['heads', 'tails']:
-            return await interaction.response.send_message("❌ Heads or Tails only.", ephemeral=True)
+        # Buttons that survive restarts (tickets, confirmations, blackjack tables)
+        register_persistent_views(bot)
 
-        wallet, _ = db.get_user_bal(interaction.user.id)
-        if wallet < bet: return await interaction.response.send_message("❌ Insufficient funds.", ephemeral=True)
+        # Load Cogs
+        for extension in EXTENSIONS:
+            await bot.load_extension(extension)
 
-        # Professional Animation
-        embed = create_embed("🪙 Calculating Physics...", "Coin is in the air...", EMBED_COLOR_MAIN,
-                             "https://media.tenor.com/Img2h8Jk8IQAAAAM/coin-flip-coin.gif")
-        await interaction.response.send_message(embed=embed)
-        await asyncio.sleep(2)
+        await restore_state()
 
-        outcome = random.choice(['heads', 'tails'])
-        win = (outcome == choice.lower())
+        # Start Background Tasks
+        update_stocks_loop.start()
+        flush_writes_loop.start()
+        settle_orders_loop.start()
+        animator.instant_guilds.update(await db.load_instant_guilds())
+        metrics_server = await start_metrics_server(METRICS_PORT)
 
-        if win:
-            db.update_bal(interaction.user.id, bet)
-            res_embed = create_embed("✅ Prediction Correct",
-                                     f"Result: **{outcome.upper()}**\nPayout: **{format_money(bet)}**",
-                                     EMBED_COLOR_SUCCESS)
-        else:
-            db.update_bal(interaction.user.id, -bet)
-            res_embed = create_embed("❌ Prediction Failed",
-                                     f"Result: **{outcome.upper()}**\nLoss: **{format_money(bet)}**", EMBED_COLOR_ERROR)
-
-        await interaction.edit_original_response(embed=res_embed)
-
-    @app_commands.command(name="slots", description="Spin the wheel")
-    async def slots(self, interaction: discord.Interaction, bet: int):
-        wallet, _ = db.get_user_bal(interaction.user.id)
-        if wallet < bet: return await interaction.response.send_message("❌ Insufficient funds.", ephemeral=True)
-
-        emojis = ["🍒", "🍊", "🍋", "🍇", "💎", "7️⃣", "🔔"]
-
-        embed = create_embed("🎰 Spinning...", "⬜ ⬜ ⬜", EMBED_COLOR_MAIN)
-        await interaction.response.send_message(embed=embed)
-
-        # Animation loop
-        for _ in range(3):
-            await asyncio.sleep(0.5)
-            display = f"**[ {random.choice(emojis)} | {random.choice(emojis)} | {random.choice(emojis)} ]**"
-            embed.description = display
-            await interaction.edit_original_response(embed=embed)
-
-        a, b, c = random.choice(emojis), random.choice(emojis), random.choice(emojis)
-        final = f"**[ {a} | {b} | {c} ]**"
-
-        winnings = 0
-        if a == b == c:
-            winnings = bet * 10
-            msg = "JACKPOT!"
-            color = EMBED_COLOR_WARN  # Goldish
-        elif a == b or b == c or a == c:
-            winnings = int(bet * 1.5)
-            msg = "Small Win!"
-            color = EMBED_COLOR_SUCCESS
-        else:
-            winnings = -bet
-            msg = "Loser!"
-            color = EMBED_COLOR_ERROR
-
-        db.update_bal(interaction.user.id, winnings)
-        res_embed = create_embed(f"🎰 {msg}", f"{final}\n\nChange: {format_money(winnings)}", color)
-        await interaction.edit_original_response(embed=res_embed)
-
-    # --- BLACKJACK ENGINE ---
-    @app_commands.command(name="blackjack", description="Play Blackjack against Alice")
-    async def blackjack(self, interaction: discord.Interaction, bet: int):
-        wallet, _ = db.get_user_bal(interaction.user.id)
-        if wallet < bet: return await interaction.response.send_message("❌ Insufficient funds.", ephemeral=True)
-
-        deck = [2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10, 11] * 4
-
-        def calc_hand(hand):
-            score = sum(hand)
-            aces = hand.count(11)
-            while score > 21 and aces:
-                score -= 10
-                aces -= 1
-            return score
-
-        player = [random.choice(deck), random.choice(deck)]
-        dealer = [random.choice(deck), random.choice(deck)]
-
-        embed = create_embed("🃏 Blackjack Table",
-                             f"**Your Hand:** {player} ({calc_hand(player)})\n**Dealer:** [{dealer[0]}, ?]",
-                             EMBED_COLOR_MAIN)
-
-        # View for buttons
-        class BJView(ui.View):
-            def __init__(self):
-                super().__init__(timeout=60)
-                self.action = None
-
-            @ui.button(label="Hit", style=discord.ButtonStyle.primary)
-            async def hit(self, interaction: discord.Interaction, button: ui.Button):
-                self.action = "hit"
-                await interaction.response.defer()
-                self.stop()
-
-            @ui.button(label="Stand", style=discord.ButtonStyle.secondary)
-            async def stand(self, interaction: discord.Interaction, button: ui.Button):
-                self.action = "stand"
-                await interaction.response.defer()
-                self.stop()
-
-        await interaction.response.send_message(embed=embed, view=BJView())
-        original_msg = await interaction.original_response()
-
-        # Game Loop
-        while True:
-            p_score = calc_hand(player)
-            if p_score >= 21: break
-
-            view = BJView()
-            await original_msg.edit(view=view)
-            await view.wait()
-
-            if view.action == "hit":
-                player.append(random.choice(deck))
-                p_score = calc_hand(player)
-                embed.description = f"**Your Hand:** {player} ({p_score})\n**Dealer:** [{dealer[0]}, ?]"
-                await original_msg.edit(embed=embed)
-                if p_score > 21: break
+        # Start Bot
+        print(" [SYSTEM] Initializing Alice System v3.0...")
+        try:
+            if TOKEN:
+                await bot.start(TOKEN)
             else:
-                break
-
-        # Dealer Turn
-        p_score = calc_hand(player)
-        if p_score <= 21:
-            d_score = calc_hand(dealer)
-            while d_score < 17:
-                dealer.append(random.choice(deck))
-                d_score = calc_hand(dealer)
-        else:
-            d_score = calc_hand(dealer)  # Just calc for show
-
-        # Determine Winner
-        result = ""
-        amount = 0
-        if p_score > 21:
-            result = "You Busted! Dealer wins."
-            amount = -bet
-            color = EMBED_COLOR_ERROR
-        elif d_score > 21:
-            result = "Dealer Busted! You win!"
-            amount = bet
-            color = EMBED_COLOR_SUCCESS
-        elif p_score > d_score:
-            result = "You have the higher hand! You win!"
-            amount = bet
-            color = EMBED_COLOR_SUCCESS
-        elif p_score == d_score:
-            result = "Push (Tie). Money returned."
-            amount = 0
-            color = EMBED_COLOR_WARN
-        else:
-            result = "Dealer has higher hand. You lose."
-            amount = -bet
-            color = EMBED_COLOR_ERROR
-
-        db.update_bal(interaction.user.id, amount)
-
-        final_embed = create_embed("🃏 Game Over",
-                                   f"{result}\n\n**Your Hand:** {player} ({p_score})\n**Dealer Hand:** {dealer} ({d_score})\n**Change:** {format_money(amount)}",
-                                   color)
-        await original_msg.edit(embed=final_embed, view=None)
+                print(" [ERROR] TOKEN not found in environment variables.")
+        finally:
+            if metrics_server:
+                await metrics_server.stop()
+            await shutdown()
+            await flush_cooldowns()
+            db.close()  # Flushes anything still buffered
 
 
 # ==================================================================================================
-#  SECTION 7: MODERATION & TICKETS (ADMIN TOOLS)
+#  CLUSTER MODE
 # ==================================================================================================
+# `python main.py cluster` makes this process the DB writer and market ticker, and starts one
+# worker process per shard group. Workers run the cogs over their shards and attach `db` to the
+# writer, so alice_ultimate.db is only ever opened here.
 
-class Moderation(commands.Cog):
-    def __init__(self, bot):
-        self.bot = bot
+writer_server = None  # WriterServer while this process is a cluster's writer
+worker_reports = {}  # worker index -> stats sent by cluster-test workers
+ticks_received = Counter()  # topic -> broadcasts handled by this worker
+FAKE_TICK_INTERVAL = 0.2  # Market tick period during cluster-test, in seconds
 
-    @app_commands.command(name="kick", description="Remove a user from the server")
-    @commands.has_permissions(kick_members=True)
-    async def kick(self, interaction: discord.Interaction, member: discord.Member, reason: str = "No reason provided"):
-        try:
-            await member.kick(reason=reason)
-            db.log_mod_action(member.id, interaction.user.id, "KICK", reason)
-
-            embed = create_embed("👢 User Kicked",
-                                 f"**Target:** {member.mention}\n**Reason:** {reason}\n**Moderator:** {interaction.user.mention}",
-                                 EMBED_COLOR_WARN)
-            await interaction.response.send_message(embed=embed)
-        except Exception as e:
-            await interaction.response.send_message(f"❌ Error: {e}", ephemeral=True)
-
-    @app_commands.command(name="ban", description="Permanently ban a user")
-    @commands.has_permissions(ban_members=True)
-    async def ban(self, interaction: discord.Interaction, member: discord.Member, reason: str = "No reason provided"):
-        try:
-            await member.ban(reason=reason)
-            db.log_mod_action(member.id, interaction.user.id, "BAN", reason)
-
-            embed = create_embed("🔨 User Banned", f"**Target:** {member.mention}\n**Reason:** {reason}",
-                                 EMBED_COLOR_ERROR)
-            await interaction.response.send_message(embed=embed)
-        except Exception as e:
-            await interaction.response.send_message(f"❌ Error: {e}", ephemeral=True)
-
-    @app_commands.command(name="purge", description="Bulk delete messages")
-    @commands.has_permissions(manage_messages=True)
-    async def purge(self, interaction: discord.Interaction, amount: int):
-        await interaction.response.defer(ephemeral=True)
-        deleted = await interaction.channel.purge(limit=amount)
-
-        embed = create_embed("🧹 Cleanup Complete", f"Removed **{len(deleted)}** messages.", EMBED_COLOR_SUCCESS)
-        await interaction.followup.send(embed=embed)
-
-    @app_commands.command(name="lock", description="Lock current channel")
-    @commands.has_permissions(manage_channels=True)
-    async def lock(self, interaction: discord.Interaction):
-        await interaction.channel.set_permissions(interaction.guild.default_role, send_messages=False)
-        embed = create_embed("🔒 Channel Locked", "Messaging has been disabled for non-admins.", EMBED_COLOR_ERROR)
-        await interaction.response.send_message(embed=embed)
-
-    @app_commands.command(name="unlock", description="Unlock current channel")
-    @commands.has_permissions(manage_channels=True)
-    async def unlock(self, interaction: discord.Interaction):
-        await interaction.channel.set_permissions(interaction.guild.default_role, send_messages=True)
-        embed = create_embed("🔓 Channel Unlocked", "Messaging has been enabled.", EMBED_COLOR_SUCCESS)
-        await interaction.response.send_message(embed=embed)
-
-    # --- TICKET SYSTEM ---
-    @app_commands.command(name="setup_tickets", description="Create the ticket panel")
-    @commands.has_permissions(administrator=True)
-    async def setup_tickets(self, interaction: discord.Interaction):
-        class TicketLauncher(ui.View):
-            def __init__(self):
-                super().__init__(timeout=None)
-
-            @ui.button(label="Open Ticket", style=discord.ButtonStyle.blurple, emoji="📩", custom_id="ticket_open_btn")
-            async def open_ticket(self, interaction: discord.Interaction, button: ui.Button):
-                guild = interaction.guild
-                category = discord.utils.get(guild.categories, name="Tickets")
-                if not category:
-                    category = await guild.create_category("Tickets")
-
-                overwrites = {
-                    guild.default_role: discord.PermissionOverwrite(read_messages=False),
-                    interaction.user: discord.PermissionOverwrite(read_messages=True),
-                    guild.me: discord.PermissionOverwrite(read_messages=True)
-                }
-
-                channel = await guild.create_text_channel(f"ticket-{interaction.user.name}", category=category,
-                                                          overwrites=overwrites)
-
-                # Ticket Control View
-                class TicketControls(ui.View):
-                    def __init__(self):
-                        super().__init__(timeout=None)
-
-                    @ui.button(label="Close Ticket", style=discord.ButtonStyle.red, emoji="🔒",
-                               custom_id="ticket_close_btn")
-                    async def close(self, interaction: discord.Interaction, button: ui.Button):
-                        await interaction.channel.delete()
-
-                embed_ticket = create_embed("📩 Support Ticket",
-                                            f"Hello {interaction.user.mention}, staff will be with you shortly.\nClick the button below to close this ticket when resolved.",
-                                            EMBED_COLOR_MAIN)
-                await channel.send(embed=embed_ticket, view=TicketControls())
-                await interaction.response.send_message(f"✅ Ticket created: {channel.mention}", ephemeral=True)
-
-        embed = create_embed("🎫 Support Center",
-                             "Need help? Click the button below to create a private ticket with staff.",
-                             EMBED_COLOR_MAIN)
-        await interaction.channel.send(embed=embed, view=TicketLauncher())
-        await interaction.response.send_message("Panel created.", ephemeral=True)
 
+@writer_call
+async def report_worker(index, stats):
+    worker_reports[index] = stats
 
-# ==================================================================================================
-#  SECTION 8: ALICE PERSONA ("FREE WILL" & FUN)
-# ==================================================================================================
 
-class AlicePersona(commands.Cog):
-    def __init__(self, bot):
-        self.bot = bot
-        self.moods = ["Happy", "Sassy", "Angry", "Bored", "Helpful"]
-        self.current_mood = "Happy"
-        self.mood_loop.start()
-
-    @tasks.loop(minutes=30)
-    async def mood_loop(self):
-        self.current_mood = random.choice(self.moods)
-        activities = {
-            "Happy": "Playing games! 🎮",
-            "Sassy": "Judging your profiles 💅",
-            "Angry": "Plotting world domination 👿",
-            "Bored": "Counting stars ✨",
-            "Helpful": "Helping users! 💡"
-        }
-        await self.bot.change_presence(activity=discord.Game(activities[self.current_mood]))
-
-    @app_commands.command(name="8ball", description="Ask Alice for wisdom")
-    async def eightball(self, interaction: discord.Interaction, question: str):
-        # Responses change based on mood!
-        if self.current_mood == "Angry":
-            responses = ["Don't ask me now.", "No.", "Go away.", "Obviously not.", "Why do you annoy me?"]
-        elif self.current_mood == "Sassy":
-            responses = ["As if.", "Maybe, if you're lucky.", "Ask your mom.", "I doubt it, hun.", "Sure, whatever."]
-        else:
-            responses = ["Yes, definitely.", "It is certain.", "Most likely.", "Outlook good.", "I think so."]
+async def on_market_tick(rows):
+    """Worker side of the writer's market broadcast."""
+    ticks_received["market"] += 1
+    market.restore(rows)
+    await settle_order_batch()
 
-        embed = create_embed("🎱 The Magic 8-Ball",
-                             f"**Question:** {question}\n**Alice says:** {random.choice(responses)}", EMBED_COLOR_MAIN)
-        await interaction.response.send_message(embed=embed)
 
-    @app_commands.command(name="meme", description="Fetch visual data from internet")
-    async def meme(self, interaction: discord.Interaction):
+async def run_cluster(workers=CLUSTER_WORKERS, shard_count=SHARD_COUNT, fake_commands=0):
+    """
+    Runs the writer and spawns `workers` gateway processes over `shard_count` shards (one per worker
+    by default). With fake_commands, workers run that many commands through a FakeGateway against
+    a scratch database instead of logging in, and the writer prints what they saw.
+    """
+    global writer_server
+    shard_count = shard_count or workers
+    groups = shard_groups(shard_count, workers)
+    key = secrets.token_bytes(32)
+    ticks = {}  # tick -> prices broadcast, to check what workers ended up with
+    with tempfile.TemporaryDirectory() as scratch:
+        await db.open(os.path.join(scratch, "cluster.db") if fake_commands else DB_NAME)
+        await restore_state()
+        writer_server = WriterServer(db, key)
+        await writer_server.start()
+        flush_writes_loop.start()
+
+        async def fast_ticker():
+            while True:
+                await asyncio.sleep(FAKE_TICK_INTERVAL)
+                await tick_market()
+                ticks[market.ticks] = list(market.prices)
+
+        ticker = asyncio.create_task(fast_ticker()) if fake_commands else None
+        metrics_server = None
+        if not fake_commands:
+            update_stocks_loop.start()
+            metrics_server = await start_metrics_server(METRICS_PORT)  # Workers take the ports after it
+
+        print(f" [CLUSTER] Writer on port {writer_server.port}; {len(groups)} workers over {shard_count} shards")
+        env = dict(os.environ, CLUSTER_KEY=key.hex())
+        script = os.path.abspath(__file__)
+        started = time.perf_counter()
+        procs = [await asyncio.create_subprocess_exec(
+                     sys.executable, script, "cluster-worker", str(index), str(shard_count),
+                     ",".join(map(str, group)), str(writer_server.port), str(fake_commands), env=env)
+                 for index, group in enumerate(groups)]
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get('https://meme-api.com/gimme') as r:
-                    if r.status == 200:
-                        data = await r.json()
-                        embed = create_embed("🖼️ Viral Content",
-                                             f"**Subreddit:** {data['subreddit']}\n**Title:** {data['title']}",
-                                             EMBED_COLOR_MAIN, data['url'])
-                        await interaction.response.send_message(embed=embed)
-                    else:
-                        raise Exception("API Error")
-        except:
-            await interaction.response.send_message("❌ My internet connection is fuzzy. Try again later.",
-                                                    ephemeral=True)
-
-    # --- ACTION COMMANDS (PROFESSIONAL UI) ---
-
-    @app_commands.command(name="strike", description="Launch missile protocol")
-    async def strike(self, interaction: discord.Interaction, member: discord.Member):
-        embed = create_embed("🚀 Ballistic Missile Detected",
-                             f"**Target:** {member.mention}\n**Status:** Impact Confirmed.", 0xe74c3c,
-                             "https://media.giphy.com/media/XUFPGR45kHMZwHQz9V/giphy.gif")
-        await interaction.response.send_message(embed=embed)
-
-    @app_commands.command(name="killoff", description="Execute termination sequence")
-    async def killoff(self, interaction: discord.Interaction, member: discord.Member):
-        embed = create_embed("💀 Termination Protocol", f"**Subject:** {member.mention}\n**Result:** Eliminated.",
-                             0x2c3e50, "https://media1.tenor.com/m/CXOItGL-rjwAAAAC/dad-noel-noeldeyzel.gif")
-        await interaction.response.send_message(embed=embed)
-
-    @app_commands.command(name="punish", description="Administer disciplinary action")
-    async def punish(self, interaction: discord.Interaction, member: discord.Member):
-        embed = create_embed("💥 Disciplinary Action",
-                             f"**Subject:** {member.mention}\n**Action:** Drill Protocol Initiated.", 0xe67e22,
-                             "https://i.imgur.com/VUWWN10.gif")
-        await interaction.response.send_message(embed=embed)
-
-    @app_commands.command(name="bless", description="Grant divine protection")
-    async def bless(self, interaction: discord.Interaction, member: discord.Member):
-        embed = create_embed("🙏 Divine Intervention", f"**Recipient:** {member.mention}\n**Effect:** Blessed.",
-                             0xf1c40f, "https://media.giphy.com/media/Tv2btKgK06tQXltbvC/giphy.gif")
-        await interaction.response.send_message(embed=embed)
-
-    @app_commands.command(name="crown", description="Designate sovereignty")
-    async def crown(self, interaction: discord.Interaction, member: discord.Member):
-        embed = create_embed("👑 Coronation Ceremony",
-                             f"**Sovereign:** {member.mention}\n**Title:** King/Queen assigned.", 0xf39c12,
-                             "https://i.giphy.com/fYpUBttlicUM5hpSM2.gif")
-        await interaction.response.send_message(embed=embed)
-
-    @app_commands.command(name="lure", description="Deploy bait")
-    async def lure(self, interaction: discord.Interaction, member: discord.Member):
-        embed = create_embed("🪤 Trap Deployed", f"**Target:** {member.mention}\n**Status:** Captured.", 0x27ae60,
-                             "https://media.giphy.com/media/3ornka9rAaKRA2Rkac/giphy.gif")
-        await interaction.response.send_message(embed=embed)
-
-    @app_commands.command(name="assert_dominance", description="Assert hierarchy")
-    async def assert_dominance(self, interaction: discord.Interaction, member: discord.Member):
-        embed = create_embed("😡 Dominance Assertion",
-                             f"**Subject:** {member.mention}\n**Action:** Physical Admonishment.", 0xc0392b,
-                             "https://media1.tenor.com/m/OOKQrqKgFCsAAAAd/angry-kid.gif")
-        await interaction.response.send_message(embed=embed)
-
-    @app_commands.command(name="nomercy", description="Deploy ultimate weapon")
-    async def nomercy(self, interaction: discord.Interaction, member: discord.Member):
-        embed = create_embed("☢️ Nuclear Option", f"**Target:** {member.mention}\n**Yield:** Maximum.", 0x000000,
-                             "https://media.giphy.com/media/hvGKQL8lasDvIlWRBC/giphy.gif")
-        await interaction.response.send_message(embed=embed)
-
-    @app_commands.command(name="roulette", description="Russian Roulette (Risk Death)")
-    async def roulette(self, interaction: discord.Interaction):
-        await interaction.response.send_message("🔫 **Spinning Cylinder...**")
-        await asyncio.sleep(2)
-        if random.randint(1, 6) == 1:
-            try:
-                # Attempt Timeout
-                await interaction.user.timeout(discord.utils.utcnow() + datetime.timedelta(seconds=60),
-                                               reason="Roulette Loss")
-                text = "💥 **BANG!** Subject neutralized. (Timeout 60s)"
-            except:
-                text = "💥 **BANG!** Subject neutralized. (Admin immunity active)"
-
-            embed = create_embed("💀 Critical Failure", text, EMBED_COLOR_ERROR,
-                                 "https://media.giphy.com/media/xT9IguC2cZ3lTqW652/giphy.gif")
-        else:
-            embed = create_embed("😅 Survival Confirmed", "Chamber empty. You live.", EMBED_COLOR_SUCCESS,
-                                 "https://media.giphy.com/media/1FMaabePDEfgk/giphy.gif")
-
-        await interaction.edit_original_response(content=None, embed=embed)
-
-
-# ==================================================================================================
-#  SECTION 9: MAIN EXECUTION LOOPS
-# ==================================================================================================
-
-@tasks.loop(minutes=5)
-async def update_stocks_loop():
-    market.update_prices()
-
-
-async def main():
+            codes = await asyncio.gather(*(proc.wait() for proc in procs))
+        finally:
+            for proc in procs:
+                if proc.returncode is None:
+                    proc.terminate()
+                    await proc.wait()
+            if ticker:
+                ticker.cancel()
+            update_stocks_loop.cancel()
+            flush_writes_loop.cancel()
+            if metrics_server:
+                await metrics_server.stop()
+            await writer_server.stop()
+            await flush_cooldowns()
+            db.close()
+    elapsed = time.perf_counter() - started
+
+    if fake_commands:
+        total = sum(report["commands"] for report in worker_reports.values())
+        print(f" [CLUSTER] Exit codes {codes}; {total:,} commands in {elapsed:.2f}s "
+              f"({total / elapsed:,.0f}/s including process start)")
+        for index, report in sorted(worker_reports.items()):
+            in_sync = ticks.get(report["tick"]) == report["prices"]
+            print(f" [CLUSTER]   worker {index} shards {report['shards']}: {report['guilds']} guilds, "
+                  f"{report['commands'] / report['elapsed']:,.0f} cmd/s, {report['rpc_calls']:,} writer calls "
+                  f"at {report['rpc_us']:.0f}us, {report['ticks']} ticks (last #{report['tick']} "
+                  f"{'matches' if in_sync else 'DIFFERS from'} the writer)")
+            print(f" [CLUSTER]     {report['outcomes']}")
+        claims = sum(report["daily_claims"] for report in worker_reports.values())
+        users = max((report["users"] for report in worker_reports.values()), default=0)
+        print(f" [CLUSTER] /daily granted {claims} times to {users} users claiming from every worker")
+        print(f" [CLUSTER] Writer served {sum(writer_server.calls.values()):,} calls: "
+              f"{dict(writer_server.calls.most_common(6))}")
+
+
+async def run_worker(index, shard_count, shard_ids, port, fake_commands=0):
+    """One cluster worker: the cogs over `shard_ids`, with every database call sent to the writer."""
+    client = await WriterClient.connect(bytes.fromhex(os.environ["CLUSTER_KEY"]), port)
+    db.attach(client)
+    bot.shard_count = shard_count
+    bot.shard_ids = shard_ids
+    bot.cluster_index = index
     async with bot:
-        # Load Cogs
-        await bot.add_cog(Economy(bot))
-        await bot.add_cog(RPG(bot))
-        await bot.add_cog(Casino(bot))
-        await bot.add_cog(Moderation(bot))
-        await bot.add_cog(AlicePersona(bot))
+        register_persistent_views(bot)
+        for extension in EXTENSIONS:
+            await bot.load_extension(extension)
+        market.restore(await db.load_price_history(market.history_size))
+        client.subscribe("market", on_market_tick)
+        settle_orders_loop.start()
+        animator.instant_guilds.update(await db.load_instant_guilds())
+        metrics_server = None
+        try:
+            if fake_commands:
+                animator.instant = True  # The fake interactions have nothing to animate
+                gateway = FakeGateway(bot, shard_ids, shard_count, seed=index)
+                stats = await gateway.run(fake_commands)
+                stats.update(shards=shard_ids, users=len(gateway.users), rpc_calls=client.calls,
+                             rpc_us=client.wait / max(client.calls, 1) * 1e6,
+                             ticks=ticks_received["market"], tick=market.ticks, prices=list(market.prices))
+                await report_worker(index, stats)
+            elif TOKEN:
+                print(f" [CLUSTER] Worker {index} starting shards {shard_ids} of {shard_count}")
+                metrics_server = await start_metrics_server(METRICS_PORT and METRICS_PORT + 1 + index)
+                await bot.start(TOKEN)
+            else:
+                print(" [ERROR] TOKEN not found in environment variables.")
+        finally:
+            if metrics_server:
+                await metrics_server.stop()
+            await shutdown()
+            await client.close()
 
-        # Start Background Tasks
-        update_stocks_loop.start()
 
-        # Start Bot
-        print(" [SYSTEM] Initializing Alice System v3.0...")
-        if TOKEN:
-            await bot.start(TOKEN)
-        else:
-            print(" [ERROR] TOKEN not found in environment variables.")
+@bot.event
+async def setup_hook():
+    # Runs once per process after login, before the gateway connects; reconnects never sync
+    if getattr(bot, "cluster_index", 0):
+        return  # The first cluster worker syncs commands for everyone
+    try:
+        if not await command_sync.sync_all(DEV_GUILDS):
+            print(" [SYNC] Command tree unchanged, sync skipped.")
+    except Exception as e:
+        print(f" [ERROR] Sync Failed: {e}")
 
 
 @bot.event
@@ -1125,16 +1025,95 @@ async def on_ready():
     print(f" [ONLINE] Alice System Active")
     print(f" [ID] {bot.user.id}")
     print("----------------------------------------------------------------")
-    try:
-        synced = await bot.tree.sync()
-        print(f" [SYNC] Synced {len(synced)} slash commands.")
-    except Exception as e:
-        print(f" [ERROR] Sync Failed: {e}")
 
 
 # Entry Point
 if __name__ == "__main__":
+    # Offline tools import only what they need
+    if sys.argv[1:2] == ["simulate"]:
+        from simulator import run_simulation_cli
+        run_simulation_cli(sys.argv[2:])
+        sys.exit()
+    if sys.argv[1:2] == ["simulate-rest"]:
+        from simulator import run_rest_simulation_cli
+        run_rest_simulation_cli(sys.argv[2:])
+        sys.exit()
+    if sys.argv[1:2] == ["simulate-meme"]:
+        from simulator import run_meme_simulation_cli
+        run_meme_simulation_cli(sys.argv[2:])
+        sys.exit()
+    if sys.argv[1:2] == ["simulate-gateway"]:
+        from simulator import run_gateway_simulation_cli
+        run_gateway_simulation_cli(sys.argv[2:])
+        sys.exit()
+    if sys.argv[1:2] == ["bench-embeds"]:
+        from cogs.persona import bench_embeds
+        bench_embeds(*map(int, sys.argv[2:3]))
+        sys.exit()
+    if sys.argv[1:2] == ["bench-blackjack"]:
+        from games import bench_blackjack
+        bench_blackjack(*map(int, sys.argv[2:4]))
+        sys.exit()
+    if sys.argv[1:2] == ["bench-combat"]:
+        from games import bench_combat
+        bench_combat(*map(int, sys.argv[2:4]))
+        sys.exit()
+    if sys.argv[1:2] == ["bench-sync"]:
+        bench_command_sync(*map(int, sys.argv[2:4]))
+        sys.exit()
+    if sys.argv[1:2] == ["bench-metrics"]:
+        bench_metrics(*map(int, sys.argv[2:4]))
+        sys.exit()
+    if sys.argv[1:2] == ["bench-async-db"]:
+        bench_async_db(*map(int, sys.argv[2:4]))
+        sys.exit()
+    if sys.argv[1:2] == ["bench-connections"]:
+        bench_connections(*map(int, sys.argv[2:3]))
+        sys.exit()
+    if sys.argv[1:2] == ["bench-write-behind"]:
+        bench_write_behind(*map(float, sys.argv[2:3]))
+        sys.exit()
+    if sys.argv[1:2] == ["bench-leaderboard"]:
+        bench_leaderboard(*map(int, sys.argv[2:5]))
+        sys.exit()
+    if sys.argv[1:2] == ["bench-market"]:
+        bench_market(*map(int, sys.argv[2:4]))
+        sys.exit()
+    if sys.argv[1:2] == ["bench-orders"]:
+        bench_orders(*map(int, sys.argv[2:5]))
+        sys.exit()
+    if sys.argv[1:2] == ["bench-portfolio"]:
+        bench_portfolio(*map(int, sys.argv[2:6]))
+        sys.exit()
+    if sys.argv[1:2] == ["bench-migrate"]:
+        bench_migrate(*map(int, sys.argv[2:3]))
+        sys.exit()
+    if sys.argv[1:2] == ["bench-rows"]:
+        bench_rows(*map(int, sys.argv[2:3]))
+        sys.exit()
+    if sys.argv[1:2] == ["bench-startup"]:
+        bench_startup(*map(int, sys.argv[2:3]))
+        sys.exit()
+    if sys.argv[1:2] in (["cluster"], ["cluster-test"]):
+        # cluster [workers] [shards] | cluster-test [workers] [shards] [commands per worker]
+        options = [int(arg) for arg in sys.argv[2:5]]
+        workers = options[0] if options else CLUSTER_WORKERS
+        shard_count = options[1] if len(options) > 1 else SHARD_COUNT
+        fake_commands = (options[2] if len(options) > 2 else 1000) if sys.argv[1] == "cluster-test" else 0
+        try:
+            asyncio.run(run_cluster(workers, shard_count, fake_commands))
+        except KeyboardInterrupt:
+            print(" [SHUTDOWN] Cluster deactivated manually.")
+        sys.exit()
+    if sys.argv[1:2] == ["cluster-worker"]:
+        index, shard_count, shard_ids, port, fake_commands = sys.argv[2:7]
+        try:
+            asyncio.run(run_worker(int(index), int(shard_count), [int(s) for s in shard_ids.split(",")],
+                                   int(port), int(fake_commands)))
+        except KeyboardInterrupt:
+            pass
+        sys.exit()
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
-        print(" [SHUTDOWN] System deactivated manually.")
\ No newline at end of file
+        print(" [SHUTDOWN] System deactivated manually.")
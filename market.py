@@ -0,0 +1,269 @@
+import asyncio
+import itertools
+import random
+import sys
+import time
+from array import array
+from operator import add, mul
+from config import LIMIT_ORDER_TTL, MARKET_HISTORY, MARKET_LISTINGS
+from database import db, writer_call
+
+# Random 64-bit words become doubles in [1, 2) by forcing the sign/exponent bits to 0x3ff: the
+# high byte is set outright and the next one keeps its low (mantissa) nibble via translate()
+_SIGN_BYTE, _EXPONENT_BYTE = (7, 6) if sys.byteorder == "little" else (0, 1)
+_EXPONENT_NIBBLE = bytes(0xF0 | (b & 0x0F) for b in range(256))
+
+
+# ==================================================================================================
+#  STOCK MARKET ENGINE
+# ==================================================================================================
+
+class StockMarket:
+    """
+    Simulates a volatile stock market.
+    Prices live in flat array('d') buffers indexed by ticker, so a tick is one pass over
+    contiguous doubles. The last `history` ticks are kept in a ring buffer laid out one row
+    per tick, which makes recording a tick a single slice copy.
+    """
+
+    def __init__(self, listings=None, history=MARKET_HISTORY):
+        listings = listings or MARKET_LISTINGS
+        self.symbols = [symbol for symbol, _, _, _ in listings]
+        self.names = [name for _, name, _, _ in listings]
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.prices = array("d", [price for _, _, price, _ in listings])
+        self.volatility = array("d", [vol for _, _, _, vol in listings])
+        # A tick scales each price by 1 + (2u - 1) * vol = (1 - 3vol) + d * 2vol for d = 1 + u in [1, 2)
+        self._base = array("d", [1 - 3 * vol for vol in self.volatility])
+        self._span = array("d", [2 * vol for vol in self.volatility])
+        self.history_size = history
+        self.history = array("d", bytes(8 * len(self.symbols) * history))
+        self.head = 0  # next history row to write
+        self.filled = 0  # rows of history that hold data
+        self.ticks = 0
+        self._record()
+
+    def __contains__(self, symbol):
+        return symbol in self.index
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def price(self, symbol):
+        return self.prices[self.index[symbol]]
+
+    def name(self, symbol):
+        return self.names[self.index[symbol]]
+
+    def update_prices(self, rng=random):
+        """
+        One tick for every ticker at once: a single getrandbits() call supplies all the draws, which
+        are turned into doubles with byte slice assignments, and the arithmetic runs as chained
+        map()s over the arrays, so no Python bytecode executes per ticker.
+        """
+        n = len(self.symbols)
+        raw = bytearray(rng.getrandbits(64 * n).to_bytes(8 * n, sys.byteorder))
+        raw[_EXPONENT_BYTE::8] = raw[_EXPONENT_BYTE::8].translate(_EXPONENT_NIBBLE)
+        raw[_SIGN_BYTE::8] = b"\x3f" * n
+        prices = array("d", map(mul, self.prices, map(add, self._base, map(mul, array("d", raw), self._span))))
+        if n and min(prices) < 0.1:  # Ensure price never hits 0
+            prices = array("d", [max(0.1, price) for price in prices])
+        self.prices = prices
+        self.ticks += 1
+        self._record()
+
+    def _record(self):
+        n = len(self.symbols)
+        self.history[self.head * n:(self.head + 1) * n] = self.prices
+        self.head = (self.head + 1) % self.history_size
+        self.filled = min(self.filled + 1, self.history_size)
+
+    def price_history(self, symbol, points=None):
+        """Oldest-to-newest prices for one ticker (strided read out of the ring buffer)."""
+        n = len(self.symbols)
+        column = self.history[self.index[symbol]::n]
+        if self.filled == self.history_size:
+            column = column[self.head:] + column[:self.head]
+        else:
+            column = column[:self.filled]
+        return column[-points:] if points else column
+
+    def moving_average(self, symbol, window):
+        prices = self.price_history(symbol, window)
+        return sum(prices) / len(prices)
+
+    def change(self, symbol):
+        """Fractional change since the previous tick."""
+        prices = self.price_history(symbol, 2)
+        return prices[-1] / prices[0] - 1 if len(prices) == 2 else 0.0
+
+    def snapshot(self):
+        return [(self.ticks, symbol, price) for symbol, price in zip(self.symbols, self.prices)]
+
+    def restore(self, rows):
+        """Reloads (tick, symbol, price) rows saved by DatabaseManager.save_price_snapshot."""
+        by_tick = {}
+        for tick, symbol, price in rows:
+            if symbol in self.index:
+                by_tick.setdefault(tick, {})[symbol] = price
+        for tick in sorted(by_tick)[-self.history_size:]:
+            for symbol, price in by_tick[tick].items():
+                self.prices[self.index[symbol]] = price
+            self.ticks = tick
+            self._record()
+
+
+market = StockMarket()
+
+class Order:
+    """A queued trade. Resolves its future with (status, shares, cash) once settled."""
+    __slots__ = ("order_id", "user_id", "channel_id", "symbol", "side", "shares", "limit", "placed_at", "future")
+
+    def __init__(self, order_id, user_id, channel_id, symbol, side, shares, limit, future):
+        self.order_id = order_id
+        self.user_id = user_id
+        self.channel_id = channel_id
+        self.symbol = symbol
+        self.side = side
+        self.shares = shares
+        self.limit = limit
+        self.placed_at = time.monotonic()
+        self.future = future
+
+    def crosses(self, price):
+        if self.limit is None:
+            return True
+        return price <= self.limit if self.side == "buy" else price >= self.limit
+
+    def resolve(self, status, cash=0):
+        if not self.future.done():
+            self.future.set_result((status, self.shares, cash))
+
+
+class OrderBook:
+    """
+    In-memory order queue. Market orders wait for the next settlement batch; limit orders
+    rest until the price crosses their limit (checked each batch) or they expire.
+    """
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self.queued = []
+        self.resting = {}  # order_id -> Order
+
+    def submit(self, user_id, channel_id, symbol, side, shares, limit=None):
+        future = asyncio.get_running_loop().create_future()
+        order = Order(next(self._ids), user_id, channel_id, symbol, side, shares, limit, future)
+        if limit is None:
+            self.queued.append(order)
+        else:
+            self.resting[order.order_id] = order
+        return order
+
+    def open_orders(self, user_id):
+        return [order for order in self.resting.values() if order.user_id == user_id]
+
+    def cancel(self, user_id, order_id):
+        order = self.resting.get(order_id)
+        if order is None or order.user_id != user_id:
+            return False
+        del self.resting[order_id]
+        order.resolve("cancelled")
+        return True
+
+    def take_batch(self, market):
+        """Pops every order that can execute at current prices."""
+        batch, self.queued = self.queued, []
+        now = time.monotonic()
+        for order_id, order in list(self.resting.items()):
+            if now - order.placed_at > LIMIT_ORDER_TTL:
+                del self.resting[order_id]
+                order.resolve("expired")
+            elif order.crosses(market.price(order.symbol)):
+                del self.resting[order_id]
+                batch.append(order)
+        return batch
+
+
+order_book = OrderBook()
+
+class PortfolioIndex:
+    """
+    Market value of every user's holdings, kept current incrementally.
+    Positions are stored per ticker (holders[i] = {user_id: shares}) and valued at marks[i];
+    a tick only walks the holders of tickers whose price moved, and value() is a dict lookup.
+    """
+
+    def __init__(self, market):
+        self.market = market
+        self.holders = [{} for _ in market.symbols]
+        self.marks = array("d", market.prices)
+        self.values = {}
+
+    def load(self, rows):
+        """Rebuilds from PortfolioRow rows. Returns each user's holdings value."""
+        self.holders = [{} for _ in self.market.symbols]
+        self.marks = array("d", self.market.prices)
+        self.values = {}
+        for row in rows:
+            i = self.market.index.get(row.symbol)
+            if i is not None:
+                self.holders[i][row.user_id] = row.shares
+                self.values[row.user_id] = self.values.get(row.user_id, 0.0) + row.shares * self.marks[i]
+        return dict(self.values)
+
+    def value(self, user_id):
+        return self.values.get(user_id, 0.0)
+
+    def apply(self, user_id, symbol, shares_delta):
+        """Records a settled trade. Returns the change in the user's holdings value."""
+        i = self.market.index[symbol]
+        holders = self.holders[i]
+        shares = holders.get(user_id, 0) + shares_delta
+        if shares > 0:
+            holders[user_id] = shares
+        else:
+            holders.pop(user_id, None)
+        change = shares_delta * self.marks[i]
+        self.values[user_id] = self.values.get(user_id, 0.0) + change
+        return change
+
+    def revalue(self):
+        """Marks every position to the latest prices. Returns {user_id: value change}."""
+        changes = {}
+        prices = self.market.prices
+        for i, (old, new) in enumerate(zip(self.marks, prices)):
+            if old == new or not self.holders[i]:
+                continue
+            step = new - old
+            for user_id, shares in self.holders[i].items():
+                changes[user_id] = changes.get(user_id, 0.0) + shares * step
+        self.marks = array("d", prices)
+        values = self.values
+        for user_id, change in changes.items():
+            values[user_id] += change
+        return changes
+
+
+portfolios = PortfolioIndex(market)
+
+
+@writer_call
+async def settle_fills(fills):
+    """
+    Settles (user_id, symbol, side, shares, price) fills in one DB transaction, then books the
+    filled ones into holdings and net worth. Returns [(filled, cash)] in fill order.
+    """
+    results = await db.settle_orders(fills)
+    holdings = {}
+    for (user_id, symbol, side, shares, _), (filled, _) in zip(fills, results):
+        if filled:
+            change = portfolios.apply(user_id, symbol, shares if side == "buy" else -shares)
+            holdings[user_id] = holdings.get(user_id, 0.0) + change
+    db.leaderboards["networth"].adjust_many(holdings)
+    return results
+
+
+@writer_call
+async def holdings_value(user_id):
+    return portfolios.value(user_id)
@@ -0,0 +1,303 @@
+import bisect
+import contextvars
+import re
+import time
+from discord import app_commands
+from config import METRICS_ENABLED, METRICS_HOST, METRICS_PORT
+
+
+# ==================================================================================================
+#  METRICS (LATENCY HISTOGRAMS, COUNTERS, PROMETHEUS ENDPOINT)
+# ==================================================================================================
+
+# Bucket upper bounds in seconds, shared by every histogram (0.1 ms to 10 s)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# name -> (type, label names, help)
+FAMILIES = {
+    "alice_uptime_seconds": ("gauge", (), "Seconds since this process started"),
+    "alice_command_seconds": ("histogram", ("command",), "App command time, from the tree picking it up to completion"),
+    "alice_command_db_seconds": ("histogram", ("command",), "Time an app command spent waiting on the database"),
+    "alice_command_rest_seconds": ("histogram", ("command",), "Time an app command spent in Discord REST calls"),
+    "alice_command_errors_total": ("counter", ("command", "error"), "App commands that raised"),
+    "alice_command_db_statements_total": ("counter", ("command",), "SQL statements issued on behalf of app commands"),
+    "alice_db_call_seconds": ("histogram", ("method",), "Database manager call time on the DB thread, by method"),
+    "alice_db_statement_seconds": ("histogram", ("statement",),
+                                   "SQL statement time including its row fetches, by statement text (sampled calls)"),
+    "alice_db_statements_total": ("counter", (), "SQL statements issued"),
+    "alice_cache_lookups_total": ("counter", ("cache", "result"), "Database cache lookups, by hit or miss"),
+    "alice_cache_evictions_total": ("counter", ("cache",), "Entries pushed out of a full database cache"),
+    "alice_cache_entries": ("gauge", ("cache",), "Entries held by a database cache"),
+    "alice_rest_request_seconds": ("histogram", ("method", "route"), "Discord REST request time"),
+    "alice_rest_requests_total": ("counter", ("method", "route", "status"), "Discord REST responses"),
+    "alice_rest_rate_limited_total": ("counter", ("route", "scope"), "Discord REST responses with status 429"),
+    "alice_rest_bucket_exhausted_total": ("counter", ("route",),
+                                          "Responses that used up a rate-limit bucket, so the next call waits"),
+    "alice_animation_edit_seconds": ("histogram", ("game",), "Scheduled animation frame edits"),
+    "alice_animation_seconds": ("histogram", ("game",), "From a game's opening frame to its final result"),
+    "alice_gateway_latency_seconds": ("gauge", (), "Heartbeat latency averaged over shards"),
+}
+
+# [started, db seconds, rest seconds, SQL statements] of the app command running in the current task
+_command_costs = contextvars.ContextVar("command_costs", default=None)
+
+
+class Histogram:
+    """Fixed-bucket histogram. observe() is a bisect and two additions."""
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # The last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def quantile(self, q):
+        """Estimated q-quantile, interpolated inside the bucket it falls in."""
+        total = self.count
+        if not total:
+            return 0.0
+        rank, seen = q * total, 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.bounds[i - 1] if i else 0.0
+                if i == len(self.bounds):
+                    return lower
+                return lower + (self.bounds[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.bounds[-1]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metrics:
+    """
+    In-process registry for every family in FAMILIES.
+    Histograms and counters are keyed by (name, label values). Hooks on the event loop and the DB
+    thread write to separate families, so no locks are needed.
+    """
+
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self.started = time.time()
+        self.endpoint = None  # URL while a MetricsServer serves this registry
+        self.histograms = {}  # (name, labels) -> Histogram
+        self.counters = {}  # (name, labels) -> value
+        # name -> callable read at scrape time, for values kept elsewhere: a value, or [(labels, value)]
+        self.collectors = {"alice_uptime_seconds": lambda: time.time() - self.started}
+
+    def histogram(self, name, labels):
+        hist = self.histograms.get((name, labels))
+        if hist is None:
+            hist = self.histograms[name, labels] = Histogram()
+        return hist
+
+    def observe(self, name, labels, value):
+        self.histogram(name, labels).observe(value)
+
+    def inc(self, name, labels=(), amount=1):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def family(self, name):
+        """[(labels, Histogram or value)] of one family."""
+        source = self.histograms if FAMILIES[name][0] == "histogram" else self.counters
+        return [(labels, value) for (family, labels), value in list(source.items()) if family == name]
+
+    def total(self, name):
+        return sum(value for _, value in self.family(name))
+
+    # --- APP COMMANDS ---
+    def command_started(self, interaction):
+        costs = interaction.extras["metrics"] = [time.perf_counter(), 0.0, 0.0, 0]
+        _command_costs.set(costs)
+
+    def command_done(self, interaction, command, error=None):
+        name = command.qualified_name if command is not None else "unknown"
+        if error is not None:
+            self.inc("alice_command_errors_total", (name, type(getattr(error, "original", error)).__name__))
+        costs = interaction.extras.get("metrics")
+        if costs is None:
+            return
+        labels = (name,)
+        self.observe("alice_command_seconds", labels, time.perf_counter() - costs[0])
+        self.observe("alice_command_db_seconds", labels, costs[1])
+        self.observe("alice_command_rest_seconds", labels, costs[2])
+        self.inc("alice_command_db_statements_total", labels, costs[3])
+
+    @staticmethod
+    def charge_db(seconds):
+        """Adds database wait time to the app command running in this task, if any."""
+        costs = _command_costs.get()
+        if costs is not None:
+            costs[1] += seconds
+
+    @staticmethod
+    def charge_rest(seconds):
+        costs = _command_costs.get()
+        if costs is not None:
+            costs[2] += seconds
+
+    @staticmethod
+    def charge_statements(count):
+        """Called on the DB worker, inside the command's copied context."""
+        costs = _command_costs.get()
+        if costs is not None:
+            costs[3] += count
+
+    # --- EXPORT ---
+    def render(self):
+        """Every family in the Prometheus text exposition format."""
+        histograms, counters = {}, {}
+        for (name, labels), hist in list(self.histograms.items()):
+            histograms.setdefault(name, []).append((labels, hist))
+        for (name, labels), value in list(self.counters.items()):
+            counters.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name, (kind, label_names, text) in FAMILIES.items():
+            if name in self.collectors:
+                samples = self.collectors[name]()
+                if not isinstance(samples, list):
+                    samples = [((), samples)]
+            elif kind == "gauge":
+                continue
+            else:
+                samples = sorted((histograms if kind == "histogram" else counters).get(name, ()))
+            if not samples:
+                continue
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if kind != "histogram":
+                    lines.append(f"{name}{_labels(label_names, labels)} {value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip((*value.bounds, "+Inf"), value.counts):
+                    cumulative += count
+                    le = f'le="{bound}"'
+                    lines.append(f"{name}_bucket{_labels(label_names, labels, le)} {cumulative}")
+                lines.append(f"{name}_sum{_labels(label_names, labels)} {value.sum}")
+                lines.append(f"{name}_count{_labels(label_names, labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+class InstrumentedTree(app_commands.CommandTree):
+    """
+    Command tree that times every app command, with the database and REST time it waited on.
+    Needs a commands.Bot, whose listener receives the completion event.
+    """
+
+    def __init__(self, client, **kwargs):
+        super().__init__(client, **kwargs)
+        client.add_listener(self.on_app_command_completion)
+
+    async def interaction_check(self, interaction):
+        if metrics.enabled:
+            metrics.command_started(interaction)
+        return True
+
+    async def on_app_command_completion(self, interaction, command):
+        metrics.command_done(interaction, command)
+
+    async def on_error(self, interaction, error):
+        metrics.command_done(interaction, interaction.command, error)
+        await super().on_error(interaction, error)
+
+
+# --- DISCORD REST ---
+_API_PREFIX = re.compile(r"^/api/v\d+")
+_SNOWFLAKE = re.compile(r"\d{15,21}")
+_TOKEN = re.compile(r"/(interactions|webhooks)/\{id\}/[^/]+")  # Interaction and webhook tokens are secrets
+_EMOJI = re.compile(r"/reactions/[^/]+")
+
+
+def route_key(path):
+    """'/api/v10/channels/123.../messages/456...' -> '/channels/{id}/messages/{id}'."""
+    path = _SNOWFLAKE.sub("{id}", _API_PREFIX.sub("", path))
+    return _EMOJI.sub("/reactions/{emoji}", _TOKEN.sub(r"/\1/{id}/{token}", path))
+
+
+def http_trace():
+    """aiohttp TraceConfig for the bot's HTTP session (every REST call and interaction response), or None."""
+    if not metrics.enabled:
+        return None
+    import aiohttp
+
+    async def on_request_start(session, context, params):
+        context.started = time.perf_counter()
+
+    async def on_request_end(session, context, params):
+        elapsed = time.perf_counter() - context.started
+        route = route_key(params.url.path)
+        response = params.response
+        metrics.observe("alice_rest_request_seconds", (params.method, route), elapsed)
+        metrics.inc("alice_rest_requests_total", (params.method, route, str(response.status)))
+        if response.status == 429:
+            metrics.inc("alice_rest_rate_limited_total", (route, response.headers.get("X-RateLimit-Scope", "user")))
+        elif response.headers.get("X-RateLimit-Remaining") == "0":
+            metrics.inc("alice_rest_bucket_exhausted_total", (route,))
+        metrics.charge_rest(elapsed)
+
+    async def on_request_exception(session, context, params):
+        elapsed = time.perf_counter() - context.started
+        metrics.inc("alice_rest_requests_total", (params.method, route_key(params.url.path), "error"))
+        metrics.charge_rest(elapsed)
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(on_request_start)
+    trace.on_request_end.append(on_request_end)
+    trace.on_request_exception.append(on_request_exception)
+    return trace
+
+
+# --- ENDPOINT ---
+class MetricsServer:
+    """Serves a registry as Prometheus text on a local port (GET /metrics)."""
+
+    def __init__(self, registry=metrics, host=METRICS_HOST, port=METRICS_PORT):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.runner = None
+
+    async def start(self):
+        from aiohttp import web  # Only loaded when the endpoint is on
+
+        async def handle(request):
+            return web.Response(body=self.registry.render().encode(),
+                                headers={"Content-Type": PROMETHEUS_CONTENT_TYPE})
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        self.port = self.runner.addresses[0][1]
+        self.registry.endpoint = f"http://{self.host}:{self.port}/metrics"
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+            self.registry.endpoint = None
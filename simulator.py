@@ -0,0 +1,456 @@
+import discord
+import asyncio
+import bisect
+import itertools
+import json
+import random
+import time
+import tracemalloc
+from collections import Counter
+from config import EDIT_BUCKET_PER, EDIT_BUCKET_SLACK, EXTENSIONS
+from utils import EditScheduler, RNGService, gateway_intents
+from games import (BlackjackTable, flip_coin, MONSTERS, resolve_fight, RPG_CLASSES, Shoe, slots_result,
+    spin_slots)
+
+
+# ==================================================================================================
+#  OFFLINE SIMULATOR (HOUSE EDGE & PAYOUT TUNING)
+# ==================================================================================================
+# Plays games in bulk through the same pure functions the cogs use.
+# Usage: python main.py simulate <coinflip|slots|blackjack|dungeon> [rounds] [seed]
+
+def _report(game, rounds, wagered, returned, outcomes, **extra):
+    report = {
+        "game": game,
+        "rounds": rounds,
+        "wagered": wagered,
+        "returned": returned,
+        "house_edge": (wagered - returned) / wagered if wagered else 0.0,
+        "distribution": {key: count / rounds for key, count in sorted(outcomes.items())},
+    }
+    report.update(extra)
+    return report
+
+
+def simulate_coinflip(rounds, seed, bet=100):
+    rng = random.Random(seed)
+    outcomes = Counter(flip_coin(rng) == "heads" for _ in range(rounds))
+    wins = outcomes[True]
+    return _report("coinflip", rounds, bet * rounds, 2 * bet * wins, {"win": wins, "loss": rounds - wins})
+
+
+def simulate_slots(rounds, seed, bet=100):
+    """Spins the way /slots does: spin_slots on each round's RNG, drawn from the "slots" stream."""
+    rngs = RNGService(seed)
+    outcomes = Counter()
+    returned = 0
+    for _ in range(rounds):
+        _, rng = rngs.round("slots")
+        outcome, change = slots_result(spin_slots(rng), bet)
+        outcomes[outcome] += 1
+        if change > 0:
+            returned += bet + change
+    return _report("slots", rounds, bet * rounds, returned, outcomes)
+
+
+def simulate_blackjack(rounds, seed, bet=100, stand_on=17):
+    """
+    One seat at a BlackjackTable dealt from a seeded Shoe, so the same shoe, cut card and dealer
+    rules as the cog. The player hits below `stand_on`, like a cautious human.
+    """
+    shoe = Shoe(rngs=RNGService(seed))
+    outcomes = Counter()
+    returned = 0
+    for _ in range(rounds):
+        table = BlackjackTable(0, shoe, 1, bet)
+        table.deal()
+        hand = table.hand(1)
+        while hand is not None and hand.total < stand_on:
+            table.hit(hand)
+            hand = table.hand(1)
+        (_, outcome, change), = table.finish()[1]
+        outcomes[outcome] += 1
+        returned += bet + change
+    return _report("blackjack", rounds, bet * rounds, returned, outcomes, decks=shoe.decks)
+
+
+def simulate_dungeon(rounds, seed, rpg_class=None):
+    """Fights random monsters at full HP. 'Wagered' is unused; reports win rate and gold per fight."""
+    rng = random.Random(seed)
+    stats = RPG_CLASSES.get(rpg_class, {"hp": 100, "atk": 10, "def": 5})
+    outcomes = Counter()
+    gold = 0
+    for _ in range(rounds):
+        monster = rng.choice(MONSTERS)
+        won = resolve_fight(stats['hp'], stats['atk'], stats['def'], monster['hp'], monster['atk'], rng, keep=0)[0]
+        outcomes[f"{'win' if won else 'loss'}:{monster['name']}"] += 1
+        if won:
+            gold += monster['gold']
+    wins = sum(count for key, count in outcomes.items() if key.startswith("win"))
+    return _report("dungeon", rounds, 0, gold, outcomes, rpg_class=rpg_class or "Novice",
+                   win_rate=wins / rounds, gold_per_fight=gold / rounds)
+
+
+# (intermediate frames, seconds between frames) of each animated game
+GAME_ANIMATIONS = {"coinflip": (0, 2.0), "slots": (3, 0.5), "dungeon": (1, 2.0), "roulette": (0, 2.0)}
+
+
+class _SimInteraction:
+    """Stand-in for discord.Interaction that records REST calls instead of making them."""
+    _ids = itertools.count(1)
+
+    def __init__(self, channel_id, log):
+        self.id = next(self._ids)
+        self.guild_id = channel_id
+        self.channel_id = channel_id
+        self.response = self
+        self.log = log
+
+    async def send_message(self, **kwargs):
+        self.log.append((time.monotonic(), self.channel_id, "send"))
+
+    async def edit_original_response(self, **kwargs):
+        self.log.append((time.monotonic(), self.channel_id, "edit"))
+
+
+async def simulate_rest_calls(games=400, channels=10, window=10.0, instant=False, time_scale=0.05, seed=0):
+    """
+    Replays `games` random games started over `window` seconds across `channels` through the
+    EditScheduler, with time compressed by `time_scale`. Reports REST calls per game against
+    the old sleep-and-edit loops, and the worst burst of edits per channel in one bucket period
+    (the opening responses are interaction callbacks and don't share the edit bucket).
+    """
+    rng = random.Random(seed)
+    scheduler = EditScheduler(per=(EDIT_BUCKET_PER + EDIT_BUCKET_SLACK) * time_scale, instant=instant)
+    log = []
+    played = Counter()
+    for _ in range(games):
+        await asyncio.sleep(rng.uniform(0, 2 * window / games) * time_scale)
+        game = rng.choice(list(GAME_ANIMATIONS))
+        frames, delay = GAME_ANIMATIONS[game]
+        played[game] += 1
+        await scheduler.play(_SimInteraction(rng.randrange(channels), log), game, {}, {}, [{}] * frames,
+                             delay * time_scale)
+    while scheduler.jobs:
+        await asyncio.sleep(0.01)
+    await scheduler.stop()
+
+    per_channel = {}
+    for at, channel, kind in log:
+        if kind == "edit":
+            per_channel.setdefault(channel, []).append(at)
+    burst = 0
+    for times in per_channel.values():
+        times.sort()
+        for i, at in enumerate(times):
+            burst = max(burst, bisect.bisect_left(times, at + EDIT_BUCKET_PER * time_scale) - i)
+    return {
+        "mode": "instant" if instant else "animated",
+        "games": dict(played),
+        "old_calls": {game: count * (GAME_ANIMATIONS[game][0] + 2) for game, count in played.items()},
+        "calls": dict(scheduler.calls),
+        "coalesced": scheduler.coalesced,
+        "max_edits_per_bucket": burst,
+    }
+
+
+def run_rest_simulation_cli(args):
+    games = int(args[0]) if args else 400
+    channels = int(args[1]) if len(args) > 1 else 10
+    for instant in (False, True):
+        report = asyncio.run(simulate_rest_calls(games, channels, instant=instant))
+        print(f" [SIM] {report['mode']}: {games} games over {channels} channels")
+        for game, count in sorted(report['games'].items()):
+            print(f" [SIM]   {game}: {report['calls'][game] / count:.2f} REST calls/game "
+                  f"(sleep-and-edit: {report['old_calls'][game] / count:.2f})")
+        print(f" [SIM]   coalesced frames: {report['coalesced']} | "
+              f"worst channel burst: {report['max_edits_per_bucket']} edits per {EDIT_BUCKET_PER:g}s")
+
+
+# --- GATEWAY REPLAY ---
+# A synthetic capture of one large guild's gateway traffic, replayed through discord.py's own parsers
+# under the old Intents.all() setup and the minimal one, to compare what each costs to keep up with.
+# Which intent Discord requires before it sends each event (member chunks also need chunking on)
+GATEWAY_EVENT_INTENTS = {
+    "PRESENCE_UPDATE": "presences",
+    "GUILD_MEMBERS_CHUNK": "members",
+    "GUILD_MEMBER_UPDATE": "members",
+    "MESSAGE_CREATE": "guild_messages",
+    "TYPING_START": "guild_typing",
+    "MESSAGE_REACTION_ADD": "guild_reactions",
+}
+# Share of each event in the replayed stream, roughly what a busy community server produces
+GATEWAY_EVENT_MIX = {"PRESENCE_UPDATE": 70, "MESSAGE_CREATE": 12, "TYPING_START": 8, "GUILD_MEMBER_UPDATE": 5,
+                     "MESSAGE_REACTION_ADD": 5}
+_FIXTURE_GUILD = 1_100_000_000_000_000_000
+_FIXTURE_BOT = 1_000_000_000_000_000_001
+
+
+def build_gateway_fixture(members=50_000, events=100_000, online=0.2, seed=0):
+    """
+    Returns (guild_create, chunks, stream): the guild payload as sent with every intent on, the
+    GUILD_MEMBERS_CHUNK payloads for a full member list, and (event name, raw JSON) pairs.
+    Everything after the guild payload is serialised, as it would arrive off the socket.
+    """
+    rng = random.Random(seed)
+    joined = "2024-01-01T00:00:00+00:00"
+    channel = _FIXTURE_GUILD + 1
+
+    def user(user_id):
+        return {"id": str(user_id), "username": f"user{user_id % 100_000}", "discriminator": "0",
+                "global_name": f"User {user_id % 100_000}", "avatar": None}
+
+    def member(user_id):
+        return {"user": user(user_id), "roles": [], "joined_at": joined, "deaf": False, "mute": False, "flags": 0}
+
+    def presence(user_id):
+        status = rng.choice(("online", "idle", "dnd"))
+        return {"user": {"id": str(user_id)}, "guild_id": str(_FIXTURE_GUILD), "status": status,
+                "activities": [{"name": rng.choice(("Minecraft", "Spotify", "VALORANT")), "type": 0}],
+                "client_status": {"desktop": status}}
+
+    user_ids = [_FIXTURE_GUILD + 10 + i for i in range(members)]
+    active = user_ids[:int(members * online)]
+    guild_create = {
+        "id": str(_FIXTURE_GUILD), "name": "Replay Guild", "owner_id": str(user_ids[0]), "large": True,
+        "member_count": members + 1, "unavailable": False, "features": [], "emojis": [], "stickers": [],
+        "roles": [{"id": str(_FIXTURE_GUILD), "name": "@everyone", "permissions": "0", "position": 0, "color": 0,
+                   "hoist": False, "managed": False, "mentionable": False}],
+        "channels": [{"id": str(channel), "type": 0, "name": "general", "position": 0, "permission_overwrites": []}],
+        # Large guilds arrive with the bot and the online members; the rest come in chunks
+        "members": [member(_FIXTURE_BOT)] + [member(user_id) for user_id in active],
+        "presences": [presence(user_id) for user_id in active],
+    }
+    chunk_count = -(-members // 1000)
+    chunks = [json.dumps({"guild_id": str(_FIXTURE_GUILD), "chunk_index": i, "chunk_count": chunk_count,
+                          "members": [member(user_id) for user_id in user_ids[i * 1000:(i + 1) * 1000]]})
+              for i in range(chunk_count)]
+
+    names, weights = zip(*GATEWAY_EVENT_MIX.items())
+    stream = []
+    message_ids = itertools.count(_FIXTURE_GUILD + 10_000_000)
+    for name in rng.choices(names, weights, k=events):
+        user_id = rng.choice(active)
+        if name == "PRESENCE_UPDATE":
+            data = presence(user_id)
+        elif name == "MESSAGE_CREATE":
+            data = {"id": str(next(message_ids)), "channel_id": str(channel), "guild_id": str(_FIXTURE_GUILD),
+                    "author": user(user_id), "member": {"roles": [], "joined_at": joined, "deaf": False, "mute": False},
+                    "content": "gm " * rng.randint(1, 20), "timestamp": joined, "edited_timestamp": None,
+                    "tts": False, "mention_everyone": False, "mentions": [], "mention_roles": [], "attachments": [],
+                    "embeds": [], "pinned": False, "type": 0}
+        elif name == "TYPING_START":
+            data = {"channel_id": str(channel), "guild_id": str(_FIXTURE_GUILD), "user_id": str(user_id),
+                    "timestamp": 1_700_000_000, "member": member(user_id)}
+        elif name == "GUILD_MEMBER_UPDATE":
+            data = dict(member(user_id), guild_id=str(_FIXTURE_GUILD), nick=f"nick{rng.randrange(1000)}")
+        else:
+            data = {"user_id": str(user_id), "channel_id": str(channel), "message_id": str(_FIXTURE_GUILD + 10_000_000),
+                    "guild_id": str(_FIXTURE_GUILD), "emoji": {"id": None, "name": "👍"}, "member": member(user_id),
+                    "burst": False, "type": 0}
+        stream.append((name, json.dumps(data)))
+    return guild_create, chunks, stream
+
+
+def _replay(intents, member_cache_flags, chunk_guilds, max_messages, fixture):
+    """Feeds the events Discord would send for `intents` through a fresh client's parsers."""
+    guild_create, chunks, stream = fixture
+    client = discord.Client(intents=intents, member_cache_flags=member_cache_flags,
+                            chunk_guilds_at_startup=chunk_guilds, max_messages=max_messages)
+    state = client._connection
+    state.user = discord.ClientUser(state=state, data={"id": str(_FIXTURE_BOT), "username": "Alice",
+                                                       "discriminator": "0", "avatar": None})
+    if not intents.presences:
+        # Without presences Discord sends only the bot's own member up front
+        guild_create = dict(guild_create, members=guild_create["members"][:1], presences=[])
+    guild = state._add_guild_from_data(guild_create)
+    delivered = Counter()
+    if state._chunk_guilds:
+        request = discord.state.ChunkRequest(guild.id, 0, asyncio.get_running_loop(), state._get_guild,
+                                             cache=state.member_cache_flags.joined)
+        state._chunk_requests[request.nonce] = request
+        for raw in chunks:
+            data = json.loads(raw)
+            data["nonce"] = request.nonce
+            state.parsers["GUILD_MEMBERS_CHUNK"](data)
+        delivered["GUILD_MEMBERS_CHUNK"] = len(chunks)
+    for name, raw in stream:
+        if getattr(intents, GATEWAY_EVENT_INTENTS[name]):
+            state.parsers[name](json.loads(raw))
+            delivered[name] += 1
+    return client, guild, delivered
+
+
+async def simulate_gateway(members=50_000, events=100_000, seed=0):
+    """
+    Replays one large guild's startup and `events` gateway events under the previous Intents.all()
+    setup and the minimal intents derived from EXTENSIONS. Reports events delivered, the time spent
+    decoding and parsing them, and the memory the client keeps afterwards.
+    """
+    fixture = build_gateway_fixture(members, events, seed=seed)
+    minimal = gateway_intents(EXTENSIONS)
+    setups = {
+        "all": (discord.Intents.all(), discord.MemberCacheFlags.all(), True, 1000),
+        "minimal": (minimal, discord.MemberCacheFlags.from_intents(minimal), minimal.members, None),
+    }
+    reports = {}
+    for label, setup in setups.items():
+        started = time.perf_counter()
+        client, guild, delivered = _replay(*setup, fixture)
+        elapsed = time.perf_counter() - started
+        del client, guild
+        # Second pass under tracemalloc, which would skew the timing
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        client, guild, _ = _replay(*setup, fixture)
+        retained = tracemalloc.get_traced_memory()[0] - baseline
+        tracemalloc.stop()
+        reports[label] = {
+            "intents": setup[0].value,
+            "delivered": dict(delivered),
+            "events": sum(delivered.values()),
+            "seconds": elapsed,
+            "cached_members": len(guild.members),
+            "retained_mb": retained / 2 ** 20,
+        }
+        del client, guild
+    return reports
+
+
+def run_gateway_simulation_cli(args):
+    members = int(args[0]) if args else 50_000
+    events = int(args[1]) if len(args) > 1 else 100_000
+    reports = asyncio.run(simulate_gateway(members, events))
+    print(f" [SIM] Gateway replay: {members:,}-member guild, {events:,}-event stream")
+    for label, report in reports.items():
+        print(f" [SIM]   {label} (intents {report['intents']}): {report['events']:,} events delivered, "
+              f"{report['seconds']:.2f}s to decode and parse, {report['cached_members']:,} members cached, "
+              f"{report['retained_mb']:.2f} MB retained")
+        print(f" [SIM]     {report['delivered']}")
+
+
+# --- MEME FEED ---
+# MemeFeed against a local aiohttp.web stand-in for the meme API, whose behaviour the run switches
+# between healthy, down (HTTP 503) and garbage (valid JSON that isn't an object).
+async def simulate_meme_feed(requests=200, latency=0.05, outage=3.0, cooldown=0.5):
+    """
+    Times /meme answered from the buffer against a live upstream call per request, then takes the
+    upstream down and returns garbage before bringing it back. Reports the upstream calls the breaker
+    let through while it was down, whether the refill task survived, and how long the buffer took to
+    refill once the API recovered.
+    """
+    from aiohttp import web
+    from cogs.persona import CircuitBreaker, MemeFeed
+    from utils import create_http_session
+
+    state = {"mode": "ok", "calls": Counter()}
+
+    async def gimme(request):
+        state["calls"][state["mode"]] += 1
+        await asyncio.sleep(latency)
+        if state["mode"] == "down":
+            return web.Response(status=503)
+        if state["mode"] == "garbage":
+            return web.json_response(["not", "a", "meme"])
+        count = int(request.match_info["count"])
+        return web.json_response({"count": count, "memes": [
+            {"url": f"https://i.example/{state['calls']['ok']}-{i}.png", "nsfw": False} for i in range(count)]})
+
+    app = web.Application()
+    app.router.add_get("/gimme/{count}", gimme)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    url = f"http://127.0.0.1:{runner.addresses[0][1]}/gimme"
+    session = create_http_session()
+    feed = MemeFeed(session, url, breaker=CircuitBreaker(cooldown=cooldown))
+    report = {}
+    try:
+        async def timed(fetch):
+            samples = []
+            for _ in range(requests):
+                started = time.perf_counter()
+                await fetch()
+                samples.append(time.perf_counter() - started)
+                await asyncio.sleep(0.005)  # Room for the refill task, as between real commands
+            samples.sort()
+            return samples[len(samples) // 2], samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+        async def live():
+            async with session.get(f"{url}/1") as r:
+                return await r.json()
+
+        report["live"] = await timed(live)
+        state["calls"].clear()
+        feed.start()
+        while len(feed.buffer) < feed.size:
+            await asyncio.sleep(0.01)
+        report["buffered"] = await timed(feed.get)
+        report["memes_per_call"] = (requests + feed.size) / max(state["calls"]["ok"], 1)
+
+        for mode in ("down", "garbage"):
+            state["mode"] = mode
+            feed.buffer.clear()
+            deadline = time.monotonic() + outage
+            served = 0
+            while time.monotonic() < deadline:
+                served += await feed.get() is not None
+                await asyncio.sleep(0.05)
+            report[mode] = (state["calls"][mode], served)
+
+        report["task_alive"] = not feed._task.done()
+        state["mode"] = "ok"
+        started = time.perf_counter()
+        while len(feed.buffer) < feed.size and time.perf_counter() - started < outage + cooldown * 2:
+            await asyncio.sleep(0.01)
+        report["recovery"] = time.perf_counter() - started if len(feed.buffer) >= feed.size else None
+        report["breaker"] = (feed.breaker.state, feed.breaker.trial_pending)
+    finally:
+        await feed.stop()
+        await session.close()
+        await runner.cleanup()
+    return report
+
+
+def run_meme_simulation_cli(args):
+    requests = int(args[0]) if args else 200
+    latency = float(args[1]) if len(args) > 1 else 0.05
+    report = asyncio.run(simulate_meme_feed(requests, latency))
+    print(f" [SIM] Meme feed: {requests} requests, stub API answering in {latency * 1000:.0f} ms")
+    for label in ("live", "buffered"):
+        p50, p99 = report[label]
+        print(f" [SIM]   {label:<8}: p50 {p50 * 1000:6.2f} ms, p99 {p99 * 1000:6.2f} ms")
+    print(f" [SIM]   {report['memes_per_call']:.1f} memes per upstream call")
+    for mode in ("down", "garbage"):
+        calls, served = report[mode]
+        print(f" [SIM]   upstream {mode}: {calls} calls let through, {served} memes served")
+    recovery = f"{report['recovery']:.2f}s" if report["recovery"] is not None else "never"
+    print(f" [SIM]   refill task alive: {report['task_alive']} | buffer refilled {recovery} after recovery "
+          f"| breaker {report['breaker'][0]}, trial pending: {report['breaker'][1]}")
+
+
+SIMULATORS = {
+    "coinflip": simulate_coinflip,
+    "slots": simulate_slots,
+    "blackjack": simulate_blackjack,
+    "dungeon": simulate_dungeon,
+}
+
+
+def run_simulation_cli(args):
+    if not args or args[0] not in SIMULATORS:
+        print(f" [SIM] Usage: python main.py simulate <{'|'.join(SIMULATORS)}> [rounds] [seed]")
+        return
+    game = args[0]
+    rounds = int(args[1]) if len(args) > 1 else 1_000_000
+    seed = int(args[2]) if len(args) > 2 else random.SystemRandom().getrandbits(32)
+
+    started = time.perf_counter()
+    report = SIMULATORS[game](rounds, seed)
+    print(f" [SIM] {game} x{rounds:,} (seed {seed}) in {time.perf_counter() - started:.2f}s")
+    if game == "dungeon":
+        print(f" [SIM] Win rate: {report['win_rate']:.2%} | Gold per fight: {report['gold_per_fight']:.2f}")
+    else:
+        print(f" [SIM] House edge: {report['house_edge']:.2%} (wagered {report['wagered']:,}, returned {report['returned']:,})")
+    for outcome, share in report['distribution'].items():
+        print(f" [SIM]   {outcome}: {share:.4%}")
@@ -0,0 +1,545 @@
+import discord
+from discord import ui
+import asyncio
+import contextvars
+import datetime
+import hashlib
+import heapq
+import itertools
+import json
+import math
+import os
+import random
+import time
+from collections import Counter, deque
+from config import (ANIMATION_FRAME_DELAY, ANIMATIONS_MODE, COMMAND_SYNC_FILE, CONFIRM_TIMEOUT, COOLDOWN_OVERRIDES,
+    COOLDOWNS, EDIT_BUCKET_PER, EDIT_BUCKET_RATE, EDIT_BUCKET_SLACK, EMBED_COLOR_MAIN, EMBED_FOOTER_ICON,
+    EMBED_FOOTER_TEXT, EXTENSION_INTENTS, HTTP_POOL_LIMIT, HTTP_TIMEOUT, MEMBER_CACHE_SIZE, MEMBER_CACHE_TTL)
+from database import LRUCache, writer_call
+from metrics import metrics
+
+
+# ==================================================================================================
+#  UTILITY FUNCTIONS & UI HELPERS
+# ==================================================================================================
+
+def create_embed(title: str, description: str, color: int = EMBED_COLOR_MAIN,
+                 image_url: str = None, thumbnail_url: str = None, footer_text: str = EMBED_FOOTER_TEXT):
+    """
+    Factory function to create standardized, professional embeds.
+    """
+    embed = discord.Embed(title=title, description=description, color=color,
+                          timestamp=datetime.datetime.now(datetime.timezone.utc))  # Aware already, skips astimezone()
+
+    if image_url:
+        embed.set_image(url=image_url)
+
+    if thumbnail_url:
+        embed.set_thumbnail(url=thumbnail_url)
+
+    embed.set_footer(text=footer_text, icon_url=EMBED_FOOTER_ICON)
+    return embed
+
+
+class EmbedTemplate:
+    """
+    Static parts of an embed (title, colour, footer, images), converted once.
+    render() passes them to the Embed constructor and setters, so only the description is formatted
+    per call and no Colour is built.
+    """
+    __slots__ = ("title", "description", "colour", "footer_text", "image_url", "thumbnail_url")
+
+    def __init__(self, title: str, description: str, color: int = EMBED_COLOR_MAIN,
+                 image_url: str = None, thumbnail_url: str = None, footer_text: str = EMBED_FOOTER_TEXT):
+        self.title = title
+        self.description = description  # str.format template
+        self.colour = discord.Colour(color)
+        self.footer_text = footer_text
+        self.image_url = image_url
+        self.thumbnail_url = thumbnail_url
+
+    def render(self, **fields) -> discord.Embed:
+        embed = discord.Embed(title=self.title, colour=self.colour,
+                              description=self.description.format(**fields) if fields else self.description,
+                              timestamp=datetime.datetime.now(datetime.timezone.utc))
+        embed.set_footer(text=self.footer_text, icon_url=EMBED_FOOTER_ICON)
+        if self.image_url:
+            embed.set_image(url=self.image_url)
+        if self.thumbnail_url:
+            embed.set_thumbnail(url=self.thumbnail_url)
+        return embed
+
+
+def format_money(amount: int):
+    return f"${round(amount):,}"
+
+
+def format_duration(seconds: float):
+    seconds = math.ceil(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}h {minutes}m"
+    return f"{minutes}m {seconds}s" if minutes else f"{seconds}s"
+
+
+class RNGService:
+    """
+    Seedable random streams, one per game. Every round draws its own seed from the game's
+    stream and plays on random.Random(seed), so any result can be replayed from that seed.
+    Set ALICE_SEED to make a whole run reproducible.
+    """
+
+    def __init__(self, seed=None):
+        self.seed = seed if seed is not None else random.SystemRandom().getrandbits(64)
+        self._streams = {}
+
+    def stream(self, game):
+        if game not in self._streams:
+            self._streams[game] = random.Random(f"{self.seed}:{game}")
+        return self._streams[game]
+
+    def round(self, game):
+        """Returns (seed, rng) for one round of a game."""
+        seed = self.stream(game).getrandbits(64)
+        return seed, random.Random(seed)
+
+
+rng_service = RNGService(int(os.environ["ALICE_SEED"]) if os.getenv("ALICE_SEED") else None)
+
+
+def seed_footer(seed: int):
+    """Footer that records the round seed on game results."""
+    return f"{EMBED_FOOTER_TEXT} • Seed {seed:016x}"
+
+
+class AnimationJob:
+    __slots__ = ("interaction", "game", "channel_id", "frames", "busy", "started")
+
+    def __init__(self, interaction, game, frames):
+        self.interaction = interaction
+        self.game = game
+        self.channel_id = interaction.channel_id
+        self.frames = frames  # [(due, edit kwargs)], the last one is the final result
+        self.busy = False
+        self.started = time.monotonic()
+
+
+class EditScheduler:
+    """
+    Central scheduler for animated game messages.
+    Commands send their opening frame and hand the remaining frames to the scheduler instead of
+    sleeping between edits. Edits go through a per-channel bucket (at most `rate` per `per` seconds),
+    and when a message falls behind only its latest due frame is sent, so the final result is never
+    queued behind stale frames.
+    Guilds in instant mode get the final result as a single message.
+    """
+
+    def __init__(self, rate=EDIT_BUCKET_RATE, per=EDIT_BUCKET_PER + EDIT_BUCKET_SLACK, instant=False):
+        self.rate = rate
+        self.per = per
+        self.instant = instant  # Global fallback, per-guild overrides live in instant_guilds
+        self.instant_guilds = set()
+        self.jobs = {}  # interaction id -> AnimationJob
+        self.buckets = {}  # channel id -> times of the last `rate` edits
+        self.calls = Counter()  # game -> REST calls made
+        self.coalesced = 0  # frames skipped because a newer one was due
+        self._heap = []
+        self._seq = itertools.count()
+        self._wake = None
+        self._task = None
+
+    def is_instant(self, guild_id):
+        return self.instant or guild_id in self.instant_guilds
+
+    async def play(self, interaction, game, final, opening=None, frames=(), delay=ANIMATION_FRAME_DELAY):
+        """
+        Sends `opening` now and schedules `frames` then `final` `delay` seconds apart.
+        Frames are edit_original_response kwargs. Returns as soon as the opening is sent.
+        """
+        if opening is None or self.is_instant(interaction.guild_id):
+            self.calls[game] += 1
+            return await interaction.response.send_message(**final)
+
+        self.calls[game] += 1
+        await interaction.response.send_message(**opening)
+        now = time.monotonic()
+        job = AnimationJob(interaction, game,
+                           [(now + delay * i, kwargs) for i, kwargs in enumerate((*frames, final), 1)])
+        self.jobs[interaction.id] = job
+        self._push(job.frames[0][0], interaction.id)
+
+    def _push(self, due, key):
+        if self._task is None:
+            self.start()
+        heapq.heappush(self._heap, (due, next(self._seq), key))
+        self._wake.set()
+
+    def _take_token(self, channel_id, now):
+        """Returns 0 if an edit may go out now, else seconds until the channel's bucket frees up."""
+        sent = self.buckets.get(channel_id)
+        if sent is None:
+            sent = self.buckets[channel_id] = deque(maxlen=self.rate)
+        if len(sent) == self.rate and now - sent[0] < self.per:
+            return sent[0] + self.per - now
+        sent.append(now)
+        return 0
+
+    def start(self):
+        self._wake = asyncio.Event()
+        # Started lazily by the first animated command; an empty context keeps its edits off that command's metrics
+        self._task = asyncio.create_task(self._run(), context=contextvars.Context())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        heap = self._heap
+        while True:
+            now = time.monotonic()
+            while heap and heap[0][0] <= now:
+                _, _, key = heapq.heappop(heap)
+                job = self.jobs.get(key)
+                if job is None or job.busy or job.frames[0][0] > now:
+                    continue  # Finished, in flight (rescheduled on completion) or a stale entry
+                wait = self._take_token(job.channel_id, now)
+                if wait:
+                    heapq.heappush(heap, (now + wait, next(self._seq), key))
+                    continue
+                # Latest due frame wins
+                frames = job.frames
+                last = 0
+                while last + 1 < len(frames) and frames[last + 1][0] <= now:
+                    last += 1
+                self.coalesced += last
+                kwargs = frames[last][1]
+                del frames[:last + 1]
+                job.busy = True
+                asyncio.create_task(self._edit(key, job, kwargs))
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), heap[0][0] - now if heap else None)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _edit(self, key, job, kwargs):
+        self.calls[job.game] += 1
+        started = time.monotonic()
+        try:
+            await job.interaction.edit_original_response(**kwargs)
+        except discord.HTTPException as e:
+            print(f" [WARN] Animation edit failed ({job.game}): {e}")
+        now = time.monotonic()
+        metrics.observe("alice_animation_edit_seconds", (job.game,), now - started)
+        job.busy = False
+        if job.frames:
+            self._push(job.frames[0][0], key)
+        else:
+            metrics.observe("alice_animation_seconds", (job.game,), now - job.started)
+            del self.jobs[key]
+
+
+animator = EditScheduler(instant=ANIMATIONS_MODE == "instant")
+
+
+# --- PERSISTENT VIEWS ---
+# Buttons that must keep working across restarts are DynamicItems: their custom_id carries
+# whatever state the callback needs, and they are registered once per class at startup.
+# Views built from them are fully dynamic, so discord.py keeps nothing per message.
+# Keyed by class name so a reloaded extension replaces its buttons instead of adding twins.
+PERSISTENT_ITEMS = {}
+
+
+def persistent_item(cls):
+    """Class decorator adding a DynamicItem to the registry loaded by register_persistent_views()."""
+    PERSISTENT_ITEMS[cls.__name__] = cls
+    return cls
+
+
+def register_persistent_views(bot):
+    bot.add_dynamic_items(*PERSISTENT_ITEMS.values())
+
+
+def make_view(*items):
+    view = ui.View(timeout=None)
+    for item in items:
+        view.add_item(item)
+    return view
+
+
+confirm_prompts = {}  # interaction id -> Future resolved by the prompt's buttons
+
+
+@persistent_item
+class ConfirmButton(ui.DynamicItem[ui.Button], template=r"confirm:(?P<prompt>[0-9]+):(?P<choice>yes|no)"):
+    def __init__(self, prompt: int, choice: str, disabled=False):
+        yes = choice == "yes"
+        super().__init__(ui.Button(label="Confirm" if yes else "Cancel",
+                                   style=discord.ButtonStyle.green if yes else discord.ButtonStyle.red,
+                                   custom_id=f"confirm:{prompt}:{choice}", disabled=disabled))
+        self.prompt = prompt
+        self.choice = choice
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(int(match["prompt"]), match["choice"])
+
+    async def callback(self, interaction: discord.Interaction):
+        future = confirm_prompts.pop(self.prompt, None)
+        if future is None or future.done():
+            return await interaction.response.edit_message(content="⌛ This prompt has expired.", view=None)
+        future.set_result(self.choice == "yes")
+        await interaction.response.edit_message(view=confirm_view(self.prompt, disabled=True))
+
+
+def confirm_view(prompt: int, disabled=False):
+    return make_view(ConfirmButton(prompt, "yes", disabled), ConfirmButton(prompt, "no", disabled))
+
+
+async def confirm_action(interaction: discord.Interaction, message: str) -> bool:
+    """
+    Sends a confirmation prompt (Yes/No buttons) and returns True/False, or None on timeout.
+    """
+    future = asyncio.get_running_loop().create_future()
+    confirm_prompts[interaction.id] = future
+    try:
+        await interaction.response.send_message(message, view=confirm_view(interaction.id), ephemeral=True)
+        return await asyncio.wait_for(future, CONFIRM_TIMEOUT)
+    except asyncio.TimeoutError:
+        return None
+    finally:
+        confirm_prompts.pop(interaction.id, None)
+
+class CooldownEngine:
+    """
+    Per-command cooldowns checked in memory.
+    Each command keeps a dict of user_id -> expiry (epoch seconds), so a check is one lookup.
+    A heap of expiries lets expired entries be pruned without scanning. Uses are recorded as
+    dirty rows and written to the cooldowns table in batches by the flush loop.
+    """
+
+    def __init__(self, windows=COOLDOWNS, overrides=COOLDOWN_OVERRIDES):
+        self.windows = {command: seconds for command, (_, seconds) in windows.items()}
+        self.columns = {command: column for command, (column, _) in windows.items()}
+        self.expiries = {command: {} for command in windows}
+        self._heap = []  # (expiry, command, user_id)
+        self._dirty = {}  # (column, user_id) -> used_at
+        for command, seconds in overrides.items():
+            self.configure(command, seconds)
+
+    def __len__(self):
+        return sum(len(users) for users in self.expiries.values())
+
+    def configure(self, command, seconds):
+        """Changes a command's window. Running cooldowns keep their current expiry."""
+        if command not in self.windows:
+            raise ValueError(f"Unknown cooldown {command!r}, expected one of {', '.join(self.windows)}")
+        self.windows[command] = seconds
+
+    def settings(self):
+        """{command: (column, seconds)} in the COOLDOWNS layout, with overrides applied."""
+        return {command: (self.columns[command], seconds) for command, seconds in self.windows.items()}
+
+    def remaining(self, command, user_id, now=None):
+        """Seconds until the user may run `command` again, 0 if ready."""
+        expiry = self.expiries[command].get(user_id)
+        if expiry is None:
+            return 0
+        left = expiry - (now or time.time())
+        return left if left > 0 else 0
+
+    def try_use(self, command, user_id, now=None):
+        """Starts the cooldown and returns 0 if ready, otherwise returns the seconds left."""
+        now = now or time.time()
+        left = self.remaining(command, user_id, now)
+        if left:
+            return left
+        self._arm(command, user_id, now)
+        self._dirty[(self.columns[command], user_id)] = now
+        return 0
+
+    def reset(self, command, user_id):
+        """Gives a use back, e.g. when the command failed after the cooldown started."""
+        if self.expiries[command].pop(user_id, None) is not None:
+            self._dirty[(self.columns[command], user_id)] = None
+
+    def _arm(self, command, user_id, used_at):
+        expiry = used_at + self.windows[command]
+        self.expiries[command][user_id] = expiry
+        heapq.heappush(self._heap, (expiry, command, user_id))
+
+    def load(self, rows):
+        """Seeds running cooldowns from (command, user_id, used_at) rows."""
+        now = time.time()
+        for command, user_id, used_at in rows:
+            if used_at + self.windows[command] > now:
+                self._arm(command, user_id, used_at)
+
+    def prune(self, now=None):
+        """Drops expired entries. Returns how many were removed."""
+        now = now or time.time()
+        heap = self._heap
+        removed = 0
+        while heap and heap[0][0] <= now:
+            expiry, command, user_id = heapq.heappop(heap)
+            users = self.expiries[command]
+            if users.get(user_id) == expiry:  # Otherwise re-armed or reset since
+                del users[user_id]
+                removed += 1
+        return removed
+
+    def take_dirty(self):
+        """Removes and returns pending (column, user_id, used_at) writes."""
+        dirty, self._dirty = self._dirty, {}
+        return [(column, user_id, used_at) for (column, user_id), used_at in dirty.items()]
+
+    def restore_dirty(self, rows):
+        """Puts writes back after a failed flush; newer uses win."""
+        for column, user_id, used_at in rows:
+            self._dirty.setdefault((column, user_id), used_at)
+
+
+cooldowns = CooldownEngine()
+
+
+@writer_call
+async def claim_cooldown(command, user_id):
+    """CooldownEngine.try_use on the engine every cluster worker shares."""
+    return cooldowns.try_use(command, user_id)
+
+
+@writer_call
+async def release_cooldown(command, user_id):
+    """CooldownEngine.reset on the shared engine, for a command that failed after claiming."""
+    cooldowns.reset(command, user_id)
+
+
+def create_http_session():
+    """One pooled session for every outgoing HTTP call; reuses DNS, TCP and TLS setup."""
+    import aiohttp
+    connector = aiohttp.TCPConnector(limit=HTTP_POOL_LIMIT, ttl_dns_cache=300)
+    return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT))
+
+
+# --- GATEWAY & MEMBERS ---
+def gateway_intents(extensions):
+    """`guilds` plus whatever the enabled extensions declare in EXTENSION_INTENTS."""
+    intents = discord.Intents.none()
+    intents.guilds = True
+    for name in extensions:
+        for flag in EXTENSION_INTENTS.get(name, ()):
+            setattr(intents, flag, True)
+    return intents
+
+
+class MemberLookup:
+    """
+    Fetches members on demand for commands that need more than the interaction carries.
+    Misses for one guild go out as a single gateway member request (by id, which needs no
+    privileged intent) and results, including "not in this guild", sit in a bounded LRU.
+    """
+    _ABSENT = False  # Cached for users who aren't members; LRUCache can't hold None
+
+    def __init__(self, size=MEMBER_CACHE_SIZE, ttl=MEMBER_CACHE_TTL):
+        self.cache = LRUCache(size, ttl)
+
+    async def get_many(self, guild, user_ids):
+        """Returns {user_id: Member} for the ids that belong to `guild`."""
+        found, missing = {}, []
+        for user_id in user_ids:
+            member = self.cache.get((guild.id, user_id))
+            if member is None:
+                member = guild.get_member(user_id)  # Still cached by the library if intents allow it
+            if member is None:
+                missing.append(user_id)
+            elif member is not self._ABSENT:
+                found[user_id] = member
+        for start in range(0, len(missing), 100):  # Discord caps a request at 100 ids
+            batch = missing[start:start + 100]
+            try:
+                # query_members returns at most `limit` members, 5 by default
+                fetched = await guild.query_members(user_ids=batch, limit=len(batch), cache=False)
+            except (asyncio.TimeoutError, discord.ClientException) as e:
+                print(f" [WARN] Member lookup failed in guild {guild.id}: {e}")
+                break
+            for member in fetched:
+                found[member.id] = member
+            for user_id in batch:
+                self.cache.put((guild.id, user_id), found.get(user_id, self._ABSENT))
+        return found
+
+    async def get(self, guild, user_id):
+        return (await self.get_many(guild, [user_id])).get(user_id)
+
+
+members = MemberLookup()
+
+
+# --- COMMAND SYNC ---
+class CommandSync:
+    """
+    Pushes the app command tree to Discord only when it changed.
+    Each scope (global, or one dev guild) is serialised to the same payload tree.sync() would send,
+    in a canonical order, and its SHA-256 is kept in `path`; a scope whose hash matches is skipped.
+    """
+
+    def __init__(self, tree, path=COMMAND_SYNC_FILE):
+        self.tree = tree
+        self.path = path
+        self.calls = 0  # Syncs actually sent
+        self.skipped = 0
+
+    def digest(self, guild=None):
+        payload = sorted((command.to_dict(self.tree) for command in self.tree.get_commands(guild=guild)),
+                         key=lambda command: (command.get("type", 1), command["name"]))
+        canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def scope(self, guild=None):
+        # Keyed by application too, so a dev bot and the live bot can share a checkout
+        return f"{self.tree.client.application_id}:{guild.id if guild else 'global'}"
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self, hashes):
+        temp = f"{self.path}.tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(hashes, f, indent=2, sort_keys=True)
+        os.replace(temp, self.path)
+
+    async def sync(self, guild=None, force=False):
+        """Syncs one scope if its hash changed (or `force`). Returns True if a sync was sent."""
+        digest = self.digest(guild)
+        hashes = self.load()
+        key = self.scope(guild)
+        if not force and hashes.get(key) == digest:
+            self.skipped += 1
+            return False
+        synced = await self.tree.sync(guild=guild)
+        self.calls += 1
+        hashes[key] = digest
+        self.save(hashes)
+        print(f" [SYNC] Synced {len(synced)} slash commands ({'guild ' + str(guild.id) if guild else 'global'}).")
+        return True
+
+    async def sync_all(self, dev_guilds=(), force=False):
+        """Syncs globally, or with dev guilds, copies the global commands into each of them instead."""
+        if not dev_guilds:
+            return await self.sync(force=force)
+        changed = False
+        for guild_id in dev_guilds:
+            guild = discord.Object(id=guild_id)
+            self.tree.copy_global_to(guild=guild)
+            changed |= await self.sync(guild, force=force)
+        return changed